@@ -1,51 +1,355 @@
-import matplotlib.pyplot as plt
-import matplotlib.patches as patches
-from matplotlib.path import Path
 import base64
-from io import BytesIO
-import numpy as np
+import functools
+import hashlib
+import inspect
+import os
+import pickle
+import re
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from html import escape
+from io import BytesIO, StringIO
+
+# matplotlib se importa dentro de los métodos que dibujan o rasterizan: exportar
+# secciones ya cacheadas no lo necesita y el arranque del módulo es inmediato
+from ajuste_texto import ajustar_texto
+from cache_render import Bifurcador, CacheRender, huella_estable, huella_fuentes
+from instrumentacion import SIN_INSTRUMENTACION, Instrumentacion
+from modelo_diagrama import Diagrama, MotorLayout, calcular_rutas
+
+
+class EscritorBase64:
+    """Archivo binario de solo escritura que codifica en base64 por bloques sobre un archivo de texto"""
+
+    def __init__(self, destino, tam_bloque=3 * 64 * 1024, al_primer_bloque=None):
+        self.destino = destino
+        self.tam_bloque = tam_bloque  # múltiplo de 3: cada bloque se codifica sin relleno
+        self._pendiente = bytearray()
+        self.bytes_escritos = 0
+        # Se llama al recibir los primeros bytes (p. ej. cuando savefig empieza a comprimir)
+        self.al_primer_bloque = al_primer_bloque
+
+    def write(self, datos):
+        if self.al_primer_bloque is not None:
+            self.al_primer_bloque()
+            self.al_primer_bloque = None
+        self._pendiente += datos
+        self.bytes_escritos += len(datos)
+        if len(self._pendiente) >= self.tam_bloque:
+            corte = len(self._pendiente) - len(self._pendiente) % 3
+            self.destino.write(base64.b64encode(self._pendiente[:corte]).decode("ascii"))
+            del self._pendiente[:corte]
+        return len(datos)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        if self._pendiente:
+            self.destino.write(base64.b64encode(self._pendiente).decode("ascii"))
+            self._pendiente = bytearray()
+
+
+# Inicio del PNG incrustado de una sección sin teselar (ver _escribir_figura)
+PREFIJO_PNG = '<img src="data:image/png;base64,'
+
+
+def png_de_html(html):
+    """Bytes del primer PNG incrustado sin teselar de un documento o una sección HTML"""
+    inicio = html.find(PREFIJO_PNG)
+    if inicio < 0:
+        raise ValueError("El HTML no contiene un PNG incrustado")
+    inicio += len(PREFIJO_PNG)
+    return base64.b64decode(html[inicio:html.index('"', inicio)])
+
+
+def contar_artistas(fig):
+    """(artistas de primer nivel, primitivas con las colecciones desglosadas) de una figura"""
+    from matplotlib.collections import Collection
+    artistas = primitivas = 0
+    for ax in fig.axes:
+        for hijo in ax.get_children():
+            artistas += 1
+            primitivas += len(hijo.get_paths()) if isinstance(hijo, Collection) else 1
+    return artistas, primitivas
+
+
+def _etapa_figura(metodo):
+    """Mide un método que construye una figura como etapa 'artistas' del render"""
+    @functools.wraps(metodo)
+    def envoltura(self, *args, **kwargs):
+        with self.instrumentacion.etapa('artistas', metodo=metodo.__name__) as medicion:
+            fig = metodo(self, *args, **kwargs)
+            if medicion is not None:
+                medicion.artistas, medicion.extra['primitivas'] = contar_artistas(fig)
+        self.instrumentacion.cerrar_acumuladas()
+        return fig
+    return envoltura
+
+
+OPCIONES_MENU = [
+    ("entrada == '1'", 'Mostrar estado de cada planta'),
+    ("entrada == '2'", 'Aparcar: validar planta y espacio'),
+    ("entrada == '3'", 'Sacar coche: liberar primer espacio'),
+    ("entrada == '4'", 'Mostrar plantas con espacios libres'),
+    ("entrada == '5'", 'Identificar planta más vacía'),
+    ("entrada == '6'", 'Calcular total de coches: np.sum(b)'),
+    ("entrada == '7'", 'Mantenimiento: redistribuir vehículos'),
+    ("entrada == '8'", 'Calcular porcentaje por planta'),
+    ("entrada == '9'", 'Contar coches en plantas\nno reservadas [2, 3, 5, 7]')
+]
+
+# Nombre corto de cada acción por defecto en el recuadro del menú
+ETIQUETAS_MENU = dict(zip((accion for _, accion in OPCIONES_MENU), (
+    'Visualización', 'Aparcar', 'Sacar coche', 'Plantas libres', 'Planta más vacía',
+    'Total coches', 'Mantenimiento', 'Porcentaje ocupación', 'No reservadas')))
+
+
+def texto_menu(opciones, max_opciones=9):
+    """Texto del recuadro del menú con las mismas opciones que dibuja el switch, dos por línea.
+
+    La tecla sale de la condición (entrada == 'X') y el nombre de ETIQUETAS_MENU o de la
+    acción (primera línea, hasta ':'). Con más de max_opciones se resumen las restantes.
+    """
+    entradas = []
+    for condicion, accion in opciones:
+        clave = re.search(r"==\s*'([^']*)'", condicion)
+        nombre = ETIQUETAS_MENU.get(accion) or accion.split('\n')[0].split(':')[0].strip()
+        entradas.append(f"{clave.group(1) if clave else condicion}. {nombre}")
+    if len(entradas) > max_opciones:
+        restantes = len(entradas) - (max_opciones - 1)
+        entradas = entradas[:max_opciones - 1] + [f"… y {restantes} más"]
+    entradas.append("s. Salir")
+    filas = ["   ".join(entradas[i:i + 2]) for i in range(0, len(entradas), 2)]
+    return "MENÚ DE OPCIONES:\n" + "\n".join(filas)
+
+
+def geometria_opciones(opciones, y0, gap=6.5, por_pagina=None):
+    """Posiciones de todas las opciones del switch en una sola pasada vectorizada.
+
+    Con por_pagina cada opción se asigna a una página y su fila se cuenta desde y0
+    dentro de esa página; sin él, todas quedan en una columna continua.
+    """
+    import numpy as np
+    i = np.arange(len(opciones))
+    if por_pagina:
+        pagina, fila = np.divmod(i, por_pagina)
+    else:
+        pagina, fila = np.zeros_like(i), i
+    multilinea = np.fromiter(('\n' in accion for _, accion in opciones), dtype=bool, count=len(opciones))
+    return {
+        'pagina': pagina,
+        'y': y0 - fila * gap,                        # base de cada rombo
+        'ancho_accion': np.where(multilinea, 9, 8),  # las acciones de dos líneas son más anchas
+        'paginas': int(pagina[-1]) + 1 if len(opciones) else 0,
+    }
+
+
+def _datos_huella(valor):
+    """Argumentos de dibujo como datos JSON completos (los arrays de NumPy, elemento a elemento)"""
+    if isinstance(valor, Diagrama):
+        return valor.huella()
+    if isinstance(valor, dict):
+        return {str(clave): _datos_huella(v) for clave, v in valor.items()}
+    if isinstance(valor, (list, tuple)):
+        return [_datos_huella(v) for v in valor]
+    if hasattr(valor, 'tolist'):
+        return valor.tolist()
+    return valor
+
+
+def _constantes_modulo(nombre):
+    """Valores actuales de las constantes de datos (nombres en mayúsculas) de un módulo cargado"""
+    modulo = sys.modules.get(nombre)
+    if modulo is None:
+        return None
+    return {clave: _datos_huella(valor) for clave, valor in sorted(vars(modulo).items())
+            if clave.isupper() and isinstance(valor, (str, int, float, list, tuple, dict))}
+
+
+class SeccionFigura:
+    __slots__ = ('titulo', 'figura', 'teselado')
+
+    def __init__(self, titulo, figura, teselado=None):
+        self.titulo = titulo
+        self.figura = figura  # Figure, Diagrama o función que construye la figura
+        self.teselado = teselado  # None, 'unir' o 'apilar'
+
+
+class SeccionHTML:
+    __slots__ = ('contenido', 'usa_cliente')
+
+    def __init__(self, contenido, usa_cliente=False):
+        self.contenido = contenido  # marcado ya generado
+        self.usa_cliente = usa_cliente  # lleva diagramas que dibuja el renderizador JS del navegador
+
+
+def _version(paquete):
+    """Versión instalada de un paquete, leída sin importarlo"""
+    from importlib import metadata
+    try:
+        return metadata.version(paquete)
+    except metadata.PackageNotFoundError:
+        return None
+
+
+def _firma_configuracion_matplotlib():
+    """Versión instalada de matplotlib y archivos matplotlibrc visibles, leídos sin importarlo"""
+    version = _version('matplotlib')
+    candidatos = [os.environ.get('MATPLOTLIBRC'), 'matplotlibrc',
+                  os.path.join(os.environ.get('MPLCONFIGDIR', ''), 'matplotlibrc'),
+                  os.path.join(os.path.expanduser('~'), '.config', 'matplotlib', 'matplotlibrc')]
+    archivos = []
+    for ruta in candidatos:
+        if ruta and os.path.isfile(ruta):
+            with open(ruta, 'rb') as f:
+                archivos.append([os.path.abspath(ruta), hashlib.sha256(f.read()).hexdigest()])
+    return [version, archivos]
+
+
+# Figura deserializada una sola vez por proceso trabajador
+_figura_trabajador = None
+
+
+def _iniciar_trabajador(figura_serializada):
+    global _figura_trabajador
+    import matplotlib
+    matplotlib.use('Agg')
+    _figura_trabajador = pickle.loads(figura_serializada)
+    # La franja ocupa toda la figura para que las bandas encajen píxel a píxel
+    _figura_trabajador.axes[0].set_position([0, 0, 1, 1])
+
+
+def _rasterizar_banda(y0, y1, alto_px, dpi):
+    """Rasteriza la franja [y0, y1] de la figura del trabajador y devuelve el PNG"""
+    fig = _figura_trabajador
+    fig.axes[0].set_ylim(y0, y1)
+    fig.set_size_inches(fig.get_size_inches()[0], alto_px / dpi)
+    buffer = BytesIO()
+    fig.savefig(buffer, format="png", dpi=dpi)
+    return buffer.getvalue()
 
 
 class GeneradorDiagramaParqueadero:
-    def __init__(self, titulo="Sistema de Parqueadero - Diagrama de Flujo"):
+    def __init__(self, titulo="Sistema de Parqueadero - Diagrama de Flujo", dibujo_por_lotes=True):
         self.titulo = titulo
         self.secciones = []
         self.fig_width = 22
         self.fig_height = 130
+        # Resolución de exportación; con max_megapixeles el dpi se reduce para no superar el presupuesto
+        self.dpi = 300
+        self.max_megapixeles = None
+        self.margen_lienzo = 1.0
+        self.margen_texto = 0.3  # margen interior del texto en los rectángulos
+        self._limites = None  # (xmin, ymin, xmax, ymax) del contenido dibujado
+        # Render por bandas: altura máxima de cada franja y procesos del pool
+        self.max_alto_banda = 4096
+        self.procesos = os.cpu_count() or 1
+        # Métricas por etapa (ver instrumentar)
+        self.instrumentacion = SIN_INSTRUMENTACION
+        # Caché de render en disco (ver usar_cache)
+        self.cache = None
+        # Exportación con imágenes externas: ancho de la vista previa y límite de WebP
+        self.ancho_vista_previa = 1200
+        self.max_lado_webp = 16383
+        self._recursos = None  # (directorio, ruta relativa, contador) durante exportar_html
+        self._cliente = False  # exportar_html(imagenes='cliente') en curso
+        self._con_renderizador = False  # la exportación en curso necesita el renderizador JS del navegador
+        self._firma_entorno = None
         self.y_step = 7  # Mayor espaciado vertical entre bloques
         self.current_y = 125  # Posición Y inicial
+        # Modo por lotes: sombras, figuras y flechas se agrupan en colecciones por zorder
+        self.dibujo_por_lotes = dibujo_por_lotes
+        self._lotes_patches = {}
+        self._lotes_lineas = {}
+        # Opciones del switch que caben en una figura antes de paginarlo
+        self.opciones_por_pagina = 20
+        # Motor de layout compartido: su caché sobrevive entre diagramas
+        self.motor_layout = MotorLayout()
+        # Con un dict, texto -> (original, ancho, fontsize, fontweight) para reajustarlo (ver variantes_diagrama)
+        self._registro_textos = None
+
+    def _extender_limites(self, xmin, ymin, xmax, ymax):
+        """Amplía la caja contenedora del contenido dibujado"""
+        if self._limites is None:
+            self._limites = (xmin, ymin, xmax, ymax)
+            return
+        x0, y0, x1, y1 = self._limites
+        self._limites = (min(x0, xmin), min(y0, ymin), max(x1, xmax), max(y1, ymax))
+
+    def _registrar_patch(self, patch):
+        """Registra la extensión en coordenadas de datos de un patch"""
+        caja = patch.get_path().get_extents(patch.get_patch_transform())
+        self._extender_limites(caja.x0, caja.y0, caja.x1, caja.y1)
+
+    def _agregar_patch(self, ax, patch):
+        """Añade un patch al eje o lo acumula en el lote de su zorder"""
+        self._registrar_patch(patch)
+        if not self.dibujo_por_lotes:
+            ax.add_patch(patch)
+            return
+        self._lotes_patches.setdefault(patch.get_zorder(), []).append(patch)
+
+    def _agregar_linea(self, ax, x, y, color, lw, zorder):
+        """Añade una línea al eje o la acumula en el lote de su estilo"""
+        self._extender_limites(min(x), min(y), max(x), max(y))
+        if not self.dibujo_por_lotes:
+            ax.plot(x, y, color=color, lw=lw, zorder=zorder)
+            return
+        self._lotes_lineas.setdefault((color, lw, zorder), []).append(list(zip(x, y)))
+
+    def _agregar_flecha(self, ax, x, y, dx, dy, head_width, head_length, color, lw, zorder):
+        """Equivalente a ax.arrow pero respetando el modo por lotes"""
+        import matplotlib.patches as patches
+        flecha = patches.FancyArrow(x, y, dx, dy, head_width=head_width, head_length=head_length,
+                                    length_includes_head=True, fc=color, ec=color, lw=lw, zorder=zorder)
+        self._agregar_patch(ax, flecha)
+
+    def volcar_lotes(self, ax):
+        """Emite los lotes acumulados como una colección por estilo y los vacía"""
+        from matplotlib.collections import LineCollection, PatchCollection
+        for zorder, lista in self._lotes_patches.items():
+            # match_original conserva color, borde y alpha de cada patch
+            ax.add_collection(PatchCollection(lista, match_original=True, zorder=zorder),
+                              autolim=False)
+        for (color, lw, zorder), segmentos in self._lotes_lineas.items():
+            # 'projecting' reproduce el extremo de línea por defecto de ax.plot
+            ax.add_collection(LineCollection(segmentos, colors=color, linewidths=lw,
+                                             capstyle='projecting', zorder=zorder),
+                              autolim=False)
+        self._lotes_patches = {}
+        self._lotes_lineas = {}
+
+    def _registrar_texto(self, artista, texto, ancho, fontsize, fontweight):
+        """Guarda el texto sin ajustar de un nodo si hay un registro activo"""
+        if self._registro_textos is not None:
+            self._registro_textos[artista] = (texto, ancho, fontsize, fontweight)
 
     def crear_rectangulo(self, ax, x, y, w, h, texto, color='lightgreen', fontsize=10, fontweight='bold'):
         """Crea un rectángulo con texto centrado (auto-wrap) mejorado"""
+        import matplotlib.patches as patches
         # Sombra
         shadow = patches.Rectangle((x + 0.15, y - 0.15), w, h, 
                                  facecolor='gray', alpha=0.3, zorder=1)
-        ax.add_patch(shadow)
+        self._agregar_patch(ax, shadow)
         
         # Rectángulo principal
         rect = patches.Rectangle((x, y), w, h, facecolor=color, 
                                edgecolor='black', lw=2.5, zorder=2)
-        ax.add_patch(rect)
-
-        # Ajustar salto de línea con mejor control
-        max_chars_per_line = 20 if w < 6 else 25
-        if len(texto) > max_chars_per_line:
-            lineas = []
-            linea_actual = ""
-            for palabra in texto.split():
-                if len(linea_actual + palabra) <= max_chars_per_line:
-                    linea_actual += palabra + " "
-                else:
-                    lineas.append(linea_actual.strip())
-                    linea_actual = palabra + " "
-            if linea_actual.strip():
-                lineas.append(linea_actual.strip())
-            texto = '\n'.join(lineas)
+        self._agregar_patch(ax, rect)
+
+        # Ajustar salto de línea al ancho real del rectángulo (con margen interior)
+        t0, cpu0 = time.perf_counter(), time.process_time()
+        ajustado = ajustar_texto(texto, w - 2 * self.margen_texto, fontsize, fontweight)
 
         # Texto con mejor formato
-        ax.text(x + w / 2, y + h / 2, texto, ha='center', va='center',
-                fontsize=fontsize, fontweight=fontweight, linespacing=1.4, 
-                zorder=3, color='black')
+        artista = ax.text(x + w / 2, y + h / 2, ajustado, ha='center', va='center',
+                          fontsize=fontsize, fontweight=fontweight, linespacing=1.4, 
+                          zorder=3, color='black')
+        self._registrar_texto(artista, texto, w - 2 * self.margen_texto, fontsize, fontweight)
+        self.instrumentacion.acumular('texto', time.perf_counter() - t0, time.process_time() - cpu0)
         
         # Devolver puntos de conexión exactos
         return {
@@ -57,6 +361,8 @@ class GeneradorDiagramaParqueadero:
 
     def crear_rombo(self, ax, x, y, w, h, texto, color='lightblue', fontsize=9, fontweight='bold'):
         """Crea un rombo (decisión) con texto centrado mejorado"""
+        import matplotlib.patches as patches
+        from matplotlib.path import Path
         # Sombra del rombo
         shadow_vertices = [(x + w / 2 + 0.15, y - 0.15), 
                           (x + w + 0.15, y + h / 2 - 0.15), 
@@ -65,33 +371,23 @@ class GeneradorDiagramaParqueadero:
         shadow_codes = [Path.MOVETO, Path.LINETO, Path.LINETO, Path.LINETO, Path.CLOSEPOLY]
         shadow_rombo = patches.PathPatch(Path(shadow_vertices + [(0, 0)], shadow_codes),
                                         facecolor='gray', alpha=0.3, zorder=1)
-        ax.add_patch(shadow_rombo)
+        self._agregar_patch(ax, shadow_rombo)
         
         # Rombo principal
         vertices = [(x + w / 2, y), (x + w, y + h / 2), (x + w / 2, y + h), (x, y + h / 2)]
         codigos = [Path.MOVETO, Path.LINETO, Path.LINETO, Path.LINETO, Path.CLOSEPOLY]
         rombo = patches.PathPatch(Path(vertices + [(0, 0)], codigos),
                                  facecolor=color, edgecolor='black', lw=2.5, zorder=2)
-        ax.add_patch(rombo)
-
-        # Ajustar texto para rombo
-        max_chars = 16
-        if len(texto) > max_chars:
-            palabras = texto.split()
-            lineas = []
-            linea = ""
-            for p in palabras:
-                if len(linea + p) < 12:
-                    linea += p + " "
-                else:
-                    lineas.append(linea.strip())
-                    linea = p + " "
-            if linea.strip():
-                lineas.append(linea.strip())
-            texto = '\n'.join(lineas)
-
-        ax.text(x + w / 2, y + h / 2, texto, ha='center', va='center',
-                fontsize=fontsize, fontweight=fontweight, zorder=3, color='black')
+        self._agregar_patch(ax, rombo)
+
+        # Ajustar texto para rombo: el rectángulo inscrito útil mide la mitad del ancho
+        t0, cpu0 = time.perf_counter(), time.process_time()
+        ajustado = ajustar_texto(texto, w / 2, fontsize, fontweight)
+
+        artista = ax.text(x + w / 2, y + h / 2, ajustado, ha='center', va='center',
+                          fontsize=fontsize, fontweight=fontweight, zorder=3, color='black')
+        self._registrar_texto(artista, texto, w / 2, fontsize, fontweight)
+        self.instrumentacion.acumular('texto', time.perf_counter() - t0, time.process_time() - cpu0)
         
         # Devolver puntos de conexión exactos del rombo
         return {
@@ -107,8 +403,7 @@ class GeneradorDiagramaParqueadero:
         dx, dy = x2 - x1, y2 - y1
         
         # No reducir la longitud - la flecha debe tocar exactamente
-        ax.arrow(x1, y1, dx, dy, head_width=0.35, head_length=0.35,
-                fc=color, ec=color, lw=lw, length_includes_head=True, zorder=4)
+        self._agregar_flecha(ax, x1, y1, dx, dy, 0.35, 0.35, color, lw, zorder=4)
         
         if etiqueta:
             # Calcular posición de etiqueta
@@ -129,12 +424,47 @@ class GeneradorDiagramaParqueadero:
     def crear_flecha_horizontal_con_punta_izquierda(self, ax, x1, y1, x2, y2, color='purple', lw=2):
         """Crea una flecha horizontal con punta apuntando hacia la izquierda"""
         # Crear la línea horizontal
-        ax.plot([x1, x2], [y1, y2], color=color, lw=lw, zorder=4)
+        self._agregar_linea(ax, [x1, x2], [y1, y2], color, lw, zorder=4)
         
         # Crear la punta de flecha apuntando hacia la izquierda
         # La punta se coloca en x1 (punto izquierdo)
-        ax.arrow(x1 + 0.4, y1, -0.4, 0, head_width=0.3, head_length=0.3,
-                fc=color, ec=color, lw=lw, length_includes_head=True, zorder=5)
+        self._agregar_flecha(ax, x1 + 0.4, y1, -0.4, 0, 0.3, 0.3, color, lw, zorder=5)
+
+    def crear_titulo(self, ax, x, y, w, h, texto):
+        """Crea la caja redondeada del título con el texto centrado"""
+        import matplotlib.patches as patches
+        title_box = patches.FancyBboxPatch((x, y), w, h, 
+                                         boxstyle="round,pad=0.5",
+                                         facecolor="#E6B3FF", 
+                                         edgecolor="#C8A8E9", 
+                                         linewidth=3,
+                                         zorder=2)
+        self._registrar_patch(title_box)
+        ax.add_patch(title_box)
+        
+        ax.text(x + w / 2, y + h / 2, texto, 
+                ha='center', va='center', fontsize=18, fontweight='bold', 
+                color='black', zorder=3)
+
+    def ajustar_lienzo(self, fig, ax):
+        """Recorta los ejes y la figura a la caja del contenido (1 unidad = 1 pulgada)"""
+        if self._limites is None:
+            return
+        x0, y0, x1, y1 = self._limites
+        m = self.margen_lienzo
+        ax.set_xlim(x0 - m, x1 + m)
+        ax.set_ylim(y0 - m, y1 + m)
+        fig.set_size_inches(x1 - x0 + 2 * m, y1 - y0 + 2 * m)
+        self._limites = None
+
+    def calcular_dpi(self, fig):
+        """dpi de exportación, reducido si el raster superaría max_megapixeles"""
+        dpi = self.dpi
+        if self.max_megapixeles:
+            ancho, alto = fig.get_size_inches()
+            dpi_max = (self.max_megapixeles * 1e6 / (ancho * alto)) ** 0.5
+            dpi = min(dpi, dpi_max)
+        return dpi
 
     def avanzar_y(self, pasos=1):
         """Avanza la posición Y actual"""
@@ -146,25 +476,26 @@ class GeneradorDiagramaParqueadero:
         self.current_y = valor
         return self.current_y
 
-    def crear_diagrama_completo(self):
-        """Crea el diagrama completo del sistema de parqueadero con flechas perfectamente ajustadas"""
+    @_etapa_figura
+    def crear_diagrama_completo(self, opciones=None):
+        """Crea el diagrama completo del sistema de parqueadero con flechas perfectamente ajustadas.
+
+        Con más de opciones_por_pagina opciones el switch se sustituye por un conector
+        hacia las páginas de crear_pagina_opciones (ver agregar_diagrama_completo).
+        """
+        import matplotlib.pyplot as plt
+        opciones = OPCIONES_MENU if opciones is None else opciones
+        if not opciones:
+            raise ValueError("El switch del diagrama necesita al menos una opción")
+        self.resetear_y(125)
+        self._limites = None
         fig, ax = plt.subplots(figsize=(self.fig_width, self.fig_height))
         ax.set_xlim(0, 22)
         ax.set_ylim(0, 130)
         ax.axis('off')
 
         # Título del diagrama con mejor diseño
-        title_box = patches.FancyBboxPatch((2, 126), 18, 4, 
-                                         boxstyle="round,pad=0.5",
-                                         facecolor="#E6B3FF", 
-                                         edgecolor="#C8A8E9", 
-                                         linewidth=3,
-                                         zorder=2)
-        ax.add_patch(title_box)
-        
-        ax.text(11, 128, 'DIAGRAMA DE FLUJO\nSISTEMA DE PARQUEADERO', 
-                ha='center', va='center', fontsize=18, fontweight='bold', 
-                color='black', zorder=3)
+        self.crear_titulo(ax, 2, 126, 18, 4, 'DIAGRAMA DE FLUJO\nSISTEMA DE PARQUEADERO')
 
         # === 1. INICIO ===
         y = self.avanzar_y(0.5)
@@ -203,13 +534,7 @@ class GeneradorDiagramaParqueadero:
         
         # === 5. Mostrar menú ===
         y = self.avanzar_y(1.8)
-        menu_texto = ("MENÚ DE OPCIONES:\n"
-                      "1. Visualización    2. Aparcar\n"
-                      "3. Sacar coche     4. Plantas libres\n"
-                      "5. Planta más vacía  6. Total coches\n"
-                      "7. Mantenimiento   8. Porcentaje ocupación\n"
-                      "9. No reservadas   s. Salir")
-        menu_pts = self.crear_rectangulo(ax, 4, y, 14, 6, menu_texto, 'lightyellow', 10)
+        menu_pts = self.crear_rectangulo(ax, 4, y, 14, 6, texto_menu(opciones), 'lightyellow', 10)
         # Flecha SÍ perfecta
         self.crear_flecha_perfecta(ax, bucle_pts['bottom'][0], bucle_pts['bottom'][1], 
                                   menu_pts['top'][0], menu_pts['top'][1])
@@ -231,17 +556,10 @@ class GeneradorDiagramaParqueadero:
         w_decision, h_decision = 6, 3.5
         gap = 6.5
 
-        opciones = [
-            ("entrada == '1'", 'Mostrar estado de cada planta'),
-            ("entrada == '2'", 'Aparcar: validar planta y espacio'),
-            ("entrada == '3'", 'Sacar coche: liberar primer espacio'),
-            ("entrada == '4'", 'Mostrar plantas con espacios libres'),
-            ("entrada == '5'", 'Identificar planta más vacía'),
-            ("entrada == '6'", 'Calcular total de coches: np.sum(b)'),
-            ("entrada == '7'", 'Mantenimiento: redistribuir vehículos'),
-            ("entrada == '8'", 'Calcular porcentaje por planta'),
-            ("entrada == '9'", 'Contar coches en plantas\nno reservadas [2, 3, 5, 7]')
-        ]
+        if len(opciones) > self.opciones_por_pagina:
+            # Demasiadas opciones para el lienzo: el switch continúa en páginas aparte
+            return self._cerrar_con_conector_opciones(fig, ax, leer_pts, bucle_pts)
+        geometria = geometria_opciones(opciones, opciones_y, gap)
 
         # Conexión desde leer opción hasta la primera decisión (sin flecha extra)
         primera_decision_y = opciones_y + h_decision/2
@@ -254,13 +572,13 @@ class GeneradorDiagramaParqueadero:
         return_points = []
         
         for i, (condicion, accion) in enumerate(opciones):
-            y_actual = opciones_y - i * gap
+            y_actual = float(geometria['y'][i])
             
             # Rombo de decisión
             rombo_pts = self.crear_rombo(ax, x_decision, y_actual, w_decision, h_decision, condicion, 'lightblue', 9)
             
             # SOLO una flecha SÍ hacia la acción
-            w_accion = 8 if i != 8 else 9
+            w_accion = int(geometria['ancho_accion'][i])
             accion_pts = self.crear_rectangulo(ax, x_accion, y_actual - 0.5, w_accion, 4, accion, 'lightgreen', 10)
             self.crear_flecha_horizontal_perfecta(ax, rombo_pts['right'][0], rombo_pts['right'][1], 
                                                 accion_pts['left'][0], accion_pts['left'][1])
@@ -279,15 +597,15 @@ class GeneradorDiagramaParqueadero:
             self.crear_flecha_horizontal_con_punta_izquierda(ax, return_x, return_y, rombo_pts['left'][0], return_y)
 
         # === 8. Retorno simple y limpio ===
-        y_return_bottom = opciones_y - 8 * gap - 3
+        y_return_bottom = float(geometria['y'][-1]) - 3
         
         # UNA SOLA línea vertical de retorno
-        ax.plot([return_x, return_x], [return_points[0][1], y_return_bottom], 
-               color='purple', lw=2, zorder=4)
+        self._agregar_linea(ax, [return_x, return_x], [return_points[0][1], y_return_bottom],
+                            'purple', 2, zorder=4)
         
         # Línea de retorno al bucle principal
-        ax.plot([return_x, return_x], [y_return_bottom, bucle_pts['left'][1]], 
-               color='purple', lw=2, zorder=4)
+        self._agregar_linea(ax, [return_x, return_x], [y_return_bottom, bucle_pts['left'][1]],
+                            'purple', 2, zorder=4)
         
         # Flecha final hacia el bucle
         self.crear_flecha_horizontal_perfecta(ax, return_x, bucle_pts['left'][1], 
@@ -299,22 +617,375 @@ class GeneradorDiagramaParqueadero:
                 color='purple', rotation=90,
                 bbox=dict(boxstyle="round,pad=0.3", facecolor="lavender", alpha=0.9))
 
+        self.volcar_lotes(ax)
+        self.ajustar_lienzo(fig, ax)
+        plt.tight_layout()
+        return fig
+
+    def crear_conector(self, ax, cx, y_sup, texto, color='white', borde='black'):
+        """Conector fuera de página (pentágono con punta hacia abajo) con su texto"""
+        import matplotlib.patches as patches
+        w, h = 3, 2
+        vertices = [(cx - w / 2, y_sup), (cx + w / 2, y_sup), (cx + w / 2, y_sup - 0.65 * h),
+                    (cx, y_sup - h), (cx - w / 2, y_sup - 0.65 * h)]
+        self._agregar_patch(ax, patches.Polygon(vertices, closed=True, facecolor=color, edgecolor=borde,
+                                                lw=2.5, zorder=2))
+        ax.text(cx, y_sup - 0.4 * h, texto, ha='center', va='center', fontsize=9, fontweight='bold',
+                color=borde, zorder=3)
+        return {'top': (cx, y_sup), 'bottom': (cx, y_sup - h)}
+
+    def _cerrar_con_conector_opciones(self, fig, ax, leer_pts, bucle_pts):
+        """Sustituye el switch por los conectores hacia y desde las páginas de opciones"""
+        import matplotlib.pyplot as plt
+        x, y = leer_pts['bottom']
+        conector = self.crear_conector(ax, x, y - 1.5, 'Opciones\npág. 1')
+        self.crear_flecha_perfecta(ax, x, y, *conector['top'])
+
+        # El retorno de todas las páginas llega por un único conector morado
+        return_x = 0.3
+        self.crear_conector(ax, return_x, y - 1.5, 'Retorno\nopciones', 'lavender', 'purple')
+        self._agregar_linea(ax, [return_x, return_x], [y - 1.5, bucle_pts['left'][1]], 'purple', 2, zorder=4)
+        self.crear_flecha_horizontal_perfecta(ax, return_x, bucle_pts['left'][1],
+                                              bucle_pts['left'][0], bucle_pts['left'][1], color='purple')
+
+        self.volcar_lotes(ax)
+        self.ajustar_lienzo(fig, ax)
+        plt.tight_layout()
+        return fig
+
+    def _agregar_flechas(self, ax, x1, y1, x2, y2, cabeza, color, lw=2, zorder=4):
+        """Dibuja N flechas rectas como una LineCollection de astas y una PolyCollection de puntas"""
+        import numpy as np
+        from matplotlib.collections import LineCollection, PolyCollection
+        origen = np.column_stack([x1, y1]).astype(float)
+        punta = np.column_stack([x2, y2]).astype(float)
+        direccion = punta - origen
+        largo = np.hypot(direccion[:, 0], direccion[:, 1])
+        direccion /= np.where(largo == 0, 1, largo)[:, None]
+        normal = np.column_stack([-direccion[:, 1], direccion[:, 0]])
+        base = punta - direccion * np.minimum(cabeza, largo)[:, None]
+        triangulos = np.stack([punta, base + normal * cabeza / 2, base - normal * cabeza / 2], axis=1)
+        ax.add_collection(LineCollection(np.stack([origen, base], axis=1), colors=color, linewidths=lw,
+                                         zorder=zorder), autolim=False)
+        ax.add_collection(PolyCollection(triangulos, facecolors=color, edgecolors=color, linewidths=lw,
+                                         zorder=zorder), autolim=False)
+
+    @_etapa_figura
+    def crear_pagina_opciones(self, opciones, pagina, geometria=None):
+        """Dibuja una página del switch de opciones con conectores de continuación.
+
+        Rombos, acciones, sombras y flechas de toda la página se generan como colecciones
+        a partir de los arrays de geometria_opciones: el coste crece con las opciones de
+        la página y ninguna figura supera el alto de opciones_por_pagina filas.
+        """
+        import matplotlib.pyplot as plt
+        import numpy as np
+        from matplotlib.collections import PolyCollection
+        gap = 6.5
+        if geometria is None:
+            geometria = geometria_opciones(opciones, 0.0, gap, self.opciones_por_pagina)
+        # Misma geometría que el switch de crear_diagrama_completo
+        x_decision, x_accion = 1.5, 10
+        w_decision, h_decision = 6, 3.5
+        return_x = 0.3
+
+        # Las páginas son contiguas: el tramo se localiza por búsqueda binaria
+        a, b = np.searchsorted(geometria['pagina'], [pagina, pagina + 1])
+        if a == b:
+            raise ValueError(f"Página de opciones inexistente: {pagina}")
+        y = geometria['y'][a:b]
+        ancho_accion = geometria['ancho_accion'][a:b]
+        k = b - a
+        ultima = pagina == geometria['paginas'] - 1
+
+        self._limites = None
+        fig, ax = plt.subplots(figsize=(self.fig_width, k * gap + 8))
+        ax.axis('off')
+
+        centro_y = y + h_decision / 2
+        x_rombo = np.array([w_decision / 2, w_decision, w_decision / 2, 0]) + x_decision
+        y_rombo = np.array([0, h_decision / 2, h_decision, h_decision / 2])
+        rombos = np.stack([np.broadcast_to(x_rombo, (k, 4)), y[:, None] + y_rombo], axis=-1)
+        x_rect, y_rect = np.array([0, 1, 1, 0]), np.array([0, 0, 1, 1])
+        acciones = np.stack([x_accion + ancho_accion[:, None] * x_rect, (y - 0.5)[:, None] + 4 * y_rect], axis=-1)
+        sombra = np.array([0.15, -0.15])
+        ax.add_collection(PolyCollection(np.concatenate([rombos, acciones]) + sombra, facecolors='gray',
+                                         edgecolors='none', alpha=0.3, zorder=1), autolim=False)
+        ax.add_collection(PolyCollection(rombos, facecolors='lightblue', edgecolors='black', linewidths=2.5,
+                                         joinstyle='miter', zorder=2), autolim=False)
+        ax.add_collection(PolyCollection(acciones, facecolors='lightgreen', edgecolors='black', linewidths=2.5,
+                                         joinstyle='miter', zorder=2), autolim=False)
+        self._extender_limites(return_x, float(y[-1]) - 0.65,
+                               float((x_accion + ancho_accion).max()) + 0.15, float(y[0]) + h_decision)
+
+        # SÍ hacia la acción, retornos morados con punta a la izquierda y cadena de decisiones (NO)
+        self._agregar_flechas(ax, np.full(k, x_decision + w_decision), centro_y, np.full(k, x_accion), centro_y,
+                              0.35, 'black')
+        self._agregar_linea(ax, [return_x, return_x], [float(centro_y[-1]), float(y[0]) + h_decision + 2.5],
+                            'purple', 2, zorder=4)
+        self._agregar_flechas(ax, np.full(k, x_decision), centro_y, np.full(k, return_x), centro_y, 0.3, 'purple')
+        self._agregar_flechas(ax, np.full(k - 1, x_decision + w_decision / 2), y[:-1],
+                              np.full(k - 1, x_decision + w_decision / 2), y[1:] + h_decision, 0.35, 'black')
+
+        t0, cpu0 = time.perf_counter(), time.process_time()
+        mid_x_si = (x_decision + w_decision + x_accion) / 2
+        for i in range(k):
+            condicion, accion = opciones[a + i]
+            ax.text(x_decision + w_decision / 2, centro_y[i], ajustar_texto(condicion, w_decision / 2, 9),
+                    ha='center', va='center', fontsize=9, fontweight='bold', zorder=3, color='black')
+            ax.text(x_accion + ancho_accion[i] / 2, y[i] + 1.5,
+                    ajustar_texto(accion, ancho_accion[i] - 2 * self.margen_texto, 10),
+                    ha='center', va='center', fontsize=10, fontweight='bold', linespacing=1.4,
+                    zorder=3, color='black')
+            ax.text(mid_x_si, centro_y[i] + 0.5, 'SÍ', ha='center', va='center', fontsize=9, fontweight='bold',
+                    color='green', bbox=dict(boxstyle="round,pad=0.2", facecolor="white", alpha=0.9))
+        self.instrumentacion.acumular('texto', time.perf_counter() - t0, time.process_time() - cpu0)
+
+        # Conectores de continuación
+        x_cadena = x_decision + w_decision / 2
+        entrada = self.crear_conector(ax, x_cadena, float(y[0]) + h_decision + 3.2,
+                                      'Desde\nLeer opción' if pagina == 0 else f'De pág. {pagina}')
+        self.crear_flecha_perfecta(ax, *entrada['bottom'], x_cadena, float(y[0]) + h_decision)
+        self.crear_conector(ax, return_x, float(y[0]) + h_decision + 4.5, 'Al bucle', 'lavender', 'purple')
+        if not ultima:
+            salida = self.crear_conector(ax, x_cadena, float(y[-1]) - 1.2, f'A pág. {pagina + 2}')
+            self.crear_flecha_perfecta(ax, x_cadena, float(y[-1]), *salida['top'], etiqueta='NO')
+
+        self.volcar_lotes(ax)
+        self.ajustar_lienzo(fig, ax)
+        plt.tight_layout()
+        return fig
+
+    def dibujar_ruta(self, ax, ruta):
+        """Dibuja el trazado de una arista; la etiqueta va sobre el último segmento con punta"""
+        arista = ruta.arista
+        ultimo = max(ruta.puntas) if ruta.puntas else None
+        for i, ((x1, y1), (x2, y2)) in enumerate(ruta.segmentos()):
+            if i in ruta.puntas:
+                self.crear_flecha_perfecta(ax, x1, y1, x2, y2, etiqueta=arista.etiqueta if i == ultimo else None,
+                                           color=arista.color)
+            else:
+                self._agregar_linea(ax, [x1, x2], [y1, y2], arista.color, 2, zorder=4)
+
+    @_etapa_figura
+    def crear_diagrama_desde_modelo(self, diagrama):
+        """Dibuja un Diagrama declarativo con las posiciones calculadas por el motor de layout"""
+        import matplotlib.pyplot as plt
+        if isinstance(diagrama, dict):
+            diagrama = Diagrama.desde_dict(diagrama)
+        with self.instrumentacion.etapa('layout', nodos=len(diagrama.nodos), aristas=len(diagrama.aristas)):
+            layout = self.motor_layout.calcular(diagrama)
+        self._limites = None
+        alto_titulo = 5 if diagrama.titulo else 0
+        ancho, alto = layout.ancho, layout.alto + alto_titulo
+        fig, ax = plt.subplots(figsize=(ancho, alto))
+        ax.set_xlim(0, ancho)
+        ax.set_ylim(0, alto)
+        ax.axis('off')
+
+        if diagrama.titulo:
+            self.crear_titulo(ax, 1, layout.alto + 0.5, ancho - 2, 3.5, diagrama.titulo)
+
+        for nodo in diagrama.nodos.values():
+            crear = self.crear_rombo if nodo.forma == 'rombo' else self.crear_rectangulo
+            crear(ax, nodo.x, nodo.y, nodo.ancho, nodo.alto, nodo.texto, nodo.color, nodo.fontsize)
+
+        for ruta in calcular_rutas(diagrama, self.motor_layout.margen / 2):
+            self.dibujar_ruta(ax, ruta)
+
+        self.volcar_lotes(ax)
+        self.ajustar_lienzo(fig, ax)
         plt.tight_layout()
         return fig
 
     def fig_to_base64(self, fig):
+        import matplotlib.pyplot as plt
         buffer = BytesIO()
-        fig.savefig(buffer, format="png", bbox_inches="tight", dpi=300)
-        buffer.seek(0)
-        img_base64 = base64.b64encode(buffer.read()).decode("utf-8")
+        fig.savefig(buffer, format="png", bbox_inches="tight", dpi=self.calcular_dpi(fig))
+        img_base64 = base64.b64encode(buffer.getbuffer()).decode("ascii")
         plt.close(fig)
         return f'<img src="data:image/png;base64,{img_base64}" class="grafico" style="border-radius: 12px;">'
 
+    def rasterizar_por_bandas(self, fig, n_bandas=None):
+        """Divide el rango Y en franjas horizontales y las rasteriza en paralelo (de arriba abajo)"""
+        import matplotlib.pyplot as plt
+        dpi = self.calcular_dpi(fig)
+        y_min, y_max = fig.axes[0].get_ylim()
+        alto_px = max(1, int(round(fig.get_size_inches()[1] * dpi)))
+        if n_bandas is None:
+            n_bandas = max(self.procesos, -(-alto_px // self.max_alto_banda))
+        n_bandas = max(1, min(n_bandas, alto_px))
+        cortes = [alto_px * i // n_bandas for i in range(n_bandas + 1)]
+        escala = (y_max - y_min) / alto_px
+
+        figura_serializada = pickle.dumps(fig)
+        plt.close(fig)
+        with ProcessPoolExecutor(max_workers=min(self.procesos, n_bandas),
+                                 initializer=_iniciar_trabajador,
+                                 initargs=(figura_serializada,)) as pool:
+            futuros = [pool.submit(_rasterizar_banda, y_max - p1 * escala, y_max - p0 * escala, p1 - p0, dpi)
+                       for p0, p1 in zip(cortes, cortes[1:])]
+            return [futuro.result() for futuro in futuros]
+
+    def unir_bandas(self, bandas):
+        """Apila verticalmente los PNG de las bandas en una sola imagen PNG"""
+        from PIL import Image
+        imagenes = [Image.open(BytesIO(banda)) for banda in bandas]
+        ancho = max(img.width for img in imagenes)
+        unida = Image.new("RGBA", (ancho, sum(img.height for img in imagenes)))
+        y = 0
+        for img in imagenes:
+            unida.paste(img, (0, y))
+            y += img.height
+        buffer = BytesIO()
+        unida.save(buffer, format="PNG")
+        return buffer.getvalue()
+
+    def instrumentar(self, instrumentacion=None, **opciones):
+        """Activa la medición por etapas; las opciones se pasan a Instrumentacion"""
+        self.instrumentacion = instrumentacion or Instrumentacion(**opciones)
+        return self.instrumentacion
+
+    def usar_cache(self, directorio='.cache_diagramas', max_mb=512):
+        """Activa la caché persistente de secciones renderizadas"""
+        self.cache = CacheRender(directorio, int(max_mb * 1024 * 1024))
+        return self.cache
+
+    def huella_render(self, origen):
+        """Hash estable de todo lo que determina el raster de una figura, o None si no es cacheable.
+
+        Incluye los datos de la sección, los parámetros de estilo, layout, paginación y
+        bandas, las versiones de las bibliotecas y las fuentes de todos los módulos de los
+        que depende el dibujo (este y los que importa, transitivamente; ver huella_fuentes).
+        """
+        fuentes = [__file__]
+        if isinstance(origen, Diagrama):
+            contenido = origen.huella()
+        elif callable(origen):
+            # Con functools.partial, sus argumentos (opciones, página, geometría) son datos del dibujo
+            argumentos = []
+            while isinstance(origen, functools.partial):
+                argumentos.append([_datos_huella(origen.args), _datos_huella(origen.keywords)])
+                origen = origen.func
+            # Los diagramas definidos en código dependen del código que los dibuja y de las
+            # constantes de su módulo (p. ej. OPCIONES_MENU), que se leen con su valor actual
+            try:
+                duenio = getattr(origen, '__self__', None)
+                fuentes.append(inspect.getsourcefile(type(duenio) if duenio is not None else origen))
+            except TypeError:
+                return None
+            if fuentes[-1] is None or not os.path.isfile(fuentes[-1]):
+                return None
+            modulo = type(duenio).__module__ if duenio is not None else getattr(origen, '__module__', None)
+            contenido = [getattr(origen, '__qualname__', None), origen.__name__, argumentos,
+                         _constantes_modulo(__name__), _constantes_modulo(modulo)]
+        else:
+            return None
+        motor = self.motor_layout
+        return huella_estable(
+            contenido, huella_fuentes(*fuentes), self.dpi, self.max_megapixeles, self.margen_lienzo,
+            self.margen_texto, self.fig_width, self.fig_height, self.dibujo_por_lotes,
+            # Paginación del switch (decide switch o conector) y reparto en bandas de 'apilar'
+            self.opciones_por_pagina, self.max_alto_banda, self.procesos,
+            [motor.sep_capas, motor.sep_nodos, motor.sep_lateral, motor.margen],
+            [_version('numpy'), _version('Pillow')], self.firma_entorno())
+
+    def firma_entorno(self):
+        """Versiones de matplotlib/FreeType y fuente resuelta; sin importar matplotlib si ya está en caché"""
+        if self._firma_entorno is not None:
+            return self._firma_entorno
+        alias = None
+        if self.cache is not None:
+            alias = huella_estable('entorno', _firma_configuracion_matplotlib())
+            if 'matplotlib' not in sys.modules:
+                self._firma_entorno = self.cache.obtener(alias, registrar=False)
+                if self._firma_entorno is not None:
+                    return self._firma_entorno
+
+        import matplotlib
+        from matplotlib import font_manager, ft2font
+        fuente = font_manager.findfont(font_manager.FontProperties(family=matplotlib.rcParams['font.family'],
+                                                                   weight='bold'))
+        self._firma_entorno = huella_estable(matplotlib.__version__, ft2font.__freetype_version__, fuente)
+        # Solo se memoriza la firma de la configuración por defecto (la que no toca rcParams en código)
+        por_defecto = all(matplotlib.rcParams[k] == matplotlib.rcParamsOrig[k]
+                          for k in matplotlib.rcParams if k.startswith('font.'))
+        if alias is not None and por_defecto:
+            self.cache.guardar(alias, self._firma_entorno)
+        return self._firma_entorno
+
+    def _resolver_figura(self, origen):
+        """Construye la figura de una sección si aún no existe"""
+        if isinstance(origen, Diagrama):
+            return self.crear_diagrama_desde_modelo(origen)
+        if callable(origen):
+            return origen()
+        return origen
+
+    def exportar_png(self, origen, filename):
+        """Escribe el PNG de una figura (Figure, Diagrama o función) pasando por la caché de secciones"""
+        seccion = StringIO()
+        self._escribir_seccion(seccion, SeccionFigura('', origen))
+        with open(filename, 'wb') as f:
+            f.write(png_de_html(seccion.getvalue()))
+
     def agregar_seccion(self, titulo, contenido_html):
-        self.secciones.append(f"<h2>{titulo}</h2>\n{contenido_html}")
+        self.secciones.append(SeccionHTML(f"<h2>{titulo}</h2>\n{contenido_html}"))
+
+    def agregar_figura(self, titulo, fig, teselado=None):
+        """Añade una sección con la figura; el PNG se genera en streaming al exportar.
+
+        fig puede ser una Figure, un Diagrama o una función que la construya; en los
+        dos últimos casos, con la caché activa, la figura solo se construye si falta.
+
+        teselado='unir' rasteriza por bandas en paralelo y las une en un PNG;
+        teselado='apilar' emite cada banda como una imagen con carga diferida.
+        """
+        if teselado not in (None, 'unir', 'apilar'):
+            raise ValueError(f"Teselado desconocido: {teselado}")
+        self.secciones.append(SeccionFigura(titulo, fig, teselado))
+
+    def agregar_diagrama_svg(self, titulo, diagrama):
+        """Añade una sección con el Diagrama como SVG vectorial incrustado (sin matplotlib ni raster)"""
+        from svg_diagrama import diagrama_a_svg
+        if isinstance(diagrama, dict):
+            diagrama = Diagrama.desde_dict(diagrama)
+        svg = diagrama_a_svg(diagrama, self.motor_layout, atributos='class="grafico" style="height: auto;"')
+        self.agregar_seccion(titulo, svg)
 
-    def exportar_html(self, filename="diagrama_flujo_parqueadero_con_flechas_moradas.html"):
-        html = f"""
+    def agregar_diagrama_cliente(self, titulo, diagrama):
+        """Añade una sección con el Diagrama como JSON compacto que dibuja el navegador (sin raster)"""
+        self.secciones.append(SeccionHTML(f"<h2>{titulo}</h2>\n{self._html_cliente(diagrama)}", usa_cliente=True))
+
+    def _html_cliente(self, diagrama):
+        from cliente_diagrama import html_diagrama_cliente
+        if isinstance(diagrama, dict):
+            diagrama = Diagrama.desde_dict(diagrama)
+        return html_diagrama_cliente(diagrama, self.motor_layout, self.dpi, clases='grafico',
+                                     estilo='border-radius: 12px; width: 100%; cursor: grab; '
+                                            'touch-action: none; transform: none;')
+
+    def agregar_diagrama_completo(self, titulo, opciones=None):
+        """Añade el diagrama del parqueadero; si el switch no cabe, sus páginas van como secciones aparte"""
+        if opciones is None:
+            self.agregar_figura(titulo, self.crear_diagrama_completo)
+            return
+        if not opciones:
+            raise ValueError("El switch del diagrama necesita al menos una opción")
+        self.agregar_figura(titulo, functools.partial(self.crear_diagrama_completo, opciones))
+        if len(opciones) > self.opciones_por_pagina:
+            self.agregar_opciones_paginadas(titulo, opciones)
+
+    def agregar_opciones_paginadas(self, titulo, opciones):
+        """Una sección por página del switch; cada figura se construye y libera al exportar"""
+        geometria = geometria_opciones(opciones, 0.0, por_pagina=self.opciones_por_pagina)
+        for pagina in range(geometria['paginas']):
+            self.agregar_figura(f"{titulo} · Opciones (pág. {pagina + 1}/{geometria['paginas']})",
+                                functools.partial(self.crear_pagina_opciones, opciones, pagina, geometria))
+
+    def _html_cabecera(self):
+        """Parte del documento anterior a las secciones"""
+        return f"""
         <!DOCTYPE html>
         <html lang="es">
         <head>
@@ -367,6 +1038,10 @@ class GeneradorDiagramaParqueadero:
                     box-shadow: 0 15px 40px rgba(0,0,0,0.4);
                     transition: transform 0.3s ease;
                 }}
+                .teselas img {{
+                    display: block;
+                    width: 100%;
+                }}
                 .grafico:hover {{
                     transform: scale(1.02);
                 }}
@@ -456,11 +1131,36 @@ class GeneradorDiagramaParqueadero:
                 }}
             </style>
             <script>
-                function descargarDiagrama() {{
+                async function descargarDiagrama() {{
                     const img = document.querySelector('.grafico');
                     const link = document.createElement('a');
-                    link.href = img.src;
+                    // Con imágenes externas se descarga el PNG a resolución completa
+                    link.href = img.dataset.descarga || img.src;
                     link.download = 'diagrama_sistema_parqueadero.png';
+                    if (img.tagName === 'CANVAS') {{
+                        // Diagrama dibujado en el navegador: se rasteriza ahora a la resolución de exportación
+                        const canvas = rasterizarDiagrama(img, Number(img.dataset.dpi));
+                        const png = await new Promise(resolver => canvas.toBlob(resolver, 'image/png'));
+                        link.href = URL.createObjectURL(png);
+                    }} else if (img.tagName.toLowerCase() === 'svg') {{
+                        // SVG nativo: se descarga el propio vector
+                        const svg = new XMLSerializer().serializeToString(img);
+                        link.href = URL.createObjectURL(new Blob([svg], {{type: 'image/svg+xml'}}));
+                        link.download = 'diagrama_sistema_parqueadero.svg';
+                    }} else if (img.tagName !== 'IMG') {{
+                        // Diagrama en teselas: se recomponen en un canvas antes de descargar
+                        const teselas = Array.from(img.querySelectorAll('img'));
+                        await Promise.all(teselas.map(t => {{ t.loading = 'eager'; return t.decode(); }}));
+                        const canvas = document.createElement('canvas');
+                        canvas.width = teselas[0].naturalWidth;
+                        canvas.height = teselas.reduce((total, t) => total + t.naturalHeight, 0);
+                        let y = 0;
+                        for (const t of teselas) {{
+                            canvas.getContext('2d').drawImage(t, 0, y);
+                            y += t.naturalHeight;
+                        }}
+                        link.href = canvas.toDataURL('image/png');
+                    }}
                     document.body.appendChild(link);
                     link.click();
                     document.body.removeChild(link);
@@ -491,7 +1191,16 @@ class GeneradorDiagramaParqueadero:
                     </p>
                 </div>
                 
-                {"".join([f'<div class="seccion">{sec}</div>' for sec in self.secciones])}
+                """
+
+    def _html_pie(self):
+        """Parte del documento posterior a las secciones"""
+        renderizador = ''
+        if self._con_renderizador:
+            from cliente_diagrama import RENDERIZADOR_JS
+            renderizador = f"<script>{RENDERIZADOR_JS}</script>"
+        return f"""
+                {renderizador}
                 <footer>
                     &copy; {self.titulo} - Flechas Moradas con Punta hacia la Izquierda<br>
                     Generado con Python + Matplotlib
@@ -500,8 +1209,186 @@ class GeneradorDiagramaParqueadero:
         </body>
         </html>
         """
-        with open(filename, "w", encoding="utf-8") as f:
-            f.write(html)
+
+    def _escribir_seccion(self, f, seccion):
+        """Escribe una sección; las figuras se rasterizan y codifican directamente en el archivo"""
+        if isinstance(seccion, SeccionHTML):
+            f.write(f'<div class="seccion">{seccion.contenido}</div>')
+            return
+        if self._cliente:
+            if not isinstance(seccion.figura, Diagrama):
+                raise ValueError(f"La sección '{seccion.titulo}' no tiene un Diagrama: con imagenes='cliente' "
+                                 "solo se exportan modelos, que dibuja el navegador")
+            f.write(f'<div class="seccion"><h2>{seccion.titulo}</h2>\n{self._html_cliente(seccion.figura)}</div>')
+            return
+        if self._recursos is not None:
+            # Las secciones cacheadas solo guardan marcado inline; las externas escriben archivos
+            self._escribir_figura_externa(f, seccion)
+            return
+        huella = self.huella_render(seccion.figura) if self.cache is not None else None
+        if huella is None:
+            self._escribir_figura(f, seccion)
+            return
+
+        clave = huella_estable(huella, seccion.titulo, seccion.teselado)
+        cacheado = self.cache.abrir(clave)
+        if cacheado is not None:
+            with self.instrumentacion.etapa('seccion', cache='acierto') as medicion, cacheado:
+                shutil.copyfileobj(cacheado, f)
+                if medicion is not None:
+                    medicion.bytes = cacheado.tell()
+            return
+        escritor = self.cache.escritor(clave)
+        try:
+            self._escribir_figura(Bifurcador(f, escritor), seccion)
+        except BaseException:
+            escritor.descartar()
+            raise
+        escritor.confirmar()
+
+    def _escribir_figura(self, f, seccion):
+        """Rasteriza la figura de la sección y la escribe codificada en base64"""
+        import matplotlib.pyplot as plt
+        figura = self._resolver_figura(seccion.figura)
+        instr = self.instrumentacion
+        f.write(f'<div class="seccion"><h2>{seccion.titulo}</h2>\n')
+        if seccion.teselado == 'apilar':
+            f.write('<div class="grafico teselas" style="border-radius: 12px;">')
+            with instr.etapa('rasterizado', teselado='apilar') as medicion:
+                bandas = self.rasterizar_por_bandas(figura)
+                if medicion is not None:
+                    medicion.bytes = sum(len(banda) for banda in bandas)
+            with instr.etapa('base64'):
+                for banda in bandas:
+                    f.write('<img loading="lazy" alt="" src="data:image/png;base64,')
+                    codificador = EscritorBase64(f)
+                    codificador.write(banda)
+                    codificador.close()
+                    f.write('">')
+            f.write('</div></div>')
+            return
+
+        f.write(PREFIJO_PNG)
+        if seccion.teselado == 'unir':
+            codificador = EscritorBase64(f)
+            with instr.etapa('rasterizado', teselado='unir'):
+                bandas = self.rasterizar_por_bandas(figura)
+            with instr.etapa('png') as medicion:
+                codificador.write(self.unir_bandas(bandas))
+                codificador.close()
+                if medicion is not None:
+                    medicion.bytes = codificador.bytes_escritos
+        else:
+            # savefig no escribe nada hasta empezar a comprimir: el primer bloque separa
+            # el rasterizado Agg (con la maquetación de texto) de la compresión PNG
+            instr.iniciar('rasterizado')
+            codificador = EscritorBase64(f, al_primer_bloque=lambda: (instr.terminar(), instr.iniciar('png')))
+            try:
+                figura.savefig(codificador, format="png", bbox_inches="tight", dpi=self.calcular_dpi(figura))
+                codificador.close()
+            finally:
+                # Se cierra la etapa abierta ('rasterizado' o 'png') aunque savefig falle
+                plt.close(figura)
+                instr.terminar(bytes=codificador.bytes_escritos)
+        f.write('" class="grafico" style="border-radius: 12px;"></div>')
+
+    def _escribir_figura_externa(self, f, seccion):
+        """Guarda la figura como PNG, WebP y vista previa junto al HTML y la referencia con srcset"""
+        import matplotlib.pyplot as plt
+        from PIL import Image
+        directorio, relativo, n = self._recursos
+        self._recursos = (directorio, relativo, n + 1)
+        nombre = f"figura{n + 1}"
+        figura = self._resolver_figura(seccion.figura)
+        instr = self.instrumentacion
+        f.write(f'<div class="seccion"><h2>{seccion.titulo}</h2>\n')
+
+        if seccion.teselado == 'apilar':
+            with instr.etapa('rasterizado', teselado='apilar'):
+                bandas = self.rasterizar_por_bandas(figura)
+            f.write('<div class="grafico teselas" style="border-radius: 12px;">')
+            for i, banda in enumerate(bandas):
+                with open(os.path.join(directorio, f"{nombre}-{i}.png"), "wb") as archivo:
+                    archivo.write(banda)
+                f.write(f'<img loading="lazy" decoding="async" alt="" src="{relativo}/{nombre}-{i}.png">')
+            f.write('</div></div>')
+            return
+
+        ruta_png = os.path.join(directorio, nombre + ".png")
+        with instr.etapa('rasterizado') as medicion:
+            if seccion.teselado == 'unir':
+                with open(ruta_png, "wb") as archivo:
+                    archivo.write(self.unir_bandas(self.rasterizar_por_bandas(figura)))
+            else:
+                figura.savefig(ruta_png, format="png", bbox_inches="tight", dpi=self.calcular_dpi(figura))
+                plt.close(figura)
+            if medicion is not None:
+                medicion.bytes = os.path.getsize(ruta_png)
+
+        with instr.etapa('webp') as medicion:
+            with Image.open(ruta_png) as imagen:
+                ancho, alto = imagen.size
+                # WebP no admite lados de más de 16383 px: la versión WebP se reduce si hace falta
+                escala = min(1.0, self.max_lado_webp / max(ancho, alto))
+                ancho_webp, alto_webp = max(1, int(ancho * escala)), max(1, int(alto * escala))
+                grande = imagen if escala == 1.0 else imagen.resize((ancho_webp, alto_webp), Image.LANCZOS)
+                grande.save(os.path.join(directorio, nombre + ".webp"), "WEBP", quality=90, method=4)
+                ancho_previa = min(self.ancho_vista_previa, ancho_webp)
+                previa = grande.resize((ancho_previa, max(1, round(alto_webp * ancho_previa / ancho_webp))),
+                                       Image.LANCZOS)
+                previa.save(os.path.join(directorio, nombre + "-previa.webp"), "WEBP", quality=80)
+            if medicion is not None:
+                medicion.bytes = (os.path.getsize(os.path.join(directorio, nombre + ".webp")) +
+                                  os.path.getsize(os.path.join(directorio, nombre + "-previa.webp")))
+
+        base = f"{relativo}/{nombre}"
+        f.write(f'<picture>'
+                f'<source type="image/webp" sizes="(max-width: 1400px) 100vw, 1340px" '
+                f'srcset="{base}-previa.webp {ancho_previa}w, {base}.webp {ancho_webp}w">'
+                f'<img src="{base}.png" width="{ancho}" height="{alto}" loading="lazy" decoding="async" '
+                f'alt="{escape(seccion.titulo)}" class="grafico" data-descarga="{base}.png" '
+                f'style="border-radius: 12px; height: auto;">'
+                f'</picture></div>')
+
+    def exportar_html(self, filename="diagrama_flujo_parqueadero_con_flechas_moradas.html", imagenes="inline"):
+        """Exporta el documento; imagenes='externas' guarda las figuras en <nombre>_img/ (PNG, WebP y vista previa).
+
+        imagenes='cliente' no rasteriza nada: las secciones de Diagrama se exportan como
+        JSON compacto que dibuja el navegador (ver agregar_diagrama_cliente).
+        """
+        if imagenes not in ("inline", "externas", "cliente"):
+            raise ValueError(f"Modo de imágenes desconocido: {imagenes}")
+        self._cliente = imagenes == "cliente"
+        # El renderizador se incluye solo si alguna de las secciones de esta exportación lo usa
+        self._con_renderizador = any(s.usa_cliente if isinstance(s, SeccionHTML) else self._cliente
+                                     for s in self.secciones)
+        if imagenes == "externas":
+            relativo = os.path.splitext(os.path.basename(filename))[0] + "_img"
+            directorio = os.path.join(os.path.dirname(os.path.abspath(filename)), relativo)
+            os.makedirs(directorio, exist_ok=True)
+            self._recursos = (directorio, relativo, 0)
+        # Se escribe por partes: nunca se construye el documento completo en memoria.
+        # El documento va a un temporal que solo reemplaza al anterior si termina bien
+        temporal = filename + ".tmp"
+        try:
+            with self.instrumentacion.etapa('html', secciones=len(self.secciones)) as medicion:
+                try:
+                    with open(temporal, "w", encoding="utf-8") as f:
+                        f.write(self._html_cabecera())
+                        for seccion in self.secciones:
+                            self._escribir_seccion(f, seccion)
+                        f.write(self._html_pie())
+                    os.replace(temporal, filename)
+                except BaseException:
+                    if os.path.exists(temporal):
+                        os.remove(temporal)
+                    raise
+                if medicion is not None:
+                    medicion.bytes = os.path.getsize(filename)
+        finally:
+            self._recursos = None
+            self._cliente = False
+            self._con_renderizador = False
         print(f"✅ Diagrama con flechas moradas mejoradas generado: {filename}")
 
 
@@ -510,8 +1397,8 @@ if __name__ == "__main__":
     generador = GeneradorDiagramaParqueadero("Sistema de Gestión de Parqueadero")
 
     print("🚀 Generando diagrama con flechas moradas con punta hacia la izquierda...")
-    figura = generador.crear_diagrama_completo()
-    img_html = generador.fig_to_base64(figura)
+    # Con la caché activa el diagrama solo se construye y rasteriza si cambió
+    generador.usar_cache()
 
     # Descripción de mejoras
     mejoras = """
@@ -545,11 +1432,14 @@ if __name__ == "__main__":
     """
 
     # Agregar secciones
-    generador.agregar_seccion("📋 Diagrama de Flujo con Flechas Mejoradas", img_html)
+    generador.agregar_figura("📋 Diagrama de Flujo con Flechas Mejoradas", generador.crear_diagrama_completo)
+    from indice_ocupacion import diagrama_menu
+    generador.agregar_figura("🗂️ Menú con el Índice de Ocupación", diagrama_menu())
     generador.agregar_seccion("✅ Mejoras Implementadas", mejoras)
     generador.agregar_seccion("⚙️ Detalles Técnicos", descripcion_tecnica)
 
     # Exportar
     generador.exportar_html("diagrama_flujo_parqueadero_con_flechas_moradas.html")
     print("🎉 ¡Diagrama con flechas moradas mejoradas completado!")
-    print("📄 Archivo generado: diagrama_flujo_parqueadero_con_flechas_moradas.html")
\ No newline at end of file
+    print("📄 Archivo generado: diagrama_flujo_parqueadero_con_flechas_moradas.html")
+    print(f"🗄️ Caché: {generador.cache.estadisticas()}")
\ No newline at end of file
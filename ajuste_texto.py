@@ -0,0 +1,75 @@
+from functools import lru_cache
+
+PUNTOS_POR_UNIDAD = 72  # en los diagramas 1 unidad de datos = 1 pulgada
+ANCHO_MEDIO_CARACTER = 0.62  # avance medio de un carácter en negrita, en fracciones del tamaño de fuente
+
+
+def ruta_fuente(fontweight='bold'):
+    """Archivo de la fuente activa para un peso dado"""
+    import matplotlib
+    return _ruta_fuente(fontweight, tuple(matplotlib.rcParams['font.family']))
+
+
+@lru_cache(maxsize=32)
+def _ruta_fuente(fontweight, familia):
+    from matplotlib import font_manager
+    return font_manager.findfont(font_manager.FontProperties(family=list(familia), weight=fontweight))
+
+
+@lru_cache(maxsize=32)
+def _fuente(ruta):
+    from matplotlib.ft2font import FT2Font
+    return FT2Font(ruta)
+
+
+@lru_cache(maxsize=8192)
+def ancho_palabra(palabra, ruta, fontsize):
+    """Ancho en unidades de datos de un texto de una sola línea (estimado si ruta es None)"""
+    if ruta is None:
+        return len(palabra) * fontsize * ANCHO_MEDIO_CARACTER / PUNTOS_POR_UNIDAD
+    fuente = _fuente(ruta)
+    fuente.set_size(fontsize, PUNTOS_POR_UNIDAD)
+    fuente.set_text(palabra, 0.0)
+    ancho, _ = fuente.get_width_height()
+    return ancho / 64 / PUNTOS_POR_UNIDAD
+
+
+def ajustar_texto(texto, ancho, fontsize, fontweight='bold', estimado=False):
+    """Reparte el texto en líneas que caben en 'ancho' según la métrica real de la fuente.
+
+    Con estimado=True se usa un ancho medio por carácter y no se carga matplotlib
+    (para salidas que no rasteriza matplotlib, como el SVG nativo).
+    """
+    ruta = None if estimado else ruta_fuente(fontweight)
+    return _ajustar(texto, ruta, fontsize, round(ancho, 3))
+
+
+@lru_cache(maxsize=4096)
+def _ajustar(texto, ruta, fontsize, ancho):
+    # El ancho de ' ' aislado no incluye el avance; se deduce de 'a a'
+    espacio = ancho_palabra('a a', ruta, fontsize) - 2 * ancho_palabra('a', ruta, fontsize)
+    lineas = []
+    # Los saltos de línea explícitos se respetan; solo se reparten las líneas demasiado anchas
+    for parrafo in texto.split('\n'):
+        if ancho_palabra(parrafo, ruta, fontsize) <= ancho:
+            lineas.append(parrafo)
+            continue
+        actual = []
+        ancho_actual = 0.0
+        for palabra in parrafo.split():
+            w = ancho_palabra(palabra, ruta, fontsize)
+            if actual and ancho_actual + espacio + w > ancho:
+                lineas.append(' '.join(actual))
+                actual = [palabra]
+                ancho_actual = w
+            else:
+                ancho_actual += (espacio if actual else 0.0) + w
+                actual.append(palabra)
+        if actual:
+            lineas.append(' '.join(actual))
+    return '\n'.join(lineas)
+
+
+def estadisticas_cache():
+    """Aciertos y fallos de las cachés de ajuste y de medición"""
+    return {'ajustes': _ajustar.cache_info()._asdict(), 'palabras': ancho_palabra.cache_info()._asdict()}
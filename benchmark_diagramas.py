@@ -0,0 +1,207 @@
+import argparse
+import base64
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from modelo_diagrama import Diagrama, MotorLayout
+
+ETAPAS = ('layout', 'artistas', 'rasterizado', 'base64', 'html')
+
+
+def diagrama_sintetico(n_nodos):
+    """Diagrama tipo menú: bucle principal y una cadena de decisiones con su acción y retorno"""
+    diagrama = Diagrama(f'Sintético {n_nodos} nodos')
+    diagrama.agregar_nodo('inicio', 'INICIO', color='lightcoral', ancho=6)
+    diagrama.agregar_nodo('bucle', "entrada != 's'", forma='rombo', ancho=8, alto=4)
+    diagrama.agregar_arista('inicio', 'bucle')
+    previo, i = 'bucle', 0
+    while len(diagrama.nodos) + 2 <= n_nodos:
+        i += 1
+        diagrama.agregar_nodo(f'opcion_{i}', f"entrada == '{i}'", forma='rombo')
+        diagrama.agregar_nodo(f'accion_{i}', f'Acción número {i} del menú de opciones', alto=4)
+        diagrama.agregar_arista(previo, f'opcion_{i}', 'NO' if i > 1 else 'SÍ')
+        diagrama.agregar_arista(f'opcion_{i}', f'accion_{i}', 'SÍ', lateral=True)
+        diagrama.agregar_arista(f'accion_{i}', 'bucle', color='purple')
+        previo = f'opcion_{i}'
+    return diagrama
+
+
+def medir(funcion, repeticiones=1, memoria=True):
+    """Ejecuta la función y devuelve (resultado, métricas); la memoria se mide en una pasada aparte"""
+    tiempos, cpu = [], []
+    resultado = None
+    for _ in range(repeticiones):
+        inicio, inicio_cpu = time.perf_counter(), time.process_time()
+        resultado = funcion()
+        tiempos.append(time.perf_counter() - inicio)
+        cpu.append(time.process_time() - inicio_cpu)
+    metricas = {
+        'segundos': statistics.median(tiempos),
+        'segundos_min': min(tiempos),
+        'cpu': statistics.median(cpu),
+    }
+    if memoria:
+        # tracemalloc ralentiza mucho el código Python: no se mezcla con la medición de tiempo
+        tracemalloc.start()
+        try:
+            resultado = funcion()
+            metricas['pico_memoria'] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return resultado, metricas
+
+
+def _rss_maximo():
+    try:
+        import resource
+    except ImportError:
+        return None
+    maximo = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maximo if sys.platform == 'darwin' else maximo * 1024
+
+
+def ejecutar(tamanos, lista_dpi, repeticiones=3, memoria=True, max_megapixeles=None):
+    """Mide cada etapa del pipeline para cada tamaño de diagrama y cada dpi"""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    from DiagramaFlujoParking import GeneradorDiagramaParqueadero
+
+    resultados = []
+
+    def registrar(nodos, dpi, etapa, metricas, **extra):
+        fila = {'nodos': nodos, 'dpi': dpi, 'etapa': etapa, **metricas, **extra, 'rss_maximo': _rss_maximo()}
+        resultados.append(fila)
+        detalle = f"{fila['segundos']:.4f} s" if 'segundos' in fila else fila.get('error', '')
+        print(f"⏱️ {str(nodos):>11} nodos  dpi={str(dpi):>4}  {etapa:<12} {detalle}")
+
+    for tamano in tamanos:
+        generador = GeneradorDiagramaParqueadero(f'Benchmark {tamano}')
+        generador.max_megapixeles = max_megapixeles
+        if tamano == 'parqueadero':
+            def construir():
+                fig = generador.crear_diagrama_completo()
+                plt.close(fig)
+                return fig
+            nodos = tamano
+        else:
+            diagrama = diagrama_sintetico(int(tamano))
+            nodos = len(diagrama.nodos)
+            _, metricas = medir(lambda: MotorLayout().calcular(diagrama), repeticiones, memoria)
+            registrar(nodos, None, 'layout', metricas, aristas=len(diagrama.aristas))
+            generador.motor_layout.calcular(diagrama)
+
+            def construir():
+                fig = generador.crear_diagrama_desde_modelo(diagrama)
+                plt.close(fig)
+                return fig
+
+        fig, metricas = medir(construir, repeticiones, memoria)
+        registrar(nodos, None, 'artistas', metricas, artistas=len(fig.axes[0].get_children()))
+
+        for dpi in lista_dpi:
+            generador.dpi = dpi
+            dpi_efectivo = generador.calcular_dpi(fig)
+            try:
+                def rasterizar():
+                    buffer = io.BytesIO()
+                    fig.savefig(buffer, format='png', bbox_inches='tight', dpi=dpi_efectivo)
+                    return buffer.getvalue()
+                png, metricas = medir(rasterizar, repeticiones, memoria)
+            except Exception as e:
+                registrar(nodos, dpi, 'rasterizado', {}, error=f'{type(e).__name__}: {e}')
+                continue
+            registrar(nodos, dpi, 'rasterizado', metricas, dpi_efectivo=dpi_efectivo, bytes=len(png))
+
+            codificado, metricas = medir(lambda: base64.b64encode(png).decode('ascii'), repeticiones, memoria)
+            registrar(nodos, dpi, 'base64', metricas, bytes=len(codificado))
+
+            with tempfile.TemporaryDirectory() as directorio:
+                destino = os.path.join(directorio, 'benchmark.html')
+
+                def exportar():
+                    generador.secciones = []
+                    generador.agregar_seccion('Diagrama', f'<img src="data:image/png;base64,{codificado}" class="grafico">')
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        generador.exportar_html(destino)
+                    return os.path.getsize(destino)
+                tam_html, metricas = medir(exportar, repeticiones, memoria)
+            registrar(nodos, dpi, 'html', metricas, bytes=tam_html)
+    return resultados
+
+
+def entorno():
+    datos = {'python': platform.python_version(), 'plataforma': platform.platform(),
+             'procesador': platform.processor(), 'nucleos': os.cpu_count()}
+    for paquete in ('matplotlib', 'numpy', 'PIL'):
+        try:
+            datos[paquete] = __import__(paquete).__version__
+        except ImportError:
+            datos[paquete] = None
+    return datos
+
+
+def comparar(actual, base, tolerancia=0.10, minimo=0.005):
+    """Lista las etapas cuyo tiempo empeoró más que la tolerancia respecto a una ejecución previa.
+
+    Las diferencias absolutas por debajo de 'minimo' segundos se consideran ruido.
+    """
+    previos = {(r['nodos'], r['dpi'], r['etapa']): r for r in base['resultados'] if 'segundos' in r}
+    regresiones = []
+    for r in actual['resultados']:
+        previo = previos.get((r['nodos'], r['dpi'], r['etapa']))
+        if previo is None or 'segundos' not in r or not previo['segundos']:
+            continue
+        cambio = r['segundos'] / previo['segundos'] - 1
+        if cambio > tolerancia and r['segundos'] - previo['segundos'] > minimo:
+            regresiones.append({'nodos': r['nodos'], 'dpi': r['dpi'], 'etapa': r['etapa'],
+                                'antes': previo['segundos'], 'ahora': r['segundos'], 'cambio': cambio})
+    return regresiones
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark por etapas del generador de diagramas')
+    parser.add_argument('--tamanos', nargs='+', default=['parqueadero', '10', '100', '1000', '10000'],
+                        help="número de nodos de los diagramas sintéticos ('parqueadero' = diagrama de referencia)")
+    parser.add_argument('--dpi', nargs='+', type=int, default=[50, 100, 300])
+    parser.add_argument('--repeticiones', type=int, default=3)
+    parser.add_argument('--max-megapixeles', type=float, default=50)
+    parser.add_argument('--sin-memoria', action='store_true', help='no medir el pico de memoria')
+    parser.add_argument('--salida', default='benchmark_diagramas.json')
+    parser.add_argument('--comparar', default=None, help='JSON de una ejecución anterior')
+    parser.add_argument('--tolerancia', type=float, default=0.10)
+    args = parser.parse_args(argv)
+
+    informe = {
+        'fecha': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'parametros': vars(args),
+        'resultados': ejecutar(args.tamanos, args.dpi, args.repeticiones, not args.sin_memoria,
+                               args.max_megapixeles),
+        'entorno': entorno(),
+    }
+    with open(args.salida, 'w', encoding='utf-8') as f:
+        json.dump(informe, f, ensure_ascii=False, indent=2)
+    print(f"📄 Resultados: {args.salida}")
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            regresiones = comparar(informe, json.load(f), args.tolerancia)
+        for r in regresiones:
+            print(f"⚠️ Regresión {r['etapa']} ({r['nodos']} nodos, dpi={r['dpi']}): "
+                  f"{r['antes']:.4f} s → {r['ahora']:.4f} s (+{r['cambio']:.0%})")
+        if regresiones:
+            return 1
+        print("✅ Sin regresiones")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,188 @@
+import ast
+import hashlib
+import json
+import os
+from collections import OrderedDict
+
+
+def huella_estable(*partes):
+    """Hash sha256 de datos serializables a JSON, independiente del orden de las claves"""
+    datos = json.dumps(partes, sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=str)
+    return hashlib.sha256(datos.encode('utf-8')).hexdigest()
+
+
+# (ruta, mtime, tamaño) -> (sha256 del archivo, módulos que importa)
+_fuentes_analizadas = {}
+
+
+def _analizar_fuente(ruta):
+    """Hash de un archivo fuente y nombres de primer nivel que importa (también dentro de funciones)"""
+    info = os.stat(ruta)
+    clave = (ruta, info.st_mtime_ns, info.st_size)
+    if clave not in _fuentes_analizadas:
+        with open(ruta, 'rb') as f:
+            datos = f.read()
+        nombres = set()
+        try:
+            arbol = ast.parse(datos, ruta)
+        except (SyntaxError, ValueError):
+            arbol = None
+        for nodo in ast.walk(arbol) if arbol is not None else ():
+            if isinstance(nodo, ast.Import):
+                nombres.update(alias.name.split('.')[0] for alias in nodo.names)
+            elif isinstance(nodo, ast.ImportFrom) and nodo.module and not nodo.level:
+                nombres.add(nodo.module.split('.')[0])
+        _fuentes_analizadas[clave] = (hashlib.sha256(datos).hexdigest(), sorted(nombres))
+    return _fuentes_analizadas[clave]
+
+
+def huella_fuentes(*rutas):
+    """Hash de los archivos fuente y de todos los módulos de su directorio que importan, transitivamente.
+
+    Cubre helpers y constantes de módulo de los que depende el dibujo: cualquier cambio
+    en esos archivos cambia la huella. Los paquetes instalados no se recorren (sus
+    versiones van aparte en la huella de render).
+    """
+    pendientes = [os.path.abspath(ruta) for ruta in rutas]
+    hashes = {}
+    while pendientes:
+        ruta = pendientes.pop()
+        if ruta in hashes:
+            continue
+        hashes[ruta], importados = _analizar_fuente(ruta)
+        directorio = os.path.dirname(ruta)
+        for nombre in importados:
+            candidata = os.path.join(directorio, nombre + '.py')
+            if os.path.isfile(candidata):
+                pendientes.append(candidata)
+    return huella_estable(sorted((os.path.basename(ruta), h) for ruta, h in hashes.items()))
+
+
+class EscritorCache:
+    """Archivo de texto temporal que solo se publica en la caché si se confirma"""
+
+    def __init__(self, cache, clave):
+        self.cache = cache
+        self.clave = clave
+        self._temporal = cache.ruta(clave) + f'.{os.getpid()}.tmp'
+        self._archivo = open(self._temporal, 'w', encoding='utf-8')
+
+    def write(self, texto):
+        return self._archivo.write(texto)
+
+    def confirmar(self):
+        self._archivo.close()
+        os.replace(self._temporal, self.cache.ruta(self.clave))
+        self.cache._registrar(self.clave, os.path.getsize(self.cache.ruta(self.clave)))
+
+    def descartar(self):
+        self._archivo.close()
+        if os.path.exists(self._temporal):
+            os.remove(self._temporal)
+
+
+class Bifurcador:
+    """Reenvía cada escritura a varios destinos de texto"""
+
+    def __init__(self, *destinos):
+        self.destinos = destinos
+
+    def write(self, texto):
+        for destino in self.destinos:
+            destino.write(texto)
+        return len(texto)
+
+
+class CacheRender:
+    """Caché persistente en disco, direccionada por contenido, con expulsión LRU por tamaño"""
+
+    def __init__(self, directorio='.cache_diagramas', max_bytes=512 * 1024 * 1024):
+        self.directorio = directorio
+        self.max_bytes = max_bytes
+        self.aciertos = 0
+        self.fallos = 0
+        self.expulsiones = 0
+        os.makedirs(directorio, exist_ok=True)
+        # Índice clave -> tamaño, del menos al más recientemente usado (según mtime)
+        entradas = []
+        for nombre in os.listdir(directorio):
+            if nombre.endswith('.tmp'):
+                continue
+            ruta = os.path.join(directorio, nombre)
+            info = os.stat(ruta)
+            entradas.append((info.st_mtime, nombre, info.st_size))
+        self._indice = OrderedDict((nombre, tam) for _, nombre, tam in sorted(entradas))
+        self.bytes_totales = sum(self._indice.values())
+
+    def ruta(self, clave):
+        return os.path.join(self.directorio, clave)
+
+    def _registrar(self, clave, tam):
+        self.bytes_totales += tam - self._indice.pop(clave, 0)
+        self._indice[clave] = tam
+        while self.bytes_totales > self.max_bytes and len(self._indice) > 1:
+            antigua, tam_antigua = self._indice.popitem(last=False)
+            self.bytes_totales -= tam_antigua
+            self.expulsiones += 1
+            try:
+                os.remove(self.ruta(antigua))
+            except FileNotFoundError:
+                pass
+
+    def contiene(self, clave):
+        return clave in self._indice
+
+    def abrir(self, clave, registrar=True):
+        """Abre la entrada como texto (y la marca como usada) o devuelve None si no existe.
+
+        Con registrar=False la consulta no cuenta en las estadísticas (metadatos internos).
+        """
+        archivo = None
+        if clave in self._indice:
+            try:
+                archivo = open(self.ruta(clave), encoding='utf-8')
+            except FileNotFoundError:
+                self.bytes_totales -= self._indice.pop(clave)
+        if archivo is None:
+            self.fallos += registrar
+            return None
+        os.utime(self.ruta(clave))
+        self._indice.move_to_end(clave)
+        self.aciertos += registrar
+        return archivo
+
+    def obtener(self, clave, registrar=True):
+        archivo = self.abrir(clave, registrar)
+        if archivo is None:
+            return None
+        with archivo:
+            return archivo.read()
+
+    def guardar(self, clave, texto):
+        escritor = self.escritor(clave)
+        escritor.write(texto)
+        escritor.confirmar()
+
+    def escritor(self, clave):
+        return EscritorCache(self, clave)
+
+    def limpiar(self):
+        for clave in list(self._indice):
+            try:
+                os.remove(self.ruta(clave))
+            except FileNotFoundError:
+                pass
+        self._indice.clear()
+        self.bytes_totales = 0
+
+    def estadisticas(self):
+        consultas = self.aciertos + self.fallos
+        return {
+            'aciertos': self.aciertos,
+            'fallos': self.fallos,
+            'tasa_aciertos': self.aciertos / consultas if consultas else 0.0,
+            'expulsiones': self.expulsiones,
+            'entradas': len(self._indice),
+            'bytes': self.bytes_totales,
+            'max_bytes': self.max_bytes,
+        }
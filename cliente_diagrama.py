@@ -0,0 +1,276 @@
+import json
+from html import escape
+
+from ajuste_texto import PUNTOS_POR_UNIDAD, ajustar_texto, ancho_palabra
+from modelo_diagrama import Diagrama, MotorLayout, calcular_rutas
+from svg_diagrama import DESPLAZAMIENTO_SOMBRA, MARGEN_TEXTO, TAM_PUNTA
+
+FONTSIZE_ETIQUETA = 9
+
+# Renderizador del navegador: dibuja en un <canvas> los datos de diagrama_a_datos con las
+# mismas capas, grosores (en puntos) y colores que el SVG nativo. Arrastrar desplaza, la
+# rueda amplía alrededor del cursor y el doble clic vuelve a encajar el diagrama.
+RENDERIZADOR_JS = r"""
+(function () {
+    const PT = 72, FUENTE = '"DejaVu Sans", Arial, sans-serif';
+
+    function dibujar(ctx, d, s, tx, ty) {
+        const x0 = d.caja[0], y1 = d.caja[3];
+        const X = x => (x - x0) * s + tx, Y = y => (y1 - y) * s + ty, L = pt => pt / PT * s;
+        function texto(cx, cy, t, fs, interlineado) {
+            const lineas = t.split('\n'), alto = L(fs) * interlineado;
+            ctx.font = 'bold ' + L(fs) + 'px ' + FUENTE;
+            ctx.textAlign = 'center';
+            ctx.textBaseline = 'middle';
+            ctx.fillStyle = '#000';
+            lineas.forEach((l, i) => ctx.fillText(l, X(cx), Y(cy) + (i - (lineas.length - 1) / 2) * alto));
+        }
+        function caja(x, y, w, h, r) {
+            ctx.beginPath();
+            if (ctx.roundRect) ctx.roundRect(X(x), Y(y + h), w * s, h * s, r * s);
+            else ctx.rect(X(x), Y(y + h), w * s, h * s);
+        }
+        function forma(n, dx, dy) {
+            const x = n[1] + dx, y = n[2] + dy, w = n[3], h = n[4];
+            ctx.beginPath();
+            if (n[0]) {
+                ctx.moveTo(X(x + w / 2), Y(y + h));
+                ctx.lineTo(X(x + w), Y(y + h / 2));
+                ctx.lineTo(X(x + w / 2), Y(y));
+                ctx.lineTo(X(x), Y(y + h / 2));
+                ctx.closePath();
+            } else {
+                ctx.rect(X(x), Y(y + h), w * s, h * s);
+            }
+        }
+
+        ctx.lineJoin = 'miter';
+        if (d.titulo) {
+            const [x, y, w, h, t] = d.titulo, pad = 0.5;
+            caja(x - pad, y - pad, w + 2 * pad, h + 2 * pad, pad);
+            ctx.fillStyle = '#E6B3FF';
+            ctx.fill();
+            ctx.strokeStyle = '#C8A8E9';
+            ctx.lineWidth = L(3);
+            ctx.stroke();
+            texto(x + w / 2, y + h / 2, t, 18, 1.2);
+        }
+        ctx.fillStyle = 'rgba(128, 128, 128, 0.3)';
+        for (const n of d.nodos) {
+            forma(n, d.sombra, -d.sombra);
+            ctx.fill();
+        }
+        ctx.strokeStyle = '#000';
+        ctx.lineWidth = L(2.5);
+        for (const n of d.nodos) {
+            forma(n, 0, 0);
+            ctx.fillStyle = d.colores[n[5]];
+            ctx.fill();
+            ctx.stroke();
+        }
+
+        // Como en matplotlib, el texto de los nodos (zorder 3) va debajo de las rutas (4)
+        for (const n of d.nodos) texto(n[1] + n[3] / 2, n[2] + n[4] / 2, n[6], n[7], n[0] ? 1.2 : 1.4);
+
+        // Cada tramo con punta termina a media punta para que el trazo no asome por el vértice
+        const t = d.punta;
+        ctx.lineWidth = L(2);
+        for (const [c, p, puntas] of d.rutas) {
+            ctx.strokeStyle = ctx.fillStyle = d.colores[c];
+            const cabezas = [];
+            ctx.beginPath();
+            ctx.moveTo(X(p[0]), Y(p[1]));
+            for (let i = 2; i < p.length; i += 2) {
+                const xa = p[i - 2], ya = p[i - 1], xb = p[i], yb = p[i + 1];
+                if (puntas.includes(i / 2 - 1)) {
+                    const largo = Math.hypot(xb - xa, yb - ya) || 1, ux = (xb - xa) / largo, uy = (yb - ya) / largo;
+                    const recorte = Math.min(t / 2, largo);
+                    ctx.lineTo(X(xb - ux * recorte), Y(yb - uy * recorte));
+                    ctx.moveTo(X(xb), Y(yb));
+                    cabezas.push([xb, yb, ux, uy]);
+                } else {
+                    ctx.lineTo(X(xb), Y(yb));
+                }
+            }
+            ctx.stroke();
+            for (const [xb, yb, ux, uy] of cabezas) {
+                ctx.beginPath();
+                ctx.moveTo(X(xb), Y(yb));
+                ctx.lineTo(X(xb - ux * t - uy * t / 2), Y(yb - uy * t + ux * t / 2));
+                ctx.lineTo(X(xb - ux * t + uy * t / 2), Y(yb - uy * t - ux * t / 2));
+                ctx.closePath();
+                ctx.fill();
+            }
+        }
+
+        for (const [x, y, w, h, e] of d.etiquetas) {
+            caja(x, y, w, h, 0.3 * d.fontsize_etiqueta / PT);
+            ctx.fillStyle = 'rgba(255, 255, 255, 0.95)';
+            ctx.fill();
+            ctx.strokeStyle = 'gray';
+            ctx.lineWidth = L(1);
+            ctx.stroke();
+            texto(x + w / 2, y + h / 2, e, d.fontsize_etiqueta, 1.2);
+        }
+    }
+
+    function preparar(canvas) {
+        const d = JSON.parse(canvas.nextElementSibling.textContent);
+        const W = d.caja[2] - d.caja[0], H = d.caja[3] - d.caja[1];
+        const vista = {s: 0, tx: 0, ty: 0, ancho: 0, alto: 0, base: 1};
+        let pendiente = false;
+        canvas.datosDiagrama = d;
+
+        function encajar() {
+            vista.ancho = canvas.clientWidth;
+            vista.alto = Math.min(vista.ancho * H / W, window.innerHeight * 0.85);
+            canvas.style.height = vista.alto + 'px';
+            vista.base = vista.s = Math.min(vista.ancho / W, vista.alto / H);
+            vista.tx = (vista.ancho - W * vista.s) / 2;
+            vista.ty = (vista.alto - H * vista.s) / 2;
+            pintar();
+        }
+        function pintar() {
+            if (pendiente) return;
+            pendiente = true;
+            requestAnimationFrame(() => {
+                pendiente = false;
+                const dpr = window.devicePixelRatio || 1;
+                canvas.width = Math.round(vista.ancho * dpr);
+                canvas.height = Math.round(vista.alto * dpr);
+                const ctx = canvas.getContext('2d');
+                ctx.setTransform(dpr, 0, 0, dpr, 0, 0);
+                ctx.fillStyle = '#fff';
+                ctx.fillRect(0, 0, vista.ancho, vista.alto);
+                dibujar(ctx, d, vista.s, vista.tx, vista.ty);
+            });
+        }
+
+        canvas.addEventListener('wheel', e => {
+            e.preventDefault();
+            const r = canvas.getBoundingClientRect(), mx = e.clientX - r.left, my = e.clientY - r.top;
+            const s = Math.min(vista.base * 40, Math.max(vista.base * 0.5, vista.s * Math.exp(-e.deltaY * 0.0015)));
+            vista.tx = mx - (mx - vista.tx) * s / vista.s;
+            vista.ty = my - (my - vista.ty) * s / vista.s;
+            vista.s = s;
+            pintar();
+        }, {passive: false});
+        canvas.addEventListener('pointerdown', e => {
+            canvas.setPointerCapture(e.pointerId);
+            canvas.style.cursor = 'grabbing';
+        });
+        canvas.addEventListener('pointermove', e => {
+            if (!canvas.hasPointerCapture(e.pointerId)) return;
+            vista.tx += e.movementX;
+            vista.ty += e.movementY;
+            pintar();
+        });
+        canvas.addEventListener('pointerup', () => { canvas.style.cursor = 'grab'; });
+        canvas.addEventListener('dblclick', encajar);
+        let anchoPrevio = 0;
+        new ResizeObserver(() => {
+            if (canvas.clientWidth !== anchoPrevio) {
+                anchoPrevio = canvas.clientWidth;
+                encajar();
+            }
+        }).observe(canvas);
+    }
+
+    // Diagrama completo en un canvas nuevo a 'dpi' píxeles por unidad, sin pasar del presupuesto de píxeles
+    window.rasterizarDiagrama = function (canvas, dpi, maxMegapixeles = 100, maxLado = 16384) {
+        const d = canvas.datosDiagrama;
+        const W = d.caja[2] - d.caja[0], H = d.caja[3] - d.caja[1];
+        const s = Math.min(dpi, maxLado / W, maxLado / H, Math.sqrt(maxMegapixeles * 1e6 / (W * H)));
+        const salida = document.createElement('canvas');
+        salida.width = Math.ceil(W * s);
+        salida.height = Math.ceil(H * s);
+        const ctx = salida.getContext('2d');
+        ctx.fillStyle = '#fff';
+        ctx.fillRect(0, 0, salida.width, salida.height);
+        dibujar(ctx, d, s, 0, 0);
+        return salida;
+    };
+
+    document.querySelectorAll('canvas.diagrama-cliente').forEach(preparar);
+})();
+"""
+
+
+def _n(valor):
+    """Número compacto para el JSON (2 decimales)"""
+    valor = round(valor, 2)
+    return int(valor) if valor == int(valor) else valor
+
+
+def diagrama_a_datos(diagrama, motor=None, titulo=True):
+    """Geometría ya resuelta del diagrama para el renderizador del navegador.
+
+    Incluye posiciones y formas de los nodos con el texto ya repartido en líneas, las
+    rutas de las aristas como polilíneas con los tramos que llevan punta, las cajas de
+    las etiquetas y una tabla de colores. El navegador no calcula ningún layout.
+    """
+    if isinstance(diagrama, dict):
+        diagrama = Diagrama.desde_dict(diagrama)
+    motor = motor or MotorLayout()
+    layout = motor.calcular(diagrama)
+    rutas = calcular_rutas(diagrama, motor.margen / 2)
+
+    con_titulo = titulo and diagrama.titulo
+    alto_total = layout.alto + (5 if con_titulo else 0)
+    # Con muchos destinos de retorno los carriles laterales pueden salir del margen izquierdo
+    x_min = min((x for ruta in rutas for x, _ in ruta.puntos), default=0.0)
+    colores = {}
+
+    def color(c):
+        return colores.setdefault(c, len(colores))
+
+    nodos = []
+    for nodo in diagrama.nodos.values():
+        if nodo.forma == 'rombo':
+            texto = ajustar_texto(nodo.texto, nodo.ancho / 2, nodo.fontsize, estimado=True)
+        else:
+            texto = ajustar_texto(nodo.texto, nodo.ancho - 2 * MARGEN_TEXTO, nodo.fontsize, estimado=True)
+        nodos.append([int(nodo.forma == 'rombo'), _n(nodo.x), _n(nodo.y), _n(nodo.ancho), _n(nodo.alto),
+                      color(nodo.color), texto, nodo.fontsize])
+
+    trazos, etiquetas = [], []
+    for ruta in rutas:
+        arista = ruta.arista
+        puntos = [_n(v) for punto in ruta.puntos for v in punto]
+        trazos.append([color(arista.color), puntos, sorted(ruta.puntas)])
+        if ruta.puntas and arista.etiqueta:
+            # Sobre el último tramo con punta, desplazada como en crear_flecha_perfecta
+            i = max(ruta.puntas)
+            (x1, y1), (x2, y2) = ruta.puntos[i], ruta.puntos[i + 1]
+            base_y = (y1 + y2) / 2 + (0.7 if x1 == x2 else 0.5)
+            pad = 0.3 * FONTSIZE_ETIQUETA / PUNTOS_POR_UNIDAD
+            ancho = ancho_palabra(arista.etiqueta, None, FONTSIZE_ETIQUETA) + 2 * pad
+            alto = 1.2 * FONTSIZE_ETIQUETA / PUNTOS_POR_UNIDAD + 2 * pad
+            etiquetas.append([_n((x1 + x2) / 2 - ancho / 2), _n(base_y), _n(ancho), _n(alto), arista.etiqueta])
+
+    return {
+        'caja': [_n(min(0.0, x_min - TAM_PUNTA)), 0, _n(layout.ancho), _n(alto_total)],
+        'titulo': [1, _n(layout.alto + 0.5), _n(layout.ancho - 2), 3.5, diagrama.titulo] if con_titulo else None,
+        'sombra': DESPLAZAMIENTO_SOMBRA,
+        'punta': TAM_PUNTA,
+        'fontsize_etiqueta': FONTSIZE_ETIQUETA,
+        'colores': list(colores),
+        'nodos': nodos,
+        'rutas': trazos,
+        'etiquetas': etiquetas,
+    }
+
+
+def html_diagrama_cliente(diagrama, motor=None, dpi=300, clases='', estilo=''):
+    """<canvas> con los datos del diagrama en JSON compacto; lo dibuja RENDERIZADOR_JS.
+
+    'dpi' es la resolución con la que se rasteriza en el navegador al descargar.
+    """
+    datos = json.dumps(diagrama_a_datos(diagrama, motor), ensure_ascii=False, separators=(',', ':'))
+    # '</' dentro de un <script> cerraría la etiqueta antes de tiempo
+    datos = datos.replace('</', '<\\/')
+    titulo = escape((diagrama.titulo or 'Diagrama').replace('\n', ' '))
+    clases = 'diagrama-cliente' + (' ' + clases if clases else '')
+    estilo = f' style="{estilo}"' if estilo else ''
+    return (f'<canvas class="{clases}" role="img" aria-label="{titulo}" data-dpi="{dpi}"{estilo}></canvas>'
+            f'<script type="application/json">{datos}</script>')
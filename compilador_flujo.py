@@ -0,0 +1,398 @@
+import argparse
+import ast
+import importlib.util
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from html import escape
+
+from cache_render import CacheRender, huella_estable
+from modelo_diagrama import Diagrama, Layout, MotorLayout
+
+VERSION_COMPILADOR = 1  # cambiarla invalida los diagramas cacheados
+MAX_LINEAS_BLOQUE = 6
+MAX_CARACTERES_LINEA = 60
+MODULO = '<módulo>'
+
+SIMPLES = (ast.Assign, ast.AugAssign, ast.AnnAssign, ast.Expr, ast.Pass, ast.Delete, ast.Assert,
+           ast.Import, ast.ImportFrom, ast.Global, ast.Nonlocal)
+
+
+def _texto(nodo_ast):
+    """Código de un nodo en una línea, recortado para caber en una caja"""
+    texto = ast.unparse(nodo_ast).split('\n')[0]
+    return texto if len(texto) <= MAX_CARACTERES_LINEA else texto[:MAX_CARACTERES_LINEA - 1] + '…'
+
+
+class ConstructorFlujo:
+    """Traduce una lista de sentencias a nodos y aristas de un Diagrama.
+
+    Cada método recibe las salidas pendientes del bloque anterior, tuplas
+    (origen, etiqueta, lateral, color), y devuelve las salidas del suyo.
+    """
+
+    def __init__(self, titulo):
+        self.diagrama = Diagrama(titulo)
+        self._contador = 0
+        self._bucles = []    # pila de (cabeza, salidas por break)
+        self._retornos = []  # salidas de los return, que van al nodo FIN
+
+    def nodo(self, texto, forma='rectangulo', color=None):
+        self._contador += 1
+        id = f'n{self._contador}'
+        alto = max(2.5, 1.0 + 0.3 * (texto.count('\n') + 1)) if forma == 'rectangulo' else None
+        self.diagrama.agregar_nodo(id, texto, forma=forma, color=color, alto=alto)
+        return id
+
+    def conectar(self, pendientes, destino):
+        for origen, etiqueta, lateral, color in pendientes:
+            self.diagrama.agregar_arista(origen, destino, etiqueta, color, lateral)
+
+    def funcion(self, nombre, cuerpo, firma=None):
+        inicio = self.nodo(f'INICIO\n{firma or nombre}', color='lightcoral')
+        salidas = self.bloque(cuerpo, [(inicio, None, False, 'black')])
+        fin = self.nodo('FIN', color='lightcoral')
+        self.conectar(salidas + self._retornos, fin)
+        return self.diagrama
+
+    def bloque(self, sentencias, pendientes):
+        simples = []
+        for sentencia in sentencias:
+            if isinstance(sentencia, SIMPLES) and len(simples) < MAX_LINEAS_BLOQUE:
+                simples.append(sentencia)
+                continue
+            if simples:
+                pendientes = self._simples(simples, pendientes)
+                simples = []
+            if isinstance(sentencia, SIMPLES):
+                simples.append(sentencia)
+            else:
+                pendientes = self.sentencia(sentencia, pendientes)
+        if simples:
+            pendientes = self._simples(simples, pendientes)
+        return pendientes
+
+    def _simples(self, sentencias, pendientes):
+        id = self.nodo('\n'.join(_texto(s) for s in sentencias), color='lightgreen')
+        self.conectar(pendientes, id)
+        return [(id, None, False, 'black')]
+
+    def sentencia(self, s, pendientes):
+        if isinstance(s, ast.If):
+            return self._si(s, pendientes)
+        if isinstance(s, (ast.While, ast.For, ast.AsyncFor)):
+            return self._bucle(s, pendientes)
+        if isinstance(s, ast.Return):
+            id = self.nodo(_texto(s), color='lightcoral')
+            self.conectar(pendientes, id)
+            self._retornos.append((id, None, False, 'black'))
+            return []
+        if isinstance(s, ast.Raise):
+            id = self.nodo(_texto(s), color='lightcoral')
+            self.conectar(pendientes, id)
+            return []
+        if isinstance(s, ast.Break):
+            if self._bucles:
+                self._bucles[-1][1].extend(pendientes)
+            return []
+        if isinstance(s, ast.Continue):
+            if self._bucles:
+                self.conectar([(o, e, False, 'purple') for o, e, _, _ in pendientes], self._bucles[-1][0])
+            return []
+        if isinstance(s, (ast.With, ast.AsyncWith)):
+            id = self.nodo('with ' + ', '.join(_texto(item) for item in s.items), color='wheat')
+            self.conectar(pendientes, id)
+            return self.bloque(s.body, [(id, None, False, 'black')])
+        if isinstance(s, ast.Try) or type(s).__name__ == 'TryStar':
+            return self._intento(s, pendientes)
+        if isinstance(s, getattr(ast, 'Match', ())):
+            return self._casos(s, pendientes)
+        # def, class y cualquier otra sentencia compuesta se muestran como una caja
+        id = self.nodo(_texto(s), color='lightgreen')
+        self.conectar(pendientes, id)
+        return [(id, None, False, 'black')]
+
+    def _si(self, s, pendientes):
+        """if/elif/else: la condición baja por 'NO' y cada rama sale lateral por 'SÍ'"""
+        salidas = []
+        while True:
+            rombo = self.nodo(_texto(s.test), forma='rombo')
+            self.conectar(pendientes, rombo)
+            salidas += self.bloque(s.body, [(rombo, 'SÍ', True, 'black')])
+            pendientes = [(rombo, 'NO', False, 'black')]
+            if len(s.orelse) == 1 and isinstance(s.orelse[0], ast.If):
+                s = s.orelse[0]
+                continue
+            break
+        if s.orelse:
+            return salidas + self.bloque(s.orelse, pendientes)
+        return salidas + pendientes
+
+    def _bucle(self, s, pendientes):
+        """while/for: el cuerpo baja por 'SÍ' y vuelve a la cabeza con una arista morada"""
+        if isinstance(s, ast.While):
+            rombo, si, no = self.nodo(_texto(s.test), forma='rombo'), 'SÍ', 'NO'
+        else:
+            rombo = self.nodo(f'for {_texto(s.target)} in {_texto(s.iter)}', forma='rombo')
+            si, no = 'SIGUIENTE', 'FIN'
+        self.conectar(pendientes, rombo)
+        self._bucles.append((rombo, []))
+        cuerpo = self.bloque(s.body, [(rombo, si, False, 'black')])
+        _, rupturas = self._bucles.pop()
+        self.conectar([(o, e, False, 'purple') for o, e, _, _ in cuerpo], rombo)
+        salidas = [(rombo, no, True, 'black')]
+        if s.orelse:
+            salidas = self.bloque(s.orelse, salidas)
+        return salidas + rupturas
+
+    def _intento(self, s, pendientes):
+        intento = self.nodo('try', color='wheat')
+        self.conectar(pendientes, intento)
+        salidas = self.bloque(s.body + s.orelse, [(intento, None, False, 'black')])
+        for manejador in s.handlers:
+            tipo = _texto(manejador.type) if manejador.type is not None else ''
+            captura = self.nodo(f'except {tipo}'.strip(), color='wheat')
+            self.conectar([(intento, 'excepción', True, 'red')], captura)
+            salidas += self.bloque(manejador.body, [(captura, None, False, 'black')])
+        if s.finalbody:
+            salidas = self.bloque(s.finalbody, salidas)
+        return salidas
+
+    def _casos(self, s, pendientes):
+        salidas = []
+        for caso in s.cases:
+            condicion = f'{_texto(s.subject)} ~ {ast.unparse(caso.pattern)}'
+            if caso.guard is not None:
+                condicion += f' if {_texto(caso.guard)}'
+            rombo = self.nodo(condicion, forma='rombo')
+            self.conectar(pendientes, rombo)
+            salidas += self.bloque(caso.body, [(rombo, 'SÍ', True, 'black')])
+            pendientes = [(rombo, 'NO', False, 'black')]
+        return salidas + pendientes
+
+
+def unidades(arbol, fuente):
+    """(nombre calificado, firma, cuerpo, código fuente) de cada función y del código de módulo"""
+    resultado = []
+    de_modulo = [s for s in arbol.body if not isinstance(s, (ast.FunctionDef, ast.AsyncFunctionDef,
+                                                              ast.ClassDef, ast.Import, ast.ImportFrom))]
+    if de_modulo and not (len(de_modulo) == 1 and isinstance(de_modulo[0], ast.Expr)):
+        codigo = '\n'.join(ast.get_source_segment(fuente, s) or '' for s in de_modulo)
+        resultado.append((MODULO, None, de_modulo, codigo))
+    pendientes = [('', arbol)]
+    while pendientes:
+        prefijo, padre = pendientes.pop(0)
+        for s in getattr(padre, 'body', []):
+            if isinstance(s, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                nombre = prefijo + s.name
+                firma = f'{s.name}({ast.unparse(s.args)})'
+                resultado.append((nombre, firma, s.body, ast.get_source_segment(fuente, s)))
+                pendientes.append((nombre + '.', s))
+            elif isinstance(s, ast.ClassDef):
+                pendientes.append((prefijo + s.name + '.', s))
+    return resultado
+
+
+def compilar_funcion(nombre, firma, cuerpo, titulo=None):
+    """Diagrama de flujo de una función (o del código de módulo)"""
+    return ConstructorFlujo(titulo or nombre).funcion(nombre, cuerpo, firma)
+
+
+def _clave_funcion(ruta, nombre, codigo, motor):
+    return huella_estable('flujo', VERSION_COMPILADOR, os.path.basename(ruta), nombre, codigo,
+                          [motor.sep_capas, motor.sep_nodos, motor.sep_lateral, motor.margen])
+
+
+def compilar_archivo(ruta, cache=None):
+    """Compila todas las funciones de un archivo reutilizando las cacheadas.
+
+    Si el archivo no cambió no se vuelve a parsear; si cambió, solo se compilan y
+    se recalcula el layout de las funciones cuyo código es distinto. 'cache' es una
+    CacheRender ya abierta: abrirla lista el directorio, así que se comparte entre archivos.
+    """
+    inicio = time.perf_counter()
+    motor = MotorLayout()
+    resultado = {'archivo': ruta, 'estado': 'ok', 'funciones': [], 'compiladas': 0, 'cacheadas': 0}
+    # Un archivo ilegible o mal codificado es un error de ese archivo, no del lote
+    try:
+        with open(ruta, 'rb') as f:
+            # Decodifica según la cookie de codificación (PEP 263) o el BOM, como el intérprete
+            fuente = importlib.util.decode_source(f.read())
+    except (OSError, UnicodeDecodeError, SyntaxError, ValueError) as e:
+        resultado.update(estado='error', error=f'{type(e).__name__}: {e}')
+        return resultado
+    clave_archivo = huella_estable('flujo-archivo', VERSION_COMPILADOR, os.path.basename(ruta), fuente)
+    manifiesto = cache.obtener(clave_archivo) if cache else None
+    entradas = None
+    if manifiesto is not None:
+        entradas = [cache.obtener(clave) for clave in json.loads(manifiesto)]
+        if any(e is None for e in entradas):
+            entradas = None  # alguna función se expulsó de la caché: se recompila el archivo
+    if entradas is not None:
+        resultado['funciones'] = [json.loads(e) for e in entradas]
+        resultado['cacheadas'] = len(entradas)
+    else:
+        try:
+            arbol = ast.parse(fuente, filename=ruta)
+        except (SyntaxError, ValueError) as e:
+            resultado.update(estado='error', error=f'{type(e).__name__}: {e}')
+            return resultado
+        claves = []
+        for nombre, firma, cuerpo, codigo in unidades(arbol, fuente):
+            clave = _clave_funcion(ruta, nombre, codigo, motor)
+            claves.append(clave)
+            entrada = cache.obtener(clave) if cache else None
+            if entrada is not None:
+                resultado['funciones'].append(json.loads(entrada))
+                resultado['cacheadas'] += 1
+                continue
+            diagrama = compilar_funcion(nombre, firma, cuerpo, f'{os.path.basename(ruta)} · {nombre}')
+            layout = motor.calcular(diagrama)
+            datos = {'funcion': nombre, 'diagrama': diagrama.a_dict(), 'layout': layout.a_dict()}
+            if cache:
+                cache.guardar(clave, json.dumps(datos, ensure_ascii=False))
+            resultado['funciones'].append(datos)
+            resultado['compiladas'] += 1
+        if cache:
+            cache.guardar(clave_archivo, json.dumps(claves))
+    resultado['segundos'] = time.perf_counter() - inicio
+    return resultado
+
+
+def cargar_diagrama(datos, motor):
+    """Reconstruye el Diagrama de un resultado y precarga su layout en el motor"""
+    diagrama = Diagrama.desde_dict(datos['diagrama'])
+    motor.precargar(diagrama, Layout.desde_dict(datos['layout']))
+    return diagrama
+
+
+def listar_fuentes(entradas):
+    rutas = []
+    for entrada in entradas:
+        if os.path.isdir(entrada):
+            for raiz, _, archivos in os.walk(entrada):
+                rutas.extend(os.path.join(raiz, a) for a in archivos if a.endswith('.py'))
+        else:
+            rutas.append(entrada)
+    return sorted(rutas)
+
+
+class VistaCacheTrabajador:
+    """Caché vista desde un trabajador del pool: lee entradas del disco y difiere las escrituras.
+
+    La CacheRender (índice LRU, tamaño total, expulsiones y estadísticas) solo vive en
+    el proceso principal, que al recibir el resultado registra las lecturas y guarda lo
+    nuevo con aplicar(); así varios procesos nunca expulsan con índices distintos.
+    """
+
+    def __init__(self, directorio):
+        self.directorio = directorio
+        self.leidas = []
+        self.fallos = 0
+        self.nuevas = {}
+
+    def obtener(self, clave):
+        if clave in self.nuevas:
+            return self.nuevas[clave]
+        try:
+            with open(os.path.join(self.directorio, clave), encoding='utf-8') as f:
+                texto = f.read()
+        except FileNotFoundError:
+            self.fallos += 1
+            return None
+        self.leidas.append(clave)
+        return texto
+
+    def guardar(self, clave, texto):
+        self.nuevas[clave] = texto
+
+    def aplicar(self, cache):
+        """Vuelca en la caché del proceso principal los accesos y escrituras del trabajador"""
+        for clave in self.leidas:
+            archivo = cache.abrir(clave)  # la marca como usada y cuenta el acierto
+            if archivo is not None:
+                archivo.close()
+        cache.fallos += self.fallos
+        for clave, texto in self.nuevas.items():
+            cache.guardar(clave, texto)
+
+
+def _compilar_en_trabajador(ruta, directorio_cache):
+    vista = VistaCacheTrabajador(directorio_cache) if directorio_cache else None
+    return compilar_archivo(ruta, vista), vista
+
+
+def compilar_fuentes(rutas, procesos=None, cache=None):
+    """Compila los archivos en paralelo (un archivo por tarea) y devuelve sus resultados.
+
+    'cache' es una CacheRender o su directorio. La unidad de trabajo es el archivo: se
+    parsea una vez y sus funciones, pequeñas, se compilan en el mismo proceso (enviarlas
+    sueltas costaría más que compilarlas).
+    """
+    procesos = procesos or os.cpu_count() or 1
+    if isinstance(cache, str):
+        cache = CacheRender(cache)
+    if procesos == 1 or len(rutas) <= 1:
+        return [compilar_archivo(ruta, cache) for ruta in rutas]
+    resultados = []
+    with ProcessPoolExecutor(max_workers=procesos) as pool:
+        rutas = [os.path.abspath(r) for r in rutas]
+        directorio = cache.directorio if cache is not None else None
+        for resultado, vista in pool.map(_compilar_en_trabajador, rutas, [directorio] * len(rutas),
+                                         chunksize=max(1, len(rutas) // (4 * procesos))):
+            if vista is not None:
+                vista.aplicar(cache)
+            resultados.append(resultado)
+    return resultados
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Genera diagramas de flujo a partir de código Python')
+    parser.add_argument('entradas', nargs='+', help='archivos .py o directorios')
+    parser.add_argument('-o', '--salida', default='salida_flujo', help='directorio de salida')
+    parser.add_argument('-j', '--procesos', type=int, default=None)
+    parser.add_argument('-f', '--formato', choices=['svg', 'html', 'json'], default='html')
+    parser.add_argument('--cache', default='.cache_diagramas', help="directorio de la caché ('' la desactiva)")
+    args = parser.parse_args(argv)
+
+    inicio = time.perf_counter()
+    rutas = listar_fuentes(args.entradas)
+    resultados = compilar_fuentes(rutas, args.procesos, args.cache or None)
+    os.makedirs(args.salida, exist_ok=True)
+    motor = MotorLayout()
+    raiz = os.path.commonpath([os.path.dirname(os.path.abspath(r)) for r in rutas]) if rutas else '.'
+    for r in resultados:
+        if r['estado'] != 'ok':
+            print(f"❌ {r['archivo']}: {r['error']}")
+            continue
+        # Se conserva la ruta relativa completa, con su extensión: dos fuentes nunca comparten salida
+        base = os.path.join(args.salida, os.path.relpath(r['archivo'], raiz))
+        os.makedirs(os.path.dirname(base), exist_ok=True)
+        if args.formato == 'json':
+            with open(base + '.json', 'w', encoding='utf-8') as f:
+                json.dump(r['funciones'], f, ensure_ascii=False)
+        elif args.formato == 'svg':
+            from svg_diagrama import escribir_svg
+            # Un directorio por archivo; '@' no puede aparecer en el nombre de una función
+            os.makedirs(base, exist_ok=True)
+            for datos in r['funciones']:
+                nombre = datos['funcion'].replace(MODULO, '@modulo')
+                escribir_svg(cargar_diagrama(datos, motor), os.path.join(base, nombre + '.svg'), motor)
+        elif r['funciones']:
+            from DiagramaFlujoParking import GeneradorDiagramaParqueadero
+            generador = GeneradorDiagramaParqueadero(f"Flujo de {r['archivo']}")
+            generador.motor_layout = motor
+            for datos in r['funciones']:
+                generador.agregar_diagrama_svg(escape(datos['funcion']), cargar_diagrama(datos, motor))
+            generador.exportar_html(base + '.html')
+    compiladas = sum(r['compiladas'] for r in resultados)
+    cacheadas = sum(r['cacheadas'] for r in resultados)
+    print(f"📊 {len(rutas)} archivos: {compiladas} funciones compiladas, {cacheadas} desde caché "
+          f"({time.perf_counter() - inicio:.2f} s)")
+    return 0 if all(r['estado'] == 'ok' for r in resultados) else 2
+
+
+if __name__ == '__main__':
+    sys.exit(main())
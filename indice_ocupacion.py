@@ -0,0 +1,227 @@
+import argparse
+import heapq
+import json
+import numbers
+import sys
+
+from modelo_diagrama import Diagrama
+
+PLANTAS_NO_RESERVADAS = (2, 3, 5, 7)
+
+
+class IndiceOcupacion:
+    """Ocupación de un garaje con contadores incrementales.
+
+    Aparcar y sacar actualizan en O(log plazas + log plantas): un montículo de plazas
+    libres y otro de ocupadas por planta, los contadores por planta, una cola de cubetas
+    (una por número de coches) para la planta más vacía, un bitset de plantas con sitio
+    y los totales de plantas reservadas y no reservadas. Las consultas son O(1); la
+    planta más vacía lo es amortizado (descarta entradas obsoletas que pagó la
+    actualización que las dejó). Listar las plantas libres recorre solo el bitset.
+    """
+
+    def __init__(self, plantas=8, plazas=5, no_reservadas=PLANTAS_NO_RESERVADAS):
+        if plantas < 1:
+            raise ValueError(f"El garaje necesita al menos una planta (plantas={plantas})")
+        if plazas < 0:
+            raise ValueError(f"Número de plazas negativo: {plazas}")
+        self.plantas = plantas
+        self.plazas = plazas
+        self.no_reservadas = frozenset(p for p in no_reservadas if p < plantas)
+        self._reiniciar()
+
+    def _reiniciar(self):
+        plantas, plazas = self.plantas, self.plazas
+        self.ocupadas = [0] * plantas
+        self._libres = [list(range(plazas)) for _ in range(plantas)]  # ya son montículos
+        self._usadas = [[] for _ in range(plantas)]
+        # Cubeta c: montículo de plantas con c coches (entradas obsoletas se descartan al consultar)
+        self._cubetas = [list(range(plantas))] + [[] for _ in range(plazas)]
+        self._plantas_por_cubeta = [plantas] + [0] * plazas
+        self._minimo = 0  # cubeta no vacía de menos coches
+        # Sin plazas ninguna planta tiene sitio: el bitset empieza vacío
+        self._bits = bytearray(b'\xff' * ((plantas + 7) // 8) if plazas else (plantas + 7) // 8)
+        if plazas and plantas % 8:
+            self._bits[-1] = (1 << (plantas % 8)) - 1
+        self.plantas_con_espacio = plantas if plazas else 0
+        self.total = 0
+        self.total_no_reservadas = 0
+
+    def _validar(self, planta):
+        if isinstance(planta, bool) or not isinstance(planta, numbers.Integral):
+            raise TypeError(f"La planta debe ser un entero: {planta!r}")
+        if not 0 <= planta < self.plantas:
+            raise ValueError(f"Planta inexistente: {planta} (0-{self.plantas - 1})")
+
+    def _cambiar(self, planta, delta):
+        antes = self.ocupadas[planta]
+        ahora = antes + delta
+        self.ocupadas[planta] = ahora
+        self.total += delta
+        if planta in self.no_reservadas:
+            self.total_no_reservadas += delta
+        cubeta = self._cubetas[ahora]
+        heapq.heappush(cubeta, planta)
+        if len(cubeta) > 2 * self.plantas + 16:
+            # Compactación amortizada: se eliminan las entradas obsoletas y duplicadas
+            cubeta[:] = sorted({p for p in cubeta if self.ocupadas[p] == ahora})
+        self._plantas_por_cubeta[antes] -= 1
+        self._plantas_por_cubeta[ahora] += 1
+        # delta es ±1: el mínimo baja a 'ahora' o, si la cubeta mínima se vació, sube con esta planta
+        if ahora < self._minimo or (antes == self._minimo and not self._plantas_por_cubeta[antes]):
+            self._minimo = ahora
+        if antes == self.plazas or ahora == self.plazas:
+            byte, bit = planta >> 3, 1 << (planta & 7)
+            if ahora == self.plazas:
+                self._bits[byte] &= ~bit
+                self.plantas_con_espacio -= 1
+            else:
+                self._bits[byte] |= bit
+                self.plantas_con_espacio += 1
+
+    def aparcar(self, planta):
+        """Ocupa la primera plaza libre de la planta; devuelve la plaza o None si está llena"""
+        self._validar(planta)
+        if not self._libres[planta]:
+            return None
+        plaza = heapq.heappop(self._libres[planta])
+        heapq.heappush(self._usadas[planta], plaza)
+        self._cambiar(planta, 1)
+        return plaza
+
+    def sacar(self, planta):
+        """Libera la primera plaza ocupada de la planta; devuelve la plaza o None si está vacía"""
+        self._validar(planta)
+        if not self._usadas[planta]:
+            return None
+        plaza = heapq.heappop(self._usadas[planta])
+        heapq.heappush(self._libres[planta], plaza)
+        self._cambiar(planta, -1)
+        return plaza
+
+    def planta_mas_vacia(self):
+        """Planta con menos coches (la de menor número si hay empate)"""
+        cubeta = self._cubetas[self._minimo]
+        # Se descartan las entradas de plantas que ya cambiaron de cubeta
+        while self.ocupadas[cubeta[0]] != self._minimo:
+            heapq.heappop(cubeta)
+        return cubeta[0]
+
+    def plantas_libres(self):
+        """Plantas con al menos una plaza libre, en orden"""
+        resultado = []
+        for i, byte in enumerate(self._bits):
+            while byte:
+                bajo = byte & -byte
+                resultado.append(i * 8 + bajo.bit_length() - 1)
+                byte ^= bajo
+        return resultado
+
+    def porcentaje(self, planta):
+        self._validar(planta)
+        return 100 * self.ocupadas[planta] / self.plazas if self.plazas else 0.0
+
+    def porcentajes(self):
+        return [100 * c / self.plazas if self.plazas else 0.0 for c in self.ocupadas]
+
+    @property
+    def total_reservadas(self):
+        return self.total - self.total_no_reservadas
+
+    def estado(self):
+        """Matriz plantas × plazas (1 = ocupada), como la 'b' del programa original"""
+        filas = []
+        for planta in range(self.plantas):
+            fila = [0] * self.plazas
+            for plaza in self._usadas[planta]:
+                fila[plaza] = 1
+            filas.append(fila)
+        return filas
+
+    def redistribuir(self):
+        """Mantenimiento: reparte los coches por igual entre las plantas (reconstruye el índice)"""
+        total = self.total
+        self._reiniciar()
+        for planta in range(self.plantas):
+            for _ in range(total // self.plantas + (planta < total % self.plantas)):
+                self.aparcar(planta)
+
+
+# Opciones del menú: (opción, texto de la acción en el diagrama, operación del índice)
+OPERACIONES = [
+    ('1', 'Mostrar estado de cada planta\nindice.estado()', lambda i, *a: i.estado()),
+    ('2', 'Aparcar: indice.aparcar(planta)\nO(log plazas + log plantas)', lambda i, p: i.aparcar(p)),
+    ('3', 'Sacar coche: indice.sacar(planta)\nO(log plazas + log plantas)', lambda i, p: i.sacar(p)),
+    ('4', 'Plantas con espacio: bitset\nindice.plantas_libres()', lambda i, *a: i.plantas_libres()),
+    ('5', 'Planta más vacía: cola de cubetas\nO(1)', lambda i, *a: i.planta_mas_vacia()),
+    ('6', 'Total de coches: contador\nO(1)', lambda i, *a: i.total),
+    ('7', 'Mantenimiento: indice.redistribuir()', lambda i, *a: i.redistribuir()),
+    ('8', 'Porcentaje por planta: contadores\nO(1) por planta', lambda i, *a: i.porcentajes()),
+    ('9', f'No reservadas {list(PLANTAS_NO_RESERVADAS)}: total\nO(1)',
+     lambda i, *a: i.total_no_reservadas),
+]
+
+
+def ejecutar_opcion(indice, opcion, *argumentos):
+    """Despacha una opción del menú a la operación correspondiente del índice"""
+    for clave, _, operacion in OPERACIONES:
+        if clave == opcion:
+            return operacion(indice, *argumentos)
+    raise ValueError(f"Opción desconocida: {opcion}")
+
+
+def diagrama_menu(plantas=8, plazas=5, titulo='SISTEMA DE PARQUEADERO\nÍndice de ocupación'):
+    """Diagrama de flujo del menú cuyas acciones son las operaciones del índice"""
+    diagrama = Diagrama(titulo)
+    diagrama.agregar_nodo('inicio', 'INICIO', color='lightcoral', ancho=6)
+    diagrama.agregar_nodo('inicializar', f'Inicializar índice\nIndiceOcupacion({plantas}, {plazas})')
+    diagrama.agregar_nodo('bucle', "entrada != 's'", forma='rombo', ancho=8, alto=4)
+    diagrama.agregar_nodo('leer', 'Leer opción (entrada)')
+    diagrama.agregar_nodo('salir', 'Salir del\nprograma', color='lightcoral', ancho=4, alto=3)
+    diagrama.agregar_arista('inicio', 'inicializar')
+    diagrama.agregar_arista('inicializar', 'bucle')
+    diagrama.agregar_arista('bucle', 'leer', 'SÍ')
+    diagrama.agregar_arista('bucle', 'salir', 'NO', lateral=True)
+    # Primero todas las decisiones y después las acciones, como en la especificación del parqueadero
+    for opcion, _, _ in OPERACIONES:
+        diagrama.agregar_nodo(f'opcion_{opcion}', f"entrada == '{opcion}'", forma='rombo')
+    for opcion, texto, _ in OPERACIONES:
+        diagrama.agregar_nodo(f'accion_{opcion}', texto, alto=3)
+    previo = 'leer'
+    for opcion, _, _ in OPERACIONES:
+        diagrama.agregar_arista(previo, f'opcion_{opcion}', 'NO' if previo != 'leer' else None)
+        diagrama.agregar_arista(f'opcion_{opcion}', f'accion_{opcion}', 'SÍ', lateral=True)
+        diagrama.agregar_arista(f'accion_{opcion}', 'bucle', color='purple')
+        previo = f'opcion_{opcion}'
+    return diagrama
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Diagrama del menú basado en el índice de ocupación')
+    parser.add_argument('--plantas', type=int, default=8)
+    parser.add_argument('--plazas', type=int, default=5)
+    parser.add_argument('--html', default='diagrama_indice_ocupacion.html', help="HTML con el diagrama ('' no lo genera)")
+    parser.add_argument('--svg', default=None, help='SVG nativo del diagrama')
+    parser.add_argument('--especificacion', default=None,
+                        help='JSON con la especificación (para lote_diagramas, el servicio o las variantes)')
+    args = parser.parse_args(argv)
+
+    diagrama = diagrama_menu(args.plantas, args.plazas)
+    if args.especificacion:
+        with open(args.especificacion, 'w', encoding='utf-8') as f:
+            json.dump(diagrama.a_dict(), f, ensure_ascii=False, indent=2)
+        print(f"📄 Especificación: {args.especificacion}")
+    if args.svg:
+        from svg_diagrama import escribir_svg
+        escribir_svg(diagrama, args.svg)
+        print(f"🖼️ SVG: {args.svg}")
+    if args.html:
+        from DiagramaFlujoParking import GeneradorDiagramaParqueadero
+        generador = GeneradorDiagramaParqueadero('Sistema de Parqueadero - Índice de ocupación')
+        generador.agregar_figura('🗂️ Menú con el índice de ocupación', diagrama)
+        generador.exportar_html(args.html)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,192 @@
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+
+class MedicionEtapa:
+    """Métricas de una etapa del render"""
+    __slots__ = ('etapa', 'inicio', 'segundos', 'cpu', 'pico_memoria', 'artistas', 'bytes', 'llamadas',
+                 'extra', '_t0', '_cpu0', '_memoria0', '_pico')
+
+    def __init__(self, etapa, **extra):
+        self.etapa = etapa
+        self.inicio = time.time()
+        self.segundos = 0.0
+        self.cpu = 0.0
+        self.pico_memoria = None
+        self.artistas = None
+        self.bytes = None
+        self.llamadas = 1
+        self.extra = extra
+        self._t0 = time.perf_counter()
+        self._cpu0 = time.process_time()
+        # Memoria trazada al empezar y pico absoluto observado (pico_memoria es la diferencia)
+        self._memoria0 = 0
+        self._pico = None
+
+    def a_dict(self):
+        datos = {'etapa': self.etapa, 'inicio': self.inicio, 'segundos': self.segundos, 'cpu': self.cpu,
+                 'pico_memoria': self.pico_memoria, 'artistas': self.artistas, 'bytes': self.bytes,
+                 'llamadas': self.llamadas}
+        datos.update(self.extra)
+        return datos
+
+
+class InformeRender:
+    """Resultado estructurado de un render instrumentado"""
+    __slots__ = ('etapas',)
+
+    def __init__(self, etapas):
+        self.etapas = etapas
+
+    def por_etapa(self):
+        """Totales por nombre de etapa (una etapa puede repetirse, p. ej. por figura)"""
+        totales = {}
+        for m in self.etapas:
+            t = totales.setdefault(m.etapa, {'segundos': 0.0, 'cpu': 0.0, 'llamadas': 0,
+                                             'pico_memoria': None, 'bytes': None})
+            t['segundos'] += m.segundos
+            t['cpu'] += m.cpu
+            t['llamadas'] += m.llamadas
+            if m.pico_memoria is not None:
+                t['pico_memoria'] = max(t['pico_memoria'] or 0, m.pico_memoria)
+            if m.bytes is not None:
+                t['bytes'] = (t['bytes'] or 0) + m.bytes
+        return totales
+
+    def a_dict(self):
+        return {'etapas': [m.a_dict() for m in self.etapas], 'totales': self.por_etapa()}
+
+    def resumen(self):
+        lineas = []
+        for etapa, t in self.por_etapa().items():
+            linea = f"{etapa:<12} {t['segundos']:8.3f} s  cpu {t['cpu']:8.3f} s"
+            if t['pico_memoria'] is not None:
+                linea += f"  pico {t['pico_memoria'] / 1e6:8.1f} MB"
+            if t['bytes'] is not None:
+                linea += f"  {t['bytes'] / 1e6:8.2f} MB escritos"
+            lineas.append(linea)
+        return '\n'.join(lineas)
+
+
+class Instrumentacion:
+    """Registra tiempo, CPU, pico de memoria, artistas y bytes de cada etapa del render.
+
+    Cada etapa terminada se entrega a los callbacks y, si se indica, se añade como
+    una línea JSON a 'archivo_jsonl'. Con memoria=True se usa tracemalloc, que
+    ralentiza el código Python instrumentado.
+    """
+
+    def __init__(self, memoria=False, archivo_jsonl=None, callbacks=()):
+        self.memoria = memoria
+        self.archivo_jsonl = archivo_jsonl
+        self.callbacks = list(callbacks)
+        self.etapas = []
+        self._pila = []
+        self._acumuladas = {}
+        self._tracemalloc_propio = False
+
+    def agregar_callback(self, callback):
+        self.callbacks.append(callback)
+        return callback
+
+    def iniciar(self, etapa, **extra):
+        if self.memoria:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._tracemalloc_propio = True
+            # El pico de la etapa externa se conserva antes de reiniciarlo para la interna
+            if self._pila:
+                pico = tracemalloc.get_traced_memory()[1]
+                padre = self._pila[-1]
+                padre._pico = max(padre._pico or 0, pico)
+            tracemalloc.reset_peak()
+        medicion = MedicionEtapa(etapa, **extra)
+        if self.memoria:
+            medicion._memoria0 = tracemalloc.get_traced_memory()[0]
+        self._pila.append(medicion)
+        return medicion
+
+    def terminar(self, **datos):
+        medicion = self._pila.pop()
+        medicion.segundos = time.perf_counter() - medicion._t0
+        medicion.cpu = time.process_time() - medicion._cpu0
+        for clave, valor in datos.items():
+            if clave in ('artistas', 'bytes'):
+                setattr(medicion, clave, valor)
+            else:
+                medicion.extra[clave] = valor
+        if self.memoria and tracemalloc.is_tracing():
+            pico = max(medicion._pico or 0, tracemalloc.get_traced_memory()[1])
+            # Solo cuenta lo que la etapa asignó por encima de lo que ya había al empezar
+            medicion.pico_memoria = max(0, pico - medicion._memoria0)
+            if self._pila:
+                self._pila[-1]._pico = max(self._pila[-1]._pico or 0, pico)
+            elif self._tracemalloc_propio:
+                tracemalloc.stop()
+                self._tracemalloc_propio = False
+        self._publicar(medicion)
+        return medicion
+
+    @contextmanager
+    def etapa(self, nombre, **extra):
+        medicion = self.iniciar(nombre, **extra)
+        try:
+            yield medicion
+        finally:
+            if medicion in self._pila:
+                self.terminar()
+
+    def acumular(self, nombre, segundos, cpu):
+        """Suma una llamada corta y muy frecuente a una etapa acumulada (se publica en cerrar_acumuladas)"""
+        medicion = self._acumuladas.get(nombre)
+        if medicion is None:
+            medicion = self._acumuladas[nombre] = MedicionEtapa(nombre)
+            medicion.llamadas = 0
+        medicion.segundos += segundos
+        medicion.cpu += cpu
+        medicion.llamadas += 1
+
+    def cerrar_acumuladas(self):
+        for medicion in self._acumuladas.values():
+            self._publicar(medicion)
+        self._acumuladas = {}
+
+    def _publicar(self, medicion):
+        self.etapas.append(medicion)
+        for callback in self.callbacks:
+            callback(medicion)
+        if self.archivo_jsonl:
+            with open(self.archivo_jsonl, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(medicion.a_dict(), ensure_ascii=False) + '\n')
+
+    def informe(self):
+        return InformeRender(list(self.etapas))
+
+    def reiniciar(self):
+        self.etapas = []
+        self._acumuladas = {}
+
+
+class _SinInstrumentacion:
+    """Sustituto sin coste cuando la instrumentación está desactivada"""
+
+    @contextmanager
+    def etapa(self, nombre, **extra):
+        yield None
+
+    def iniciar(self, etapa, **extra):
+        return None
+
+    def terminar(self, **datos):
+        return None
+
+    def acumular(self, nombre, segundos, cpu):
+        pass
+
+    def cerrar_acumuladas(self):
+        pass
+
+
+SIN_INSTRUMENTACION = _SinInstrumentacion()
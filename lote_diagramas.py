@@ -0,0 +1,150 @@
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+EXTENSIONES_ESPEC = ('.json', '.yaml', '.yml')
+
+
+def _iniciar_trabajador(rasterizar):
+    # Backend sin interfaz: los trabajadores nunca abren ventanas. Con 'cliente' no se
+    # rasteriza nada y matplotlib ni siquiera se carga
+    if rasterizar:
+        import matplotlib
+        matplotlib.use('Agg')
+
+
+def listar_especificaciones(entrada):
+    """Rutas de especificaciones de un directorio o de un manifiesto (.txt con una ruta por línea o lista JSON)"""
+    if os.path.isdir(entrada):
+        rutas = []
+        for ext in EXTENSIONES_ESPEC:
+            rutas.extend(glob.glob(os.path.join(entrada, '**', '*' + ext), recursive=True))
+        return sorted(rutas)
+    base = os.path.dirname(os.path.abspath(entrada))
+    with open(entrada, encoding='utf-8') as f:
+        if entrada.lower().endswith('.json'):
+            datos = json.load(f)
+            rutas = datos['diagramas'] if isinstance(datos, dict) else datos
+        else:
+            rutas = [linea.strip() for linea in f if linea.strip() and not linea.startswith('#')]
+    return [r if os.path.isabs(r) else os.path.join(base, r) for r in rutas]
+
+
+def generar_diagrama(ruta, salida, formatos=('html',), dpi=300, max_megapixeles=None, cache=None):
+    """Genera las salidas de una especificación; nunca lanza, devuelve el resultado del trabajo"""
+    from DiagramaFlujoParking import GeneradorDiagramaParqueadero, png_de_html
+    from modelo_diagrama import Diagrama
+
+    inicio = time.perf_counter()
+    nombre = os.path.splitext(os.path.basename(ruta))[0]
+    resultado = {'especificacion': ruta, 'estado': 'ok', 'salidas': [], 'bytes': 0}
+    try:
+        diagrama = Diagrama.desde_archivo(ruta)
+        titulo = (diagrama.titulo or nombre).replace('\n', ' ')
+        generador = GeneradorDiagramaParqueadero(titulo)
+        generador.dpi = dpi
+        generador.max_megapixeles = max_megapixeles
+        if cache:
+            generador.usar_cache(cache)
+        os.makedirs(salida, exist_ok=True)
+        html = os.path.join(salida, nombre + '.html')
+        if 'html' in formatos or 'cliente' in formatos:
+            generador.agregar_figura(titulo, diagrama)
+            # 'cliente': el HTML lleva el modelo y lo dibuja el navegador, sin rasterizar aquí
+            generador.exportar_html(html, imagenes='cliente' if 'cliente' in formatos else 'inline')
+            resultado['salidas'].append(html)
+        if 'png' in formatos:
+            destino = os.path.join(salida, nombre + '.png')
+            if 'html' in formatos:
+                # Es el mismo PNG que lleva el HTML: se extrae en lugar de dibujarlo otra vez
+                with open(html, encoding='utf-8') as f:
+                    png = png_de_html(f.read())
+                with open(destino, 'wb') as f:
+                    f.write(png)
+            else:
+                generador.exportar_png(diagrama, destino)
+            resultado['salidas'].append(destino)
+        resultado['bytes'] = sum(os.path.getsize(s) for s in resultado['salidas'])
+    except Exception as e:
+        resultado['estado'] = 'error'
+        resultado['error'] = f'{type(e).__name__}: {e}'
+        resultado['traza'] = traceback.format_exc()
+    resultado['segundos'] = time.perf_counter() - inicio
+    return resultado
+
+
+def generar_lote(rutas, salida, procesos=None, **opciones):
+    """Reparte las especificaciones en un pool de procesos y devuelve el informe del lote"""
+    inicio = time.perf_counter()
+    resultados = []
+    procesos = procesos or os.cpu_count() or 1
+    rasterizar = bool({'html', 'png'} & set(opciones.get('formatos', ('html',))))
+    with ProcessPoolExecutor(max_workers=procesos, initializer=_iniciar_trabajador,
+                             initargs=(rasterizar,)) as pool:
+        futuros = {pool.submit(generar_diagrama, ruta, salida, **opciones): ruta for ruta in rutas}
+        for futuro in as_completed(futuros):
+            try:
+                resultado = futuro.result()
+            except Exception as e:
+                # El trabajador murió (memoria, señal...): solo falla este trabajo
+                resultado = {'especificacion': futuros[futuro], 'estado': 'error', 'salidas': [],
+                             'bytes': 0, 'segundos': None, 'error': f'{type(e).__name__}: {e}'}
+            simbolo = '✅' if resultado['estado'] == 'ok' else '❌'
+            print(f"{simbolo} {resultado['especificacion']} ({resultado['segundos'] or 0:.2f} s)")
+            resultados.append(resultado)
+
+    total = time.perf_counter() - inicio
+    correctos = sum(1 for r in resultados if r['estado'] == 'ok')
+    resultados.sort(key=lambda r: r['especificacion'])
+    return {
+        'total': len(resultados),
+        'correctos': correctos,
+        'errores': len(resultados) - correctos,
+        'procesos': procesos,
+        'segundos': total,
+        'diagramas_por_segundo': len(resultados) / total if total else 0.0,
+        'bytes': sum(r['bytes'] for r in resultados),
+        'trabajos': resultados,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Genera en paralelo muchos diagramas de flujo a partir de especificaciones')
+    parser.add_argument('entrada', help='directorio con especificaciones (.json/.yaml) o manifiesto')
+    parser.add_argument('-o', '--salida', default='salida_diagramas', help='directorio de salida')
+    parser.add_argument('-j', '--procesos', type=int, default=None, help='procesos del pool (por defecto, todos los núcleos)')
+    parser.add_argument('-f', '--formato', choices=['html', 'png', 'ambos', 'cliente'], default='html')
+    parser.add_argument('--dpi', type=int, default=300)
+    parser.add_argument('--max-megapixeles', type=float, default=None)
+    parser.add_argument('--cache', default=None, help='directorio de la caché de render')
+    parser.add_argument('--informe', default=None, help='ruta del informe JSON del lote')
+    args = parser.parse_args(argv)
+
+    rutas = listar_especificaciones(args.entrada)
+    if not rutas:
+        print(f"⚠️ No se encontraron especificaciones en {args.entrada}")
+        return 1
+    formatos = ('html', 'png') if args.formato == 'ambos' else (args.formato,)
+    print(f"🚀 Generando {len(rutas)} diagramas...")
+    informe = generar_lote(rutas, args.salida, args.procesos, formatos=formatos, dpi=args.dpi,
+                           max_megapixeles=args.max_megapixeles, cache=args.cache)
+
+    print(f"📊 {informe['correctos']}/{informe['total']} correctos en {informe['segundos']:.2f} s "
+          f"({informe['diagramas_por_segundo']:.2f} diagramas/s con {informe['procesos']} procesos)")
+    for r in informe['trabajos']:
+        if r['estado'] != 'ok':
+            print(f"❌ {r['especificacion']}: {r['error']}")
+    if args.informe:
+        with open(args.informe, 'w', encoding='utf-8') as f:
+            json.dump(informe, f, ensure_ascii=False, indent=2)
+        print(f"📄 Informe: {args.informe}")
+    return 0 if informe['errores'] == 0 else 2
+
+
+if __name__ == '__main__':
+    sys.exit(main())
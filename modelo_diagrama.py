@@ -0,0 +1,643 @@
+import hashlib
+import json
+from collections import OrderedDict
+
+
+FORMAS = ('rectangulo', 'rombo')
+COLORES_POR_FORMA = {'rectangulo': 'lightgreen', 'rombo': 'lightblue'}
+TAMANOS_POR_FORMA = {'rectangulo': (8, 2.5), 'rombo': (6, 3.5)}
+
+
+class Nodo:
+    __slots__ = ('id', 'texto', 'forma', 'color', 'ancho', 'alto', 'fontsize', 'capa', 'x', 'y')
+
+    def __init__(self, id, texto, forma='rectangulo', color=None, ancho=None, alto=None, fontsize=None):
+        if forma not in FORMAS:
+            raise ValueError(f"Forma desconocida para el nodo '{id}': {forma}")
+        ancho_def, alto_def = TAMANOS_POR_FORMA[forma]
+        self.id = id
+        self.texto = texto
+        self.forma = forma
+        self.color = color or COLORES_POR_FORMA[forma]
+        self.ancho = float(ancho if ancho is not None else ancho_def)
+        self.alto = float(alto if alto is not None else alto_def)
+        self.fontsize = fontsize if fontsize is not None else (9 if forma == 'rombo' else 10)
+        # Calculados por el motor de layout
+        self.capa = 0
+        self.x = 0.0
+        self.y = 0.0
+
+    def puntos(self):
+        """Puntos de conexión del nodo, igual que los devuelven los helpers de dibujo"""
+        x, y, w, h = self.x, self.y, self.ancho, self.alto
+        return {
+            'top': (x + w / 2, y + h),
+            'bottom': (x + w / 2, y),
+            'left': (x, y + h / 2),
+            'right': (x + w, y + h / 2),
+            'center': (x + w / 2, y + h / 2)
+        }
+
+    def a_dict(self):
+        return {'id': self.id, 'texto': self.texto, 'forma': self.forma, 'color': self.color,
+                'ancho': self.ancho, 'alto': self.alto, 'fontsize': self.fontsize}
+
+
+class Arista:
+    __slots__ = ('origen', 'destino', 'etiqueta', 'color', 'lateral', 'retorno')
+
+    def __init__(self, origen, destino, etiqueta=None, color='black', lateral=False):
+        self.origen = origen
+        self.destino = destino
+        self.etiqueta = etiqueta
+        self.color = color
+        # Una arista lateral coloca el destino en la misma capa, a la derecha del origen
+        self.lateral = lateral
+        # True si el motor de layout la invirtió para romper un ciclo
+        self.retorno = False
+
+    def a_dict(self):
+        return {'desde': self.origen, 'hasta': self.destino, 'etiqueta': self.etiqueta,
+                'color': self.color, 'lateral': self.lateral}
+
+
+class Diagrama:
+    """Modelo declarativo de un diagrama de flujo: nodos y aristas sin coordenadas"""
+    __slots__ = ('titulo', 'nodos', 'aristas', 'layout')
+
+    def __init__(self, titulo=None):
+        self.titulo = titulo
+        self.nodos = {}
+        self.aristas = []
+        self.layout = None
+
+    def agregar_nodo(self, id, texto, **opciones):
+        if id in self.nodos:
+            raise ValueError(f"Nodo duplicado: '{id}'")
+        nodo = Nodo(id, texto, **opciones)
+        self.nodos[id] = nodo
+        self.layout = None
+        return nodo
+
+    def agregar_arista(self, origen, destino, etiqueta=None, color='black', lateral=False):
+        for extremo in (origen, destino):
+            if extremo not in self.nodos:
+                raise ValueError(f"Arista hacia un nodo inexistente: '{extremo}'")
+        arista = Arista(origen, destino, etiqueta, color, lateral)
+        self.aristas.append(arista)
+        self.layout = None
+        return arista
+
+    @classmethod
+    def desde_dict(cls, espec):
+        """Construye el diagrama a partir de un dict {'titulo', 'nodos', 'aristas'}"""
+        # Un JSON cualquiera sin 'nodos' no es un diagrama vacío: es un error de especificación
+        if not isinstance(espec, dict) or not isinstance(espec.get('nodos'), list):
+            raise ValueError("La especificación debe ser un objeto con una lista 'nodos'")
+        if not isinstance(espec.get('aristas', []), list):
+            raise ValueError("'aristas' debe ser una lista")
+        diagrama = cls(espec.get('titulo'))
+        for n in espec['nodos']:
+            opciones = {k: n[k] for k in ('forma', 'color', 'ancho', 'alto', 'fontsize') if k in n}
+            diagrama.agregar_nodo(n['id'], n.get('texto', n['id']), **opciones)
+        for a in espec.get('aristas', []):
+            diagrama.agregar_arista(a['desde'], a['hasta'], a.get('etiqueta'), a.get('color', 'black'),
+                                    a.get('lateral', False))
+        return diagrama
+
+    @classmethod
+    def desde_json(cls, ruta):
+        with open(ruta, encoding='utf-8') as f:
+            return cls.desde_dict(json.load(f))
+
+    @classmethod
+    def desde_yaml(cls, ruta):
+        try:
+            import yaml
+        except ImportError:
+            raise ImportError("Se necesita PyYAML para leer especificaciones YAML (pip install pyyaml)")
+        with open(ruta, encoding='utf-8') as f:
+            return cls.desde_dict(yaml.safe_load(f))
+
+    @classmethod
+    def desde_archivo(cls, ruta):
+        """Elige el lector según la extensión (.json, .yaml, .yml)"""
+        if str(ruta).lower().endswith(('.yaml', '.yml')):
+            return cls.desde_yaml(ruta)
+        return cls.desde_json(ruta)
+
+    def a_dict(self):
+        return {'titulo': self.titulo,
+                'nodos': [n.a_dict() for n in self.nodos.values()],
+                'aristas': [a.a_dict() for a in self.aristas]}
+
+    def huella(self):
+        """Hash estable del contenido del diagrama (independiente de las posiciones)"""
+        datos = json.dumps(self.a_dict(), sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+        return hashlib.sha256(datos.encode('utf-8')).hexdigest()
+
+
+class Layout:
+    """Resultado del motor de layout: posiciones por nodo y caja contenedora"""
+    __slots__ = ('posiciones', 'capas', 'retornos', 'ancho', 'alto')
+
+    def __init__(self, posiciones, capas, retornos, ancho, alto):
+        self.posiciones = posiciones  # id -> (x, y) esquina inferior izquierda
+        self.capas = capas            # id -> índice de capa
+        self.retornos = retornos      # índices de aristas invertidas (ciclos)
+        self.ancho = ancho
+        self.alto = alto
+
+    def a_dict(self):
+        return {'posiciones': self.posiciones, 'capas': self.capas, 'retornos': sorted(self.retornos),
+                'ancho': self.ancho, 'alto': self.alto}
+
+    @classmethod
+    def desde_dict(cls, datos):
+        posiciones = {id: tuple(p) for id, p in datos['posiciones'].items()}
+        return cls(posiciones, dict(datos['capas']), set(datos['retornos']), datos['ancho'], datos['alto'])
+
+
+class MotorLayout:
+    """Layout por capas (estilo Sugiyama) en tiempo aproximadamente lineal, con caché"""
+
+    def __init__(self, sep_capas=2.0, sep_nodos=1.5, sep_lateral=2.5, margen=1.0, max_cache=256):
+        self.sep_capas = sep_capas
+        self.sep_nodos = sep_nodos
+        self.sep_lateral = sep_lateral
+        self.margen = margen
+        self.max_cache = max_cache
+        self._cache = OrderedDict()
+
+    def clave(self, diagrama):
+        return (diagrama.huella(), self.sep_capas, self.sep_nodos, self.sep_lateral, self.margen)
+
+    def precargar(self, diagrama, layout):
+        """Registra un layout calculado antes (p. ej. leído de una caché en disco)"""
+        self._cache[self.clave(diagrama)] = layout
+        if len(self._cache) > self.max_cache:
+            self._cache.popitem(last=False)
+
+    def calcular(self, diagrama):
+        """Calcula (o recupera de caché) el layout y lo aplica sobre los nodos"""
+        clave = self.clave(diagrama)
+        layout = self._cache.get(clave)
+        if layout is None:
+            layout = self._calcular(diagrama)
+            self._cache[clave] = layout
+            if len(self._cache) > self.max_cache:
+                self._cache.popitem(last=False)
+        else:
+            self._cache.move_to_end(clave)
+        for i, arista in enumerate(diagrama.aristas):
+            arista.retorno = i in layout.retornos
+        for id, nodo in diagrama.nodos.items():
+            nodo.x, nodo.y = layout.posiciones[id]
+            nodo.capa = layout.capas[id]
+        diagrama.layout = layout
+        return layout
+
+    def _romper_ciclos(self, diagrama):
+        """DFS iterativo: las aristas que vuelven a un ancestro se marcan como retorno"""
+        sucesores = {id: [] for id in diagrama.nodos}
+        for i, a in enumerate(diagrama.aristas):
+            sucesores[a.origen].append((i, a.destino))
+        con_entrada = {a.destino for a in diagrama.aristas}
+        raices = [id for id in diagrama.nodos if id not in con_entrada] + list(diagrama.nodos)
+        estado = {}  # 1 = en la pila, 2 = terminado
+        retornos = set()
+        for raiz in raices:
+            if raiz in estado:
+                continue
+            estado[raiz] = 1
+            pila = [(raiz, iter(sucesores[raiz]))]
+            while pila:
+                actual, it = pila[-1]
+                for i, destino in it:
+                    marca = estado.get(destino)
+                    if marca == 1:
+                        retornos.add(i)
+                    elif marca is None:
+                        estado[destino] = 1
+                        pila.append((destino, iter(sucesores[destino])))
+                        break
+                else:
+                    estado[actual] = 2
+                    pila.pop()
+        return retornos
+
+    def _calcular(self, diagrama):
+        retornos = self._romper_ciclos(diagrama)
+        ids = list(diagrama.nodos)
+        sucesores = {id: [] for id in ids}
+        predecesores = {id: [] for id in ids}
+        lateral_de = {}  # destino lateral -> origen
+        for i, a in enumerate(diagrama.aristas):
+            if i in retornos or a.origen == a.destino:
+                continue
+            sucesores[a.origen].append((a.destino, 0 if a.lateral else 1))
+            if a.lateral and a.destino not in lateral_de:
+                lateral_de[a.destino] = a.origen
+            else:
+                predecesores[a.destino].append(a.origen)
+
+        # 1. Capas por camino más largo (orden topológico de Kahn); las laterales no bajan de capa
+        grado = {id: 0 for id in ids}
+        for id in ids:
+            for s, _ in sucesores[id]:
+                grado[s] += 1
+        cola = [id for id in ids if grado[id] == 0]
+        capa = {id: 0 for id in ids}
+        for actual in cola:
+            for s, salto in sucesores[actual]:
+                capa[s] = max(capa[s], capa[actual] + salto)
+                grado[s] -= 1
+                if grado[s] == 0:
+                    cola.append(s)
+
+        n_capas = max(capa.values(), default=-1) + 1
+        capas = [[] for _ in range(n_capas)]
+        for id in ids:
+            capas[capa[id]].append(id)
+
+        # 2. Orden dentro de cada capa por baricentro de los predecesores (una pasada);
+        #    cada destino lateral se inserta justo a la derecha de su origen
+        posicion = {}
+        for k, nivel in enumerate(capas):
+            def baricentro(id):
+                previos = [posicion[p] for p in predecesores[id] if p in posicion]
+                return sum(previos) / len(previos) if previos else float('inf')
+            anclados = {}
+            for id in nivel:
+                if capa.get(lateral_de.get(id)) == k:
+                    anclados.setdefault(lateral_de[id], []).append(id)
+            libres = sorted((id for id in nivel if capa.get(lateral_de.get(id)) != k), key=baricentro)
+            nivel.clear()
+            pendientes = list(reversed(libres))
+            while pendientes:
+                id = pendientes.pop()
+                nivel.append(id)
+                pendientes.extend(reversed(anclados.pop(id, [])))
+            for i, id in enumerate(nivel):
+                posicion[id] = i
+
+        # 3. Coordenadas: cada nodo se centra bajo sus predecesores sin solaparse
+        nodos = diagrama.nodos
+        centro_x = {}
+        for nivel in capas:
+            borde = float('-inf')
+            for id in nivel:
+                w = nodos[id].ancho
+                previos = [centro_x[p] for p in predecesores[id] if p in centro_x]
+                origen_lateral = lateral_de.get(id)
+                if capa.get(origen_lateral) == capa[id]:
+                    izquierda = borde + self.sep_lateral
+                    centro_x[id] = izquierda + w / 2
+                    borde = izquierda + w
+                    continue
+                deseado = sum(previos) / len(previos) if previos else (borde + self.sep_nodos + w / 2
+                                                                        if borde > float('-inf') else w / 2)
+                izquierda = max(deseado - w / 2, borde + self.sep_nodos)
+                centro_x[id] = izquierda + w / 2
+                borde = izquierda + w
+
+        min_x = min((centro_x[id] - nodos[id].ancho / 2 for id in ids), default=0.0)
+        max_x = max((centro_x[id] + nodos[id].ancho / 2 for id in ids), default=0.0)
+        desplazamiento = self.margen - min_x
+
+        # La capa 0 queda arriba: y decrece capa a capa según la altura de cada una
+        altos = [max(nodos[id].alto for id in nivel) for nivel in capas]
+        alto_total = sum(altos) + self.sep_capas * max(n_capas - 1, 0) + 2 * self.margen
+        posiciones = {}
+        techo = alto_total - self.margen
+        for nivel, alto_capa in zip(capas, altos):
+            for id in nivel:
+                n = nodos[id]
+                # Centrado vertical dentro de la capa
+                y = techo - alto_capa / 2 - n.alto / 2
+                posiciones[id] = (centro_x[id] - n.ancho / 2 + desplazamiento, y)
+            techo -= alto_capa + self.sep_capas
+
+        ancho_total = max_x - min_x + 2 * self.margen
+        return Layout(posiciones, capa, retornos, ancho_total, alto_total)
+
+
+class Ruta:
+    """Trazado ortogonal de una arista: polilínea y segmentos que terminan en punta de flecha"""
+    __slots__ = ('arista', 'puntos', 'puntas')
+
+    def __init__(self, arista, puntos, puntas):
+        self.arista = arista
+        self.puntos = puntos  # [(x, y), ...]
+        self.puntas = puntas  # índices de los segmentos con punta en su extremo final
+
+    def segmentos(self):
+        return list(zip(self.puntos, self.puntos[1:]))
+
+
+class IndiceEspacial:
+    """Rejilla uniforme sobre cajas (x0, y0, x1, y1); una consulta solo visita las celdas que toca"""
+
+    def __init__(self, tam_celda):
+        self.tam_celda = tam_celda
+        self.celdas = {}
+        self.cajas = {}
+
+    @classmethod
+    def desde_nodos(cls, nodos):
+        nodos = list(nodos)
+        # Celda del tamaño medio de un nodo: cada nodo ocupa unas pocas celdas
+        tam = sum(max(n.ancho, n.alto) for n in nodos) / len(nodos) if nodos else 1.0
+        indice = cls(tam)
+        for n in nodos:
+            indice.insertar(n.id, (n.x, n.y, n.x + n.ancho, n.y + n.alto))
+        return indice
+
+    def _celdas(self, x0, y0, x1, y1):
+        t = self.tam_celda
+        for i in range(int(x0 // t), int(x1 // t) + 1):
+            for j in range(int(y0 // t), int(y1 // t) + 1):
+                yield i, j
+
+    def insertar(self, clave, caja):
+        self.cajas[clave] = caja
+        for celda in self._celdas(*caja):
+            self.celdas.setdefault(celda, []).append(clave)
+
+    def consultar(self, x0, y0, x1, y1, ignorar=()):
+        """Claves cuyas cajas se solapan (en su interior) con el rectángulo dado"""
+        eps = 1e-6
+        encontradas = set()
+        for celda in self._celdas(x0, y0, x1, y1):
+            for clave in self.celdas.get(celda, ()):
+                if clave in encontradas or clave in ignorar:
+                    continue
+                cx0, cy0, cx1, cy1 = self.cajas[clave]
+                if x0 < cx1 - eps and x1 > cx0 + eps and y0 < cy1 - eps and y1 > cy0 + eps:
+                    encontradas.add(clave)
+        return encontradas
+
+    def libre(self, puntos, ignorar=()):
+        """True si ningún tramo de la polilínea ortogonal atraviesa una caja"""
+        for (xa, ya), (xb, yb) in zip(puntos, puntos[1:]):
+            if self.consultar(min(xa, xb), min(ya, yb), max(xa, xb), max(ya, yb), ignorar):
+                return False
+        return True
+
+
+def _candidatas(origen, destino, canal_origen, canal_destino):
+    """Trazados ortogonales de una arista hacia abajo, de menos a más codos"""
+    o_pts, d_pts = origen.puntos(), destino.puntos()
+    x1, y1 = o_pts['bottom']
+    x2, y2 = d_pts['top']
+    if abs(x2 - x1) < 1e-6:
+        yield [(x1, y1), (x2, y2)]
+    if origen.forma == 'rombo':
+        # Las decisiones salen por el vértice lateral hacia el lado del destino
+        xs, ys = o_pts['right'] if x2 > x1 else o_pts['left']
+        yield [(xs, ys), (x2, ys), (x2, y2)]
+    # Codo: baja, cruza a la altura media (o por el canal entre capas) y vuelve a bajar
+    for y_medio in ((y1 + y2) / 2, canal_origen, canal_destino):
+        yield [(x1, y1), (x1, y_medio), (x2, y_medio), (x2, y2)]
+
+
+def _desvio(indice, origen, destino, canal_origen, canal_destino, sep, ignorar):
+    """Trazado de cuatro codos que baja por un pasillo vertical libre entre los dos canales"""
+    x1, y1 = origen.puntos()['bottom']
+    x2, y2 = destino.puntos()['top']
+    bajo, alto = canal_destino, canal_origen
+    probados = set()
+    pendientes = [x2]
+    while pendientes and len(probados) < 16:
+        x = pendientes.pop(0)
+        if x in probados:
+            continue
+        probados.add(x)
+        bloqueos = indice.consultar(x, bajo, x, alto, ignorar)
+        if not bloqueos:
+            return [(x1, y1), (x1, canal_origen), (x, canal_origen), (x, canal_destino), (x2, canal_destino), (x2, y2)]
+        # Los bordes de los nodos que bloquean son los siguientes pasillos candidatos (el más cercano primero)
+        bordes = []
+        for clave in bloqueos:
+            bx0, _, bx1, _ = indice.cajas[clave]
+            bordes.extend((bx0 - sep / 2, bx1 + sep / 2))
+        pendientes.extend(sorted(bordes, key=lambda b: abs(b - x2)))
+        pendientes.sort(key=lambda b: abs(b - x2))
+    return None
+
+
+def _simplificar(puntos):
+    """Quita puntos repetidos y vértices intermedios alineados de una polilínea ortogonal"""
+    limpios = []
+    for p in puntos:
+        if limpios and abs(p[0] - limpios[-1][0]) < 1e-9 and abs(p[1] - limpios[-1][1]) < 1e-9:
+            continue
+        if len(limpios) >= 2:
+            (xa, ya), (xb, yb) = limpios[-2], limpios[-1]
+            if (abs(xa - xb) < 1e-9 and abs(xb - p[0]) < 1e-9) or (abs(ya - yb) < 1e-9 and abs(yb - p[1]) < 1e-9):
+                limpios[-1] = p
+                continue
+        limpios.append(p)
+    return limpios
+
+
+def _ruta_rejilla(indice, inicio, fin, sep):
+    """Trazado ortogonal libre entre dos puntos fuera de los nodos, o None si no existe.
+
+    Último recurso cuando fallan los trazados por canales: busca con A* el camino de
+    menor longitud (con penalización por codo) sobre una rejilla formada por los bordes de
+    los nodos separados 'sep'. La ventana de búsqueda empieza alrededor de los dos
+    puntos y se duplica hasta cubrir todo el diagrama.
+    """
+    import heapq
+    cajas = list(indice.cajas.values())
+    if not cajas:
+        return [inicio, fin]
+    total = (min(c[0] for c in cajas) - sep, min(c[1] for c in cajas) - sep,
+             max(c[2] for c in cajas) + sep, max(c[3] for c in cajas) + sep)
+    margen = 4 * sep
+    while True:
+        ventana = (min(inicio[0], fin[0]) - margen, min(inicio[1], fin[1]) - margen,
+                   max(inicio[0], fin[0]) + margen, max(inicio[1], fin[1]) + margen)
+        completa = (ventana[0] <= total[0] and ventana[1] <= total[1] and
+                    ventana[2] >= total[2] and ventana[3] >= total[3])
+        xs, ys = {inicio[0], fin[0], ventana[0], ventana[2]}, {inicio[1], fin[1], ventana[1], ventana[3]}
+        for clave in indice.consultar(*ventana):
+            x0, y0, x1, y1 = indice.cajas[clave]
+            xs.update((x0 - sep / 2, x1 + sep / 2))
+            ys.update((y0 - sep / 2, y1 + sep / 2))
+        xs = sorted(x for x in xs if ventana[0] <= x <= ventana[2])
+        ys = sorted(y for y in ys if ventana[1] <= y <= ventana[3])
+        objetivo = (xs.index(fin[0]), ys.index(fin[1]))
+        origen = (xs.index(inicio[0]), ys.index(inicio[1]))
+        # A* sobre (columna, fila, dirección) con la distancia Manhattan como cota;
+        # cada codo cuesta como 'sep' de longitud
+        mejor = {}
+        cola = [(0.0, 0.0, origen, None, None)]
+        while cola:
+            _, coste, (i, j), direccion, previo = heapq.heappop(cola)
+            if ((i, j), direccion) in mejor:
+                continue
+            mejor[((i, j), direccion)] = previo
+            if (i, j) == objetivo:
+                camino, estado = [], ((i, j), direccion)
+                while estado is not None:
+                    (ci, cj), _ = estado
+                    camino.append((xs[ci], ys[cj]))
+                    estado = mejor[estado]
+                return _simplificar(camino[::-1])
+            for di, dj in ((1, 0), (-1, 0), (0, 1), (0, -1)):
+                ni, nj = i + di, j + dj
+                if not (0 <= ni < len(xs) and 0 <= nj < len(ys)) or ((ni, nj), (di, dj)) in mejor:
+                    continue
+                xa, ya, xb, yb = xs[i], ys[j], xs[ni], ys[nj]
+                if indice.consultar(min(xa, xb), min(ya, yb), max(xa, xb), max(ya, yb)):
+                    continue
+                paso = abs(xb - xa) + abs(yb - ya) + (sep if direccion not in (None, (di, dj)) else 0.0)
+                cota = abs(fin[0] - xb) + abs(fin[1] - yb)
+                heapq.heappush(cola, (coste + paso + cota, coste + paso, (ni, nj), (di, dj), ((i, j), direccion)))
+        if completa:
+            return None
+        margen *= 2
+
+
+def _con_rejilla(indice, puerto_origen, salida, entrada, puerto_destino, sep):
+    """Trazado puerto -> salida -> (rejilla) -> entrada -> puerto, o None si no hay camino libre"""
+    medio = _ruta_rejilla(indice, salida, entrada, sep)
+    if medio is None:
+        return None
+    return _simplificar([puerto_origen] + medio + [puerto_destino])
+
+
+def calcular_rutas(diagrama, carril_x, sep_carriles=0.4, sep_nodos=1.5):
+    """Trazados ortogonales de todas las aristas de un diagrama ya posicionado por el motor de layout.
+
+    Un índice espacial sobre las cajas de los nodos descarta los trazados que atraviesan
+    nodos; de los libres se elige el de menos codos. Los retornos salen del puerto
+    izquierdo de su origen y, si el paso directo al carril está ocupado, recorren el
+    canal entre capas; los que van a un mismo destino comparten carril lateral y los
+    carriles se anidan sin cruzarse. Si ningún trazado por canales queda libre se busca
+    uno en una rejilla alrededor de los nodos (ver _ruta_rejilla).
+    """
+    nodos = diagrama.nodos
+    indice = IndiceEspacial.desde_nodos(nodos.values())
+    techo_capa, suelo_capa = {}, {}
+    for nodo in nodos.values():
+        techo_capa[nodo.capa] = max(techo_capa.get(nodo.capa, nodo.y + nodo.alto), nodo.y + nodo.alto)
+        suelo_capa[nodo.capa] = min(suelo_capa.get(nodo.capa, nodo.y), nodo.y)
+
+    def canal_bajo(capa):
+        # Altura media del hueco entre una capa y la siguiente
+        siguiente = techo_capa.get(capa + 1, suelo_capa[capa] - 2 * sep_carriles)
+        return (suelo_capa[capa] + siguiente) / 2
+
+    def canal_alto(capa):
+        return canal_bajo(capa - 1) if capa - 1 in suelo_capa else techo_capa[capa] + sep_carriles
+
+    min_x = min((nodo.x for nodo in nodos.values()), default=0.0)
+
+    # Carril por destino de retorno; el retorno de menor recorrido vertical va más cerca del diagrama
+    tramos = {}
+    for arista in diagrama.aristas:
+        if arista.retorno or arista.origen == arista.destino:
+            y_origen = nodos[arista.origen].puntos()['center'][1]
+            y_destino = nodos[arista.destino].puntos()['left'][1]
+            bajo, alto = tramos.get(arista.destino, (y_destino, y_destino))
+            tramos[arista.destino] = (min(bajo, y_origen), max(alto, y_origen))
+    carriles = {}
+    for k, destino in enumerate(sorted(tramos, key=lambda d: tramos[d][1] - tramos[d][0])):
+        carriles[destino] = carril_x - k * sep_carriles
+
+    rutas = []
+    for arista in diagrama.aristas:
+        origen = nodos[arista.origen]
+        destino = nodos[arista.destino]
+        o_pts, d_pts = origen.puntos(), destino.puntos()
+        ignorar = (arista.origen, arista.destino)
+        if arista.retorno or arista.origen == arista.destino:
+            rutas.append(_ruta_retorno(indice, arista, origen, destino, carriles[arista.destino], min_x,
+                                       canal_bajo, canal_alto, sep_carriles, sep_nodos))
+            continue
+        if arista.lateral and origen.capa == destino.capa:
+            directa = [o_pts['right'], d_pts['left']]
+            if indice.libre(directa, ignorar):
+                rutas.append(Ruta(arista, directa, [0]))
+                continue
+            # Hay otro nodo entre ambos: se rodea por el canal bajo (o sobre) la capa
+            puntos = None
+            for y_canal, lado in ((canal_bajo(origen.capa), 'bottom'), (canal_alto(origen.capa), 'top')):
+                (x1, y1), (x2, y2) = o_pts[lado], d_pts[lado]
+                candidata = [(x1, y1), (x1, y_canal), (x2, y_canal), (x2, y2)]
+                if indice.libre(candidata, ignorar):
+                    puntos = candidata
+                    break
+            if puntos is None:
+                (x1, y1), (x2, y2) = o_pts['bottom'], d_pts['bottom']
+                puntos = _con_rejilla(indice, (x1, y1), (x1, y1 - sep_carriles), (x2, y2 - sep_carriles),
+                                      (x2, y2), sep_nodos) or directa
+            rutas.append(Ruta(arista, puntos, [len(puntos) - 2]))
+            continue
+
+        canal_origen = canal_bajo(origen.capa)
+        canal_destino = canal_bajo(destino.capa - 1) if destino.capa - 1 in suelo_capa else canal_origen
+        puntos = None
+        for candidata in _candidatas(origen, destino, canal_origen, canal_destino):
+            if indice.libre(candidata, ignorar):
+                puntos = candidata
+                break
+        if puntos is None:
+            puntos = _desvio(indice, origen, destino, canal_origen, canal_destino, sep_nodos, ignorar)
+            if puntos is not None and not indice.libre(puntos, ignorar):
+                puntos = None
+        if puntos is None:
+            (x1, y1), (x2, y2) = o_pts['bottom'], d_pts['top']
+            puntos = _con_rejilla(indice, (x1, y1), (x1, y1 - sep_carriles), (x2, y2 + sep_carriles),
+                                  (x2, y2), sep_nodos)
+        if puntos is None:
+            # Solo si los nodos se solapan y no queda ningún hueco: se acepta el codo simple
+            puntos = next(_candidatas(origen, destino, canal_origen, canal_destino))
+        rutas.append(Ruta(arista, puntos, [len(puntos) - 2]))
+    return rutas
+
+
+def _ruta_retorno(indice, arista, origen, destino, carril, min_x, canal_bajo, canal_alto, sep_carriles, sep_nodos):
+    """Retorno desde el puerto izquierdo del origen al izquierdo del destino por su carril lateral.
+
+    Cada extremo prueba primero el tramo horizontal directo entre el puerto y el carril;
+    si lo bloquea un nodo a la izquierda, baja (o sube) pegado al nodo hasta el canal
+    entre capas, que siempre está libre, y lo recorre hasta el carril. Los bucles sobre
+    un mismo nodo salen por abajo. Las puntas van al llegar al carril y al destino.
+    """
+    ignorar = (arista.origen, arista.destino)
+    x_o, y_o = origen.puntos()['left']
+    x_d, y_d = destino.puntos()['left']
+    pegado_o, pegado_d = x_o - sep_carriles, x_d - sep_carriles
+    if arista.origen == arista.destino:
+        xb, yb = origen.puntos()['bottom']
+        salidas = [[(xb, yb), (xb, canal_bajo(origen.capa)), (carril, canal_bajo(origen.capa))]]
+    else:
+        salidas = [[(x_o, y_o), (carril, y_o)]]
+        salidas += [[(x_o, y_o), (pegado_o, y_o), (pegado_o, y), (carril, y)]
+                    for y in (canal_bajo(origen.capa), canal_alto(origen.capa))]
+    llegadas = [[(carril, y_d), (x_d, y_d)]]
+    llegadas += [[(carril, y), (pegado_d, y), (pegado_d, y_d), (x_d, y_d)]
+                 for y in (canal_alto(destino.capa), canal_bajo(destino.capa))]
+    # Salida y llegada se comprueban por separado: el tramo vertical del carril solo se
+    # comprueba si el carril entra en la zona de los nodos (suele estar a su izquierda)
+    salida = next((c for c in salidas if indice.libre(c, ignorar)), None)
+    llegada = next((c for c in llegadas if indice.libre(c, ignorar)), None)
+    puntos = None
+    if salida is not None and llegada is not None:
+        puntos = salida + llegada
+        if carril > min_x and not indice.libre([salida[-1], llegada[0]], ignorar):
+            puntos = None
+    if puntos is None:
+        inicio = (pegado_o, y_o) if arista.origen != arista.destino else salidas[0][1]
+        medio = _ruta_rejilla(indice, inicio, (pegado_d, y_d), sep_nodos)
+        puntos = [salidas[0][0]] + medio + [(x_d, y_d)] if medio is not None else salidas[0] + llegadas[0]
+    puntos = _simplificar(puntos)
+    # Punta al llegar al carril (el primer tramo horizontal que termina en él) y al destino
+    al_carril = next((i for i, ((xa, ya), (xb, yb)) in enumerate(zip(puntos, puntos[1:]))
+                      if abs(xb - carril) < 1e-9 and abs(ya - yb) < 1e-9 and xa > xb), None)
+    puntas = sorted({al_carril, len(puntos) - 2} - {None})
+    return Ruta(arista, puntos, puntas)
@@ -0,0 +1,341 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+from cache_render import huella_estable, huella_fuentes
+from modelo_diagrama import Diagrama
+
+FORMATOS = {
+    'html': 'text/html; charset=utf-8',
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+    'cliente': 'text/html; charset=utf-8',
+}
+ESTADOS = {200: 'OK', 304: 'Not Modified', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           411: 'Length Required', 413: 'Payload Too Large', 500: 'Internal Server Error',
+           503: 'Service Unavailable'}
+
+
+def _precalentar():
+    """Inicializador de cada trabajador: deja cargados matplotlib, las fuentes y el generador"""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot  # noqa: F401
+    from ajuste_texto import ajustar_texto
+    import DiagramaFlujoParking  # noqa: F401
+    ajustar_texto('Precalentar métricas de la fuente', 4, 10)
+
+
+def _listo():
+    return True
+
+
+def renderizar(espec, formato, dpi, max_megapixeles):
+    """Trabajo del pool: renderiza una especificación y devuelve los bytes de la respuesta"""
+    diagrama = Diagrama.desde_dict(espec)
+    if formato == 'svg':
+        from svg_diagrama import diagrama_a_svg
+        return diagrama_a_svg(diagrama).encode('utf-8')
+
+    import matplotlib.pyplot as plt
+    from DiagramaFlujoParking import GeneradorDiagramaParqueadero
+    titulo = (diagrama.titulo or 'Diagrama').replace('\n', ' ')
+    generador = GeneradorDiagramaParqueadero(titulo)
+    generador.dpi = dpi
+    generador.max_megapixeles = max_megapixeles
+    if formato == 'png':
+        fig = generador.crear_diagrama_desde_modelo(diagrama)
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format='png', bbox_inches='tight', dpi=generador.calcular_dpi(fig))
+        plt.close(fig)
+        return buffer.getvalue()
+
+    generador.agregar_figura(titulo, diagrama)
+    descriptor, ruta = tempfile.mkstemp(suffix='.html')
+    os.close(descriptor)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            generador.exportar_html(ruta, imagenes='cliente' if formato == 'cliente' else 'inline')
+        with open(ruta, 'rb') as f:
+            return f.read()
+    finally:
+        os.remove(ruta)
+
+
+class ErrorHTTP(Exception):
+    def __init__(self, estado, mensaje):
+        super().__init__(mensaje)
+        self.estado = estado
+
+
+class MetricasServicio:
+    """Contadores, latencias recientes, renders en curso y profundidad de la cola de render"""
+
+    def __init__(self, ventana=1000):
+        self.inicio = time.time()
+        self.peticiones = 0
+        self.por_estado = {}
+        self.latencias = deque(maxlen=ventana)
+        self.renders = 0
+        self.segundos_render = 0.0
+        self.deduplicadas = 0
+        self.aciertos_cache = 0
+        self.no_modificadas = 0
+        self.en_cola = 0   # renders esperando un trabajador libre
+        self.max_en_cola = 0
+        self.en_curso = 0  # renders ocupando un trabajador del pool
+
+    def registrar(self, estado, segundos):
+        self.peticiones += 1
+        self.por_estado[estado] = self.por_estado.get(estado, 0) + 1
+        self.latencias.append(segundos)
+
+    def a_dict(self):
+        ordenadas = sorted(self.latencias)
+
+        def percentil(p):
+            return ordenadas[min(len(ordenadas) - 1, int(p * len(ordenadas)))] if ordenadas else None
+        return {
+            'segundos_activo': time.time() - self.inicio,
+            'peticiones': self.peticiones,
+            'por_estado': {str(k): v for k, v in sorted(self.por_estado.items())},
+            'latencia': {'p50': percentil(0.50), 'p95': percentil(0.95), 'p99': percentil(0.99),
+                         'max': ordenadas[-1] if ordenadas else None, 'muestras': len(ordenadas)},
+            'renders': self.renders,
+            'segundos_render_medio': self.segundos_render / self.renders if self.renders else None,
+            'deduplicadas': self.deduplicadas,
+            'aciertos_cache': self.aciertos_cache,
+            'no_modificadas': self.no_modificadas,
+            'en_cola': self.en_cola,
+            'max_en_cola': self.max_en_cola,
+            'en_curso': self.en_curso,
+        }
+
+
+class ServicioDiagramas:
+    """Servicio HTTP local: POST /render con la especificación JSON del diagrama.
+
+    El render se hace en un pool de procesos precalentado (matplotlib y fuentes ya
+    cargados). Las peticiones idénticas en curso comparten un único render y las
+    respuestas llevan un ETag derivado de la huella de la especificación.
+    """
+
+    def __init__(self, procesos=None, dpi=150, max_megapixeles=50, max_cola=64,
+                 max_cuerpo=10 * 1024 * 1024, max_bytes_cache=64 * 1024 * 1024):
+        self.procesos = procesos or os.cpu_count() or 1
+        self.dpi = dpi
+        self.max_megapixeles = max_megapixeles
+        self.max_cola = max_cola
+        self.max_cuerpo = max_cuerpo
+        self.max_bytes_cache = max_bytes_cache
+        self.metricas = MetricasServicio()
+        # El código del render forma parte del ETag: tras un despliegue no valen los 304 anteriores
+        self.huella_codigo = huella_fuentes(__file__)
+        self._pool = None
+        self._trabajadores = asyncio.Semaphore(self.procesos)  # un hueco por trabajador del pool
+        self._compartidos = {}        # etag -> tarea de render compartida
+        self._cache = OrderedDict()   # etag -> bytes, LRU en memoria
+        self._bytes_cache = 0
+
+    async def iniciar_pool(self):
+        loop = asyncio.get_running_loop()
+        self._pool = ProcessPoolExecutor(max_workers=self.procesos, initializer=_precalentar)
+        # Fuerza el arranque de todos los trabajadores antes de aceptar peticiones
+        await asyncio.gather(*(loop.run_in_executor(self._pool, _listo) for _ in range(self.procesos)))
+        print(f"🔥 {self.procesos} trabajadores precalentados")
+
+    def cerrar(self):
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+    def etag(self, diagrama, formato):
+        return '"' + huella_estable(diagrama.huella(), formato, self.dpi, self.max_megapixeles,
+                                    self.huella_codigo)[:32] + '"'
+
+    def _guardar_cache(self, etag, datos):
+        if len(datos) > self.max_bytes_cache:
+            return
+        self._cache[etag] = datos
+        self._bytes_cache += len(datos)
+        while self._bytes_cache > self.max_bytes_cache:
+            _, antiguo = self._cache.popitem(last=False)
+            self._bytes_cache -= len(antiguo)
+
+    async def _render(self, etag, espec, formato):
+        loop = asyncio.get_running_loop()
+        metricas = self.metricas
+        metricas.en_cola += 1
+        metricas.max_en_cola = max(metricas.max_en_cola, metricas.en_cola)
+        try:
+            # El render espera en la cola hasta que haya un trabajador libre; solo entonces va al pool
+            try:
+                await self._trabajadores.acquire()
+            finally:
+                metricas.en_cola -= 1
+            metricas.en_curso += 1
+            inicio = time.perf_counter()
+            try:
+                datos = await loop.run_in_executor(self._pool, renderizar, espec, formato, self.dpi,
+                                                   self.max_megapixeles)
+            finally:
+                metricas.en_curso -= 1
+                self._trabajadores.release()
+        finally:
+            self._compartidos.pop(etag, None)
+        metricas.renders += 1
+        metricas.segundos_render += time.perf_counter() - inicio
+        self._guardar_cache(etag, datos)
+        return datos
+
+    async def obtener(self, espec, formato, si_no_coincide=None):
+        """Devuelve (estado, etag, datos) deduplicando renders idénticos en curso"""
+        try:
+            diagrama = Diagrama.desde_dict(espec)
+        except (KeyError, TypeError, ValueError, AttributeError) as e:
+            raise ErrorHTTP(400, f'Especificación inválida: {type(e).__name__}: {e}')
+        etag = self.etag(diagrama, formato)
+        if si_no_coincide and etag in [e.strip() for e in si_no_coincide.split(',')]:
+            self.metricas.no_modificadas += 1
+            return 304, etag, b''
+        datos = self._cache.get(etag)
+        if datos is not None:
+            self._cache.move_to_end(etag)
+            self.metricas.aciertos_cache += 1
+            return 200, etag, datos
+        tarea = self._compartidos.get(etag)
+        if tarea is None:
+            if self.metricas.en_cola >= self.max_cola:
+                raise ErrorHTTP(503, 'Cola de render llena')
+            tarea = self._compartidos[etag] = asyncio.ensure_future(self._render(etag, espec, formato))
+        else:
+            self.metricas.deduplicadas += 1
+        # shield: si un cliente se desconecta, el render compartido sigue para los demás
+        return 200, etag, await asyncio.shield(tarea)
+
+    async def atender(self, lector, escritor):
+        """Bucle HTTP/1.1 de una conexión (keep-alive salvo 'Connection: close')"""
+        try:
+            while True:
+                try:
+                    cabecera = await lector.readuntil(b'\r\n\r\n')
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    return
+                inicio = time.perf_counter()
+                lineas = cabecera.decode('latin-1').split('\r\n')
+                try:
+                    metodo, destino, _ = lineas[0].split(' ', 2)
+                except ValueError:
+                    return
+                cabeceras = {}
+                for linea in lineas[1:]:
+                    if ':' in linea:
+                        clave, valor = linea.split(':', 1)
+                        cabeceras[clave.strip().lower()] = valor.strip()
+                cerrar = cabeceras.get('connection', '').lower() == 'close'
+                extra = {}
+                try:
+                    if 'transfer-encoding' in cabeceras:
+                        # El cuerpo por bloques no se decodifica: sin leerlo, la conexión no se reutiliza
+                        cerrar = True
+                        raise ErrorHTTP(411, 'Transfer-Encoding no admitido: envíe el cuerpo con Content-Length')
+                    largo = cabeceras.get('content-length', '0')
+                    # Sin un largo válido no se sabe dónde acaba el cuerpo: se cierra la conexión
+                    if not (largo.isascii() and largo.isdigit()):
+                        cerrar = True
+                        raise ErrorHTTP(400, f'Content-Length inválido: {largo!r}')
+                    largo = int(largo)
+                    if largo > self.max_cuerpo:
+                        cerrar = True
+                        raise ErrorHTTP(413, 'Especificación demasiado grande')
+                    cuerpo = await lector.readexactly(largo) if largo else b''
+                    estado, tipo, datos, extra = await self._despachar(metodo, destino, cabeceras, cuerpo)
+                except ErrorHTTP as e:
+                    estado, tipo, datos = e.estado, 'application/json', json.dumps({'error': str(e)}).encode()
+                except asyncio.IncompleteReadError:
+                    return
+                except Exception as e:
+                    estado, tipo = 500, 'application/json'
+                    datos = json.dumps({'error': f'{type(e).__name__}: {e}'}, ensure_ascii=False).encode()
+                self.metricas.registrar(estado, time.perf_counter() - inicio)
+                respuesta = [f'HTTP/1.1 {estado} {ESTADOS.get(estado, "")}',
+                             f'Content-Length: {len(datos)}', f'Content-Type: {tipo}']
+                respuesta += [f'{k}: {v}' for k, v in extra.items()]
+                if cerrar:
+                    respuesta.append('Connection: close')
+                escritor.write(('\r\n'.join(respuesta) + '\r\n\r\n').encode('latin-1') + datos)
+                await escritor.drain()
+                if cerrar:
+                    return
+        finally:
+            escritor.close()
+
+    async def _despachar(self, metodo, destino, cabeceras, cuerpo):
+        url = urlsplit(destino)
+        if url.path == '/salud':
+            return 200, 'application/json', b'{"estado":"ok"}', {}
+        if url.path == '/metricas':
+            metricas = self.metricas.a_dict()
+            metricas['entradas_cache'] = len(self._cache)
+            metricas['bytes_cache'] = self._bytes_cache
+            metricas['procesos'] = self.procesos
+            return 200, 'application/json', json.dumps(metricas, ensure_ascii=False).encode('utf-8'), {}
+        if url.path != '/render':
+            raise ErrorHTTP(404, f'Ruta desconocida: {url.path}')
+        if metodo != 'POST':
+            raise ErrorHTTP(405, 'Use POST con la especificación JSON en el cuerpo')
+        formato = parse_qs(url.query).get('formato', ['html'])[0]
+        if formato not in FORMATOS:
+            raise ErrorHTTP(400, f'Formato desconocido: {formato} (html, png, svg o cliente)')
+        try:
+            espec = json.loads(cuerpo)
+        except (UnicodeDecodeError, json.JSONDecodeError) as e:
+            raise ErrorHTTP(400, f'JSON inválido: {e}')
+        if not isinstance(espec, dict):
+            raise ErrorHTTP(400, 'La especificación debe ser un objeto JSON')
+        estado, etag, datos = await self.obtener(espec, formato, cabeceras.get('if-none-match'))
+        extra = {'ETag': etag, 'Cache-Control': 'no-cache'}
+        return estado, FORMATOS[formato], datos, extra
+
+    async def servir(self, host='127.0.0.1', puerto=8765):
+        await self.iniciar_pool()
+        servidor = await asyncio.start_server(self.atender, host, puerto)
+        print(f"🌐 Servicio de diagramas en http://{host}:{puerto} (POST /render?formato=html|png|svg|cliente)")
+        try:
+            async with servidor:
+                await servidor.serve_forever()
+        finally:
+            self.cerrar()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Servicio HTTP local de render de diagramas de flujo')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--puerto', type=int, default=8765)
+    parser.add_argument('-j', '--procesos', type=int, default=None, help='trabajadores del pool')
+    parser.add_argument('--dpi', type=int, default=150)
+    parser.add_argument('--max-megapixeles', type=float, default=50)
+    parser.add_argument('--max-cola', type=int, default=64, help='renders en espera antes de responder 503')
+    parser.add_argument('--max-cuerpo-mb', type=float, default=10, help='tamaño máximo de la especificación (413)')
+    args = parser.parse_args(argv)
+
+    servicio = ServicioDiagramas(args.procesos, args.dpi, args.max_megapixeles, args.max_cola,
+                                 int(args.max_cuerpo_mb * 1024 * 1024))
+    try:
+        asyncio.run(servicio.servir(args.host, args.puerto))
+    except KeyboardInterrupt:
+        print("👋 Servicio detenido")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,242 @@
+import argparse
+import ast
+import json
+import sys
+import time
+
+import numpy as np
+
+from modelo_diagrama import Diagrama
+
+PLANTAS_NO_RESERVADAS = [2, 3, 5, 7]
+# Mezcla de operaciones del menú (1-9); aparcar y sacar dominan el tráfico real
+PROBABILIDADES = {1: 0.04, 2: 0.40, 3: 0.36, 4: 0.04, 5: 0.04, 6: 0.04, 7: 0.01, 8: 0.04, 9: 0.03}
+
+
+class SimuladorParqueadero:
+    """Aplica eventos del menú a muchos garajes independientes a la vez.
+
+    El estado es una matriz booleana (garajes, plantas, plazas), la 'b' del diagrama
+    para cada garaje. En cada paso cada garaje recibe un evento y todos se aplican con
+    operaciones vectorizadas de NumPy, sin bucles de Python por evento.
+    """
+
+    def __init__(self, garajes=10000, plantas=8, plazas=5, probabilidades=None, ciclo=None, semilla=0):
+        self.garajes = garajes
+        self.plantas = plantas
+        self.plazas = plazas
+        self.probabilidades = dict(probabilidades or PROBABILIDADES)
+        # Con ciclo=N pasos, la proporción de llegadas sigue una onda (horas punta y valle)
+        self.ciclo = ciclo
+        self.rng = np.random.default_rng(semilla)
+        self.b = np.zeros((garajes, plantas, plazas), dtype=bool)
+        self.no_reservadas = [p for p in PLANTAS_NO_RESERVADAS if p < plantas]
+        self.paso = 0
+        self.conteo = np.zeros(10, dtype=np.int64)  # eventos por opción (índice = opción)
+        self.resultados = {'aparcados': 0, 'rechazados': 0, 'sacados': 0, 'sin_coche': 0,
+                           'plantas_libres': 0, 'total_coches': 0, 'no_reservadas': 0}
+        self.planta_mas_vacia = np.zeros(plantas, dtype=np.int64)
+        self.suma_porcentajes = np.zeros(plantas)
+        self.suma_ocupacion = np.zeros(plantas)
+        self.muestras = 0
+
+    def _probabilidades_paso(self):
+        ops = np.array(sorted(self.probabilidades))
+        p = np.array([self.probabilidades[o] for o in ops], dtype=float)
+        if self.ciclo:
+            # En hora punta llegan más coches de los que salen, y al revés en el valle
+            onda = 0.5 * np.sin(2 * np.pi * self.paso / self.ciclo)
+            p[ops == 2] *= 1 + onda
+            p[ops == 3] *= 1 - onda
+        return ops, p / p.sum()
+
+    def paso_vectorizado(self):
+        """Un evento por garaje, aplicado a todos los garajes en bloque"""
+        ops, p = self._probabilidades_paso()
+        op = self.rng.choice(ops, size=self.garajes, p=p)
+        planta = self.rng.integers(0, self.plantas, size=self.garajes)
+        self.conteo += np.bincount(op, minlength=10)
+        b = self.b
+
+        # 2. Aparcar: primera plaza libre de la planta pedida
+        g = np.flatnonzero(op == 2)
+        fila = b[g, planta[g]]
+        libre = ~fila
+        hay = libre.any(axis=1)
+        b[g[hay], planta[g][hay], libre.argmax(axis=1)[hay]] = True
+        self.resultados['aparcados'] += int(hay.sum())
+        self.resultados['rechazados'] += int(len(g) - hay.sum())
+
+        # 3. Sacar coche: se libera la primera plaza ocupada de la planta
+        g = np.flatnonzero(op == 3)
+        fila = b[g, planta[g]]
+        hay = fila.any(axis=1)
+        b[g[hay], planta[g][hay], fila.argmax(axis=1)[hay]] = False
+        self.resultados['sacados'] += int(hay.sum())
+        self.resultados['sin_coche'] += int(len(g) - hay.sum())
+
+        # 7. Mantenimiento: los coches se redistribuyen por igual entre las plantas
+        g = np.flatnonzero(op == 7)
+        if len(g):
+            total = b[g].sum(axis=(1, 2))
+            por_planta = total[:, None] // self.plantas + (np.arange(self.plantas) < (total % self.plantas)[:, None])
+            b[g] = np.arange(self.plazas) < por_planta[:, :, None]
+
+        # Consultas (4, 5, 6, 8, 9): solo leen el estado de los garajes que las piden
+        consultas = np.isin(op, (4, 5, 6, 8, 9))
+        if consultas.any():
+            g = np.flatnonzero(consultas)
+            por_planta = b[g].sum(axis=2)
+            op_g = op[g]
+            self.resultados['plantas_libres'] += int((por_planta[op_g == 4] < self.plazas).sum())
+            self.planta_mas_vacia += np.bincount(por_planta[op_g == 5].argmin(axis=1), minlength=self.plantas)
+            self.resultados['total_coches'] += int(por_planta[op_g == 6].sum())
+            self.suma_porcentajes += (por_planta[op_g == 8] * (100 / self.plazas)).sum(axis=0)
+            self.resultados['no_reservadas'] += int(por_planta[op_g == 9][:, self.no_reservadas].sum())
+        self.paso += 1
+
+    def muestrear(self):
+        self.suma_ocupacion += self.b.mean(axis=(0, 2))
+        self.muestras += 1
+
+    def ejecutar(self, eventos, muestreo=10):
+        """Aplica al menos 'eventos' eventos repartidos en pasos de un evento por garaje"""
+        pasos = -(-eventos // self.garajes)
+        inicio = time.perf_counter()
+        for i in range(pasos):
+            self.paso_vectorizado()
+            if i % muestreo == 0:
+                self.muestrear()
+        segundos = time.perf_counter() - inicio
+        total = pasos * self.garajes
+        return {
+            'garajes': self.garajes,
+            'pasos': pasos,
+            'eventos': total,
+            'segundos': segundos,
+            'eventos_por_segundo': total / segundos if segundos else None,
+            'operaciones': {str(o): int(self.conteo[o]) for o in range(1, 10)},
+            'resultados': dict(self.resultados),
+            'tasa_rechazo': self.resultados['rechazados'] / max(1, int(self.conteo[2])),
+            'ocupacion_media_por_planta': (self.suma_ocupacion / max(1, self.muestras)).round(4).tolist(),
+            'ocupacion_final': float(self.b.mean()),
+            'planta_mas_vacia': self.planta_mas_vacia.tolist(),
+            'porcentaje_medio_por_planta': (self.suma_porcentajes / max(1, int(self.conteo[8]))).round(2).tolist(),
+        }
+
+
+def _evaluar(condicion, entrada):
+    """Evalúa condiciones del tipo entrada == 'x' / entrada != 'x'; None si no se reconoce"""
+    try:
+        expr = ast.parse(condicion, mode='eval').body
+    except SyntaxError:
+        return None
+    if not (isinstance(expr, ast.Compare) and len(expr.ops) == 1 and isinstance(expr.left, ast.Name)
+            and expr.left.id == 'entrada' and isinstance(expr.comparators[0], ast.Constant)):
+        return None
+    valor = expr.comparators[0].value
+    if isinstance(expr.ops[0], ast.Eq):
+        return entrada == valor
+    if isinstance(expr.ops[0], ast.NotEq):
+        return entrada != valor
+    return None
+
+
+def _recorrido(diagrama, inicio, entrada, hasta=None):
+    """Índices de las aristas que recorre el flujo desde 'inicio' con un valor de entrada dado"""
+    salientes = {}
+    for i, a in enumerate(diagrama.aristas):
+        salientes.setdefault(a.origen, []).append(i)
+    aristas, visitados, actual = [], set(), inicio
+    while actual not in visitados:
+        visitados.add(actual)
+        opciones = salientes.get(actual, [])
+        if not opciones:
+            break
+        elegida = opciones[0]
+        if len(opciones) > 1:
+            resultado = _evaluar(diagrama.nodos[actual].texto, entrada)
+            etiqueta = 'SÍ' if resultado else 'NO'
+            elegida = next((i for i in opciones if diagrama.aristas[i].etiqueta == etiqueta), opciones[0])
+        aristas.append(elegida)
+        actual = diagrama.aristas[elegida].destino
+        if actual == hasta:
+            break
+    return aristas
+
+
+def traza_ramas(diagrama, operaciones, sesiones, bucle='bucle'):
+    """Impactos por nodo y por arista del diagrama a partir del conteo de operaciones.
+
+    Cada sesión recorre una vez el arranque y la salida ('s'); cada operación recorre
+    una vuelta del bucle principal con su valor de entrada.
+    """
+    impactos = np.zeros(len(diagrama.aristas), dtype=np.int64)
+    raiz = next(iter(diagrama.nodos))
+    for i in _recorrido(diagrama, raiz, 's'):
+        impactos[i] += sesiones
+    for op, veces in operaciones.items():
+        for i in _recorrido(diagrama, bucle, str(op), hasta=bucle):
+            impactos[i] += veces
+    nodos = dict.fromkeys(diagrama.nodos, 0)
+    nodos[raiz] = sesiones
+    for i, a in enumerate(diagrama.aristas):
+        nodos[a.destino] += int(impactos[i])
+    return {'nodos': nodos,
+            'aristas': [{'desde': a.origen, 'hasta': a.destino, 'impactos': int(impactos[i])}
+                        for i, a in enumerate(diagrama.aristas)]}
+
+
+def superponer_traza(diagrama, traza):
+    """Copia del diagrama con los impactos en los textos; los nodos nunca visitados quedan en gris"""
+    espec = diagrama.a_dict()
+    for n in espec['nodos']:
+        veces = traza['nodos'].get(n['id'], 0)
+        n['texto'] = f"{n['texto']}\n▶ {veces:,}"
+        if not veces:
+            n['color'] = 'lightgray'
+    for a, t in zip(espec['aristas'], traza['aristas']):
+        a['etiqueta'] = f"{a['etiqueta'] + ' ' if a['etiqueta'] else ''}{t['impactos']:,}"
+    return Diagrama.desde_dict(espec)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Simulación vectorizada del sistema de parqueadero')
+    parser.add_argument('--garajes', type=int, default=10000)
+    parser.add_argument('--eventos', type=int, default=1_000_000)
+    parser.add_argument('--ciclo', type=int, default=None, help='pasos de un ciclo de tráfico punta/valle')
+    parser.add_argument('--semilla', type=int, default=0)
+    parser.add_argument('--especificacion', default='especificaciones/parqueadero.json')
+    parser.add_argument('--menu-indice', action='store_true',
+                        help='traza sobre el diagrama del menú del índice de ocupación en lugar de la especificación')
+    parser.add_argument('--traza', default=None, help='JSON con estadísticas e impactos por rama')
+    parser.add_argument('--html', default=None, help='HTML con el diagrama anotado con los impactos')
+    args = parser.parse_args(argv)
+
+    simulador = SimuladorParqueadero(args.garajes, ciclo=args.ciclo, semilla=args.semilla)
+    informe = simulador.ejecutar(args.eventos)
+    print(f"🚗 {informe['eventos']:,} eventos en {informe['garajes']:,} garajes: {informe['segundos']:.2f} s "
+          f"({informe['eventos_por_segundo']:,.0f} eventos/s)")
+    print(f"📊 Ocupación final {informe['ocupacion_final']:.1%}, rechazos al aparcar {informe['tasa_rechazo']:.1%}")
+
+    if args.menu_indice:
+        from indice_ocupacion import diagrama_menu
+        diagrama = diagrama_menu(simulador.plantas, simulador.plazas)
+    else:
+        diagrama = Diagrama.desde_archivo(args.especificacion)
+    informe['traza'] = traza_ramas(diagrama, {int(k): v for k, v in informe['operaciones'].items()},
+                                   args.garajes)
+    if args.traza:
+        with open(args.traza, 'w', encoding='utf-8') as f:
+            json.dump(informe, f, ensure_ascii=False, indent=2)
+        print(f"📄 Traza: {args.traza}")
+    if args.html:
+        from DiagramaFlujoParking import GeneradorDiagramaParqueadero
+        generador = GeneradorDiagramaParqueadero('Simulación del parqueadero')
+        generador.agregar_diagrama_svg('🔥 Impactos por rama', superponer_traza(diagrama, informe['traza']))
+        generador.exportar_html(args.html)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,182 @@
+from html import escape
+
+from ajuste_texto import PUNTOS_POR_UNIDAD, ajustar_texto, ancho_palabra
+from modelo_diagrama import Diagrama, MotorLayout, calcular_rutas
+
+ESCALA = PUNTOS_POR_UNIDAD  # 1 unidad del modelo = 72 unidades SVG: los grosores y fuentes quedan en puntos
+DESPLAZAMIENTO_SOMBRA = 0.15
+TAM_PUNTA = 0.35  # ancho y largo de la punta, como head_width/head_length de crear_flecha_perfecta
+MARGEN_TEXTO = 0.3
+
+ESTILO = ('.sombra{fill:gray;opacity:.3}'
+          '.forma{stroke:#000;stroke-width:2.5;stroke-linejoin:miter}'
+          '.ruta{fill:none;stroke-width:2}'
+          'text{font-family:"DejaVu Sans",Arial,sans-serif;font-weight:bold;text-anchor:middle}'
+          '.etiqueta rect{fill:#fff;fill-opacity:.95;stroke:gray}'
+          '.titulo{fill:#E6B3FF;stroke:#C8A8E9;stroke-width:3}')
+
+
+def _n(valor):
+    """Número SVG compacto (2 decimales, sin ceros sobrantes)"""
+    texto = f'{valor:.2f}'.rstrip('0').rstrip('.')
+    return '0' if texto == '-0' else texto
+
+
+def _id_color(color):
+    return ''.join(c if c.isalnum() else '_' for c in color)
+
+
+def _forma_local(id, forma, ancho, alto):
+    """Geometría de una forma en coordenadas SVG locales (origen en la esquina superior izquierda)"""
+    w, h = ancho * ESCALA, alto * ESCALA
+    if forma == 'rombo':
+        return f'<path id="{id}" d="M{_n(w / 2)} 0L{_n(w)} {_n(h / 2)}L{_n(w / 2)} {_n(h)}L0 {_n(h / 2)}Z"/>'
+    return f'<rect id="{id}" width="{_n(w)}" height="{_n(h)}"/>'
+
+
+class _LienzoSVG:
+    """Transforma coordenadas del modelo (y hacia arriba) a SVG (y hacia abajo)"""
+
+    def __init__(self, x0, y0, x1, y1):
+        self.x0, self.y1 = x0, y1
+        self.ancho, self.alto = (x1 - x0) * ESCALA, (y1 - y0) * ESCALA
+
+    def x(self, x):
+        return _n((x - self.x0) * ESCALA)
+
+    def y(self, y):
+        return _n((self.y1 - y) * ESCALA)
+
+
+def _texto(lienzo, cx, cy, texto, fontsize, interlineado):
+    """Texto multilínea centrado verticalmente en (cx, cy) como <text> con un <tspan> por línea"""
+    lineas = texto.split('\n')
+    primera = -(len(lineas) - 1) / 2 * interlineado
+    partes = [f'<text x="{lienzo.x(cx)}" y="{lienzo.y(cy)}" font-size="{fontsize}" dominant-baseline="central">']
+    for i, linea in enumerate(lineas):
+        dy = primera if i == 0 else interlineado
+        partes.append(f'<tspan x="{lienzo.x(cx)}" dy="{_n(dy)}em">{escape(linea) or " "}</tspan>')
+    partes.append('</text>')
+    return ''.join(partes)
+
+
+def diagrama_a_svg(diagrama, motor=None, titulo=True, atributos=''):
+    """Serializa un Diagrama a SVG sin pasar por matplotlib.
+
+    Cada forma distinta (tipo y tamaño) y cada punta de flecha (por color) se define una
+    sola vez en <defs>; nodos y sombras la instancian con <use>. 'atributos' se añade
+    tal cual a la etiqueta <svg> (p. ej. clase y estilo al incrustarlo en HTML).
+    """
+    if isinstance(diagrama, dict):
+        diagrama = Diagrama.desde_dict(diagrama)
+    motor = motor or MotorLayout()
+    layout = motor.calcular(diagrama)
+    rutas = calcular_rutas(diagrama, motor.margen / 2)
+
+    con_titulo = titulo and diagrama.titulo
+    alto_total = layout.alto + (5 if con_titulo else 0)
+    # Con muchos destinos de retorno los carriles laterales pueden salir del margen izquierdo
+    x_min = min((x for ruta in rutas for x, _ in ruta.puntos), default=0.0)
+    lienzo = _LienzoSVG(min(0.0, x_min - TAM_PUNTA), 0, layout.ancho, alto_total)
+
+    formas = {}
+    for nodo in diagrama.nodos.values():
+        clave = (nodo.forma, nodo.ancho, nodo.alto)
+        if clave not in formas:
+            formas[clave] = f'f{len(formas)}'
+    colores = {}
+    for ruta in rutas:
+        if ruta.puntas and ruta.arista.color not in colores:
+            colores[ruta.arista.color] = 'p_' + _id_color(ruta.arista.color)
+
+    punta = TAM_PUNTA * ESCALA
+    partes = [f'<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" '
+              f'viewBox="0 0 {_n(lienzo.ancho)} {_n(lienzo.alto)}" width="{_n(lienzo.ancho)}" '
+              f'height="{_n(lienzo.alto)}"{" " + atributos if atributos else ""}>',
+              f'<defs><style>{ESTILO}</style>']
+    for (forma, ancho, alto), id in formas.items():
+        partes.append(_forma_local(id, forma, ancho, alto))
+    for color, id in colores.items():
+        partes.append(f'<marker id="{id}" markerUnits="userSpaceOnUse" markerWidth="{_n(punta)}" '
+                      f'markerHeight="{_n(punta)}" refX="{_n(punta / 2)}" refY="{_n(punta / 2)}" orient="auto">'
+                      f'<path d="M0 0L{_n(punta)} {_n(punta / 2)}L0 {_n(punta)}Z" fill="{escape(color)}"/></marker>')
+    partes.append('</defs>')
+
+    if con_titulo:
+        x, y, w, h, pad = 1, layout.alto + 0.5, layout.ancho - 2, 3.5, 0.5
+        partes.append(f'<rect class="titulo" x="{lienzo.x(x - pad)}" y="{lienzo.y(y + h + pad)}" '
+                      f'width="{_n((w + 2 * pad) * ESCALA)}" height="{_n((h + 2 * pad) * ESCALA)}" '
+                      f'rx="{_n(pad * ESCALA)}"/>')
+        partes.append(_texto(lienzo, x + w / 2, y + h / 2, diagrama.titulo, 18, 1.2))
+
+    # Capas en el orden de los zorder de matplotlib: sombras (1), formas (2), textos (3),
+    # rutas con sus puntas (4) y etiquetas de arista (5)
+    sombras, cuerpos, textos = [], [], []
+    for nodo in diagrama.nodos.values():
+        id = formas[(nodo.forma, nodo.ancho, nodo.alto)]
+        sx, sy = nodo.x + DESPLAZAMIENTO_SOMBRA, nodo.y + nodo.alto - DESPLAZAMIENTO_SOMBRA
+        sombras.append(f'<use xlink:href="#{id}" x="{lienzo.x(sx)}" y="{lienzo.y(sy)}"/>')
+        cuerpos.append(f'<use xlink:href="#{id}" x="{lienzo.x(nodo.x)}" y="{lienzo.y(nodo.y + nodo.alto)}" '
+                       f'fill="{escape(nodo.color)}"/>')
+        if nodo.forma == 'rombo':
+            texto = ajustar_texto(nodo.texto, nodo.ancho / 2, nodo.fontsize, estimado=True)
+            interlineado = 1.2
+        else:
+            texto = ajustar_texto(nodo.texto, nodo.ancho - 2 * MARGEN_TEXTO, nodo.fontsize, estimado=True)
+            interlineado = 1.4
+        cx, cy = nodo.puntos()['center']
+        textos.append(_texto(lienzo, cx, cy, texto, nodo.fontsize, interlineado))
+    partes.append(f'<g class="sombra">{"".join(sombras)}</g>')
+    partes.append(f'<g class="forma">{"".join(cuerpos)}</g>')
+
+    trazos, etiquetas = [], []
+    for ruta in rutas:
+        arista = ruta.arista
+        color = escape(arista.color)
+        # Cada tramo que termina en punta es un <path> propio con marker-end
+        tramo = [ruta.puntos[0]]
+        ultimo = max(ruta.puntas) if ruta.puntas else None
+        for i, (p1, p2) in enumerate(ruta.segmentos()):
+            tramo.append(p2)
+            if i not in ruta.puntas and i < len(ruta.puntos) - 2:
+                continue
+            con_punta = i in ruta.puntas
+            if con_punta:
+                # La línea termina a media punta (refX) para que el trazo no asome por el vértice
+                (xa, ya), (xb, yb) = p1, p2
+                largo = ((xb - xa) ** 2 + (yb - ya) ** 2) ** 0.5 or 1.0
+                recorte = min(TAM_PUNTA / 2, largo)
+                tramo[-1] = (xb - (xb - xa) / largo * recorte, yb - (yb - ya) / largo * recorte)
+            d = 'M' + 'L'.join(f'{lienzo.x(x)} {lienzo.y(y)}' for x, y in tramo)
+            marcador = f' marker-end="url(#{colores[arista.color]})"' if con_punta else ''
+            trazos.append(f'<path d="{d}" stroke="{color}"{marcador}/>')
+            tramo = [p2]
+            if con_punta and i == ultimo and arista.etiqueta:
+                etiquetas.append(_etiqueta(lienzo, p1, p2, arista.etiqueta))
+    partes.append(''.join(textos))
+    partes.append(f'<g class="ruta">{"".join(trazos)}</g>')
+    partes.append(''.join(etiquetas))
+    partes.append('</svg>')
+    return ''.join(partes)
+
+
+def _etiqueta(lienzo, p1, p2, texto, fontsize=9):
+    """Etiqueta de arista con fondo blanco, desplazada como en crear_flecha_perfecta"""
+    (x1, y1), (x2, y2) = p1, p2
+    mid_x, mid_y = (x1 + x2) / 2, (y1 + y2) / 2
+    base_y = mid_y + (0.7 if x1 == x2 else 0.5)
+    pad = 0.3 * fontsize / PUNTOS_POR_UNIDAD
+    ancho = ancho_palabra(texto, None, fontsize) + 2 * pad
+    alto = 1.2 * fontsize / PUNTOS_POR_UNIDAD + 2 * pad
+    return (f'<g class="etiqueta"><rect x="{lienzo.x(mid_x - ancho / 2)}" y="{lienzo.y(base_y + alto)}" '
+            f'width="{_n(ancho * ESCALA)}" height="{_n(alto * ESCALA)}" rx="{_n(pad * ESCALA)}"/>'
+            + _texto(lienzo, mid_x, base_y + alto / 2, texto, fontsize, 1.2) + '</g>')
+
+
+def escribir_svg(diagrama, ruta, motor=None):
+    """Escribe el SVG de un diagrama en 'ruta' y devuelve los bytes escritos"""
+    svg = diagrama_a_svg(diagrama, motor)
+    with open(ruta, 'w', encoding='utf-8') as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        f.write(svg)
+    return len(svg.encode('utf-8'))
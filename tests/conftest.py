@@ -0,0 +1,8 @@
+import os
+import sys
+
+import matplotlib
+
+# Los módulos del proyecto están en la raíz del repositorio, sin paquete
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+matplotlib.use('Agg')
@@ -0,0 +1,88 @@
+import contextlib
+import io
+import sys
+import textwrap
+
+from cache_render import huella_fuentes
+from DiagramaFlujoParking import GeneradorDiagramaParqueadero
+
+DIBUJO = '''
+import matplotlib.pyplot as plt
+from estilo_prueba import COLOR
+
+
+def dibujar():
+    fig, ax = plt.subplots(figsize=(1, 1))
+    ax.add_patch(plt.Rectangle((0.2, 0.2), 0.6, 0.6, color=COLOR))
+    return fig
+'''
+
+
+def _escribir(ruta, texto):
+    ruta.write_text(textwrap.dedent(texto), encoding='utf-8')
+
+
+def _exportar(directorio, funcion):
+    generador = GeneradorDiagramaParqueadero('Prueba')
+    generador.dpi = 40
+    cache = generador.usar_cache(str(directorio / 'cache'))
+    generador.agregar_figura('Dibujo', funcion)
+    with contextlib.redirect_stdout(io.StringIO()):
+        generador.exportar_html(str(directorio / 'salida.html'))
+    return cache.estadisticas()
+
+
+def test_huella_fuentes_sigue_importaciones_transitivas(tmp_path):
+    _escribir(tmp_path / 'a.py', 'def f():\n    import b\n')
+    _escribir(tmp_path / 'b.py', 'from c import X\n')
+    _escribir(tmp_path / 'c.py', 'X = 1\n')
+    antes = huella_fuentes(str(tmp_path / 'a.py'))
+    _escribir(tmp_path / 'c.py', 'X = 22\n')
+    assert huella_fuentes(str(tmp_path / 'a.py')) != antes
+
+
+def test_cambio_en_dependencia_de_modulo_invalida_la_cache(tmp_path, monkeypatch):
+    monkeypatch.syspath_prepend(str(tmp_path))
+    _escribir(tmp_path / 'estilo_prueba.py', "COLOR = 'red'\n")
+    _escribir(tmp_path / 'dibujo_prueba.py', DIBUJO)
+    import dibujo_prueba
+
+    try:
+        assert _exportar(tmp_path, dibujo_prueba.dibujar)['fallos'] == 1
+        assert _exportar(tmp_path, dibujo_prueba.dibujar)['aciertos'] == 1
+
+        # Solo cambia una constante del módulo importado, no el código de la función
+        _escribir(tmp_path / 'estilo_prueba.py', "COLOR = 'darkblue'\n")
+        sys.modules.pop('estilo_prueba')
+        estadisticas = _exportar(tmp_path, dibujo_prueba.dibujar)
+        assert (estadisticas['aciertos'], estadisticas['fallos']) == (0, 1)
+    finally:
+        sys.modules.pop('dibujo_prueba', None)
+        sys.modules.pop('estilo_prueba', None)
+
+
+def test_cambio_de_opciones_por_pagina_invalida_la_cache(tmp_path, monkeypatch):
+    monkeypatch.syspath_prepend(str(tmp_path))
+    _escribir(tmp_path / 'estilo_prueba.py', "COLOR = 'red'\n")
+    _escribir(tmp_path / 'dibujo_prueba.py', DIBUJO)
+    import dibujo_prueba
+
+    def exportar(opciones_por_pagina):
+        generador = GeneradorDiagramaParqueadero('Prueba')
+        generador.dpi = 40
+        generador.opciones_por_pagina = opciones_por_pagina
+        cache = generador.usar_cache(str(tmp_path / 'cache'))
+        generador.agregar_figura('Dibujo', dibujo_prueba.dibujar)
+        with contextlib.redirect_stdout(io.StringIO()):
+            generador.exportar_html(str(tmp_path / 'salida.html'))
+        estadisticas = cache.estadisticas()
+        return estadisticas['aciertos'], estadisticas['fallos']
+
+    try:
+        assert exportar(20) == (0, 1)
+        assert exportar(20) == (1, 0)
+        # Decide si se dibuja el switch o el conector a las páginas: la sección cacheada no vale
+        assert exportar(5) == (0, 1)
+    finally:
+        sys.modules.pop('dibujo_prueba', None)
+        sys.modules.pop('estilo_prueba', None)
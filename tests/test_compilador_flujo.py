@@ -0,0 +1,100 @@
+from compilador_flujo import compilar_archivo, compilar_fuentes
+
+LATIN1 = '# -*- coding: latin-1 -*-\ndef saludo():\n    return "año"\n'
+
+
+def test_archivo_latin1_con_cookie_se_compila(tmp_path):
+    ruta = tmp_path / 'latin1.py'
+    ruta.write_bytes(LATIN1.encode('latin-1'))
+    resultado = compilar_archivo(str(ruta))
+    assert resultado['estado'] == 'ok'
+    assert [f['funcion'] for f in resultado['funciones']][-1] == 'saludo'
+
+
+def test_archivos_ilegibles_o_mal_codificados_no_abortan_el_lote(tmp_path):
+    bueno = tmp_path / 'bueno.py'
+    bueno.write_text('def f():\n    return 1\n', encoding='utf-8')
+    # Latin-1 sin cookie: no es UTF-8 válido
+    sin_cookie = tmp_path / 'sin_cookie.py'
+    sin_cookie.write_bytes(LATIN1.split('\n', 1)[1].encode('latin-1'))
+    inexistente = tmp_path / 'no_existe.py'
+    resultados = compilar_fuentes([str(bueno), str(sin_cookie), str(inexistente)], procesos=2)
+    estados = {r['archivo'].rsplit('/', 1)[-1]: r for r in resultados}
+    assert estados['bueno.py']['estado'] == 'ok'
+    assert estados['sin_cookie.py']['estado'] == 'error'
+    assert estados['sin_cookie.py']['error'].startswith('UnicodeDecodeError')
+    assert estados['no_existe.py']['estado'] == 'error'
+    assert 'FileNotFoundError' in estados['no_existe.py']['error']
+
+
+def test_la_cache_se_abre_una_vez_por_lote(tmp_path, monkeypatch):
+    import compilador_flujo
+
+    aperturas = []
+
+    class CacheContada(compilador_flujo.CacheRender):
+        def __init__(self, *args, **kwargs):
+            aperturas.append(args)
+            super().__init__(*args, **kwargs)
+
+    monkeypatch.setattr(compilador_flujo, 'CacheRender', CacheContada)
+    rutas = []
+    for i in range(5):
+        ruta = tmp_path / f'm{i}.py'
+        ruta.write_text(f'def f{i}(x):\n    if x:\n        return {i}\n    return 0\n', encoding='utf-8')
+        rutas.append(str(ruta))
+    cache = str(tmp_path / 'cache')
+    primera = compilar_fuentes(rutas, procesos=1, cache=cache)
+    segunda = compilar_fuentes(rutas, procesos=1, cache=cache)
+    assert len(aperturas) == 2
+    assert sum(r['compiladas'] for r in primera) == 5
+    assert sum(r['cacheadas'] for r in segunda) == 5
+
+
+def _fuentes(directorio, n):
+    rutas = []
+    for i in range(n):
+        ruta = directorio / f'm{i}.py'
+        ruta.write_text(f'def f{i}(x):\n    if x:\n        return {i}\n    return 0\n', encoding='utf-8')
+        rutas.append(str(ruta))
+    return rutas
+
+
+def test_en_paralelo_solo_el_proceso_principal_escribe_y_expulsa(tmp_path):
+    import os
+
+    from cache_render import CacheRender
+
+    def en_disco(cache):
+        return sum(os.path.getsize(os.path.join(cache.directorio, n)) for n in os.listdir(cache.directorio))
+
+    rutas = _fuentes(tmp_path, 6)
+    cache = CacheRender(str(tmp_path / 'cache'))
+    primera = compilar_fuentes(rutas, procesos=3, cache=cache)
+    segunda = compilar_fuentes(rutas, procesos=3, cache=cache)
+    assert sum(r['compiladas'] for r in primera) == 6 and sum(r['cacheadas'] for r in segunda) == 6
+    # Manifiesto y función de cada archivo: fallos en la primera pasada, aciertos en la segunda
+    assert (cache.aciertos, cache.fallos) == (12, 12)
+    assert en_disco(cache) == cache.bytes_totales
+
+    limitada = CacheRender(str(tmp_path / 'limitada'), max_bytes=cache.bytes_totales // 2)
+    compilar_fuentes(rutas, procesos=3, cache=limitada)
+    assert limitada.expulsiones > 0
+    assert en_disco(limitada) == limitada.bytes_totales <= limitada.max_bytes
+
+
+def test_salidas_de_rutas_parecidas_no_se_pisan(tmp_path):
+    import contextlib
+    import io
+
+    from compilador_flujo import main
+
+    for relativa in ('a/b_c.py', 'a_b/c.py'):
+        ruta = tmp_path / 'src' / relativa
+        ruta.parent.mkdir(parents=True, exist_ok=True)
+        ruta.write_text(f'def f():\n    return {relativa!r}\n', encoding='utf-8')
+    salida = tmp_path / 'salida'
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert main([str(tmp_path / 'src'), '-o', str(salida), '-f', 'json', '--cache', '', '-j', '1']) == 0
+    generados = sorted(p.relative_to(salida).as_posix() for p in salida.rglob('*.json'))
+    assert generados == ['a/b_c.py.json', 'a_b/c.py.json']
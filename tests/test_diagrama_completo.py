@@ -0,0 +1,110 @@
+import functools
+
+import pytest
+
+import DiagramaFlujoParking
+from DiagramaFlujoParking import GeneradorDiagramaParqueadero, geometria_opciones, texto_menu
+
+
+def test_huella_cambia_con_las_opciones_del_menu(monkeypatch):
+    generador = GeneradorDiagramaParqueadero()
+    antes = generador.huella_render(generador.crear_diagrama_completo)
+    opciones = list(DiagramaFlujoParking.OPCIONES_MENU)
+    opciones[0] = (opciones[0][0], 'Mostrar ocupación de cada planta')
+    monkeypatch.setattr(DiagramaFlujoParking, 'OPCIONES_MENU', opciones)
+    assert generador.huella_render(generador.crear_diagrama_completo) != antes
+
+
+def test_huella_de_paginas_incluye_opciones_y_geometria():
+    generador = GeneradorDiagramaParqueadero()
+    opciones = [(f"entrada == '{i}'", f'Acción {i}') for i in range(30)]
+    otras = opciones[:-1] + [("entrada == '29'", 'Otra acción')]
+    geometria = geometria_opciones(opciones, 0.0, por_pagina=20)
+    huellas = {generador.huella_render(functools.partial(generador.crear_pagina_opciones, o, 1, geometria))
+               for o in (opciones, otras)}
+    assert None not in huellas and len(huellas) == 2
+    otra_geometria = geometria_opciones(opciones, 0.0, gap=7.0, por_pagina=20)
+    assert (generador.huella_render(functools.partial(generador.crear_pagina_opciones, opciones, 1, otra_geometria))
+            not in huellas)
+
+
+def test_opciones_vacias_se_rechazan():
+    generador = GeneradorDiagramaParqueadero()
+    with pytest.raises(ValueError, match='al menos una opción'):
+        generador.crear_diagrama_completo([])
+    with pytest.raises(ValueError, match='al menos una opción'):
+        generador.agregar_diagrama_completo('Vacío', [])
+
+
+def test_menu_se_construye_con_las_opciones_dibujadas():
+    import matplotlib.pyplot as plt
+    opciones = [("entrada == 'a'", 'Alta de abonado'), ("entrada == 'b'", 'Baja: liberar plaza')]
+    fig = GeneradorDiagramaParqueadero().crear_diagrama_completo(opciones)
+    textos = ' '.join(t.get_text() for t in fig.axes[0].texts)
+    plt.close(fig)
+    assert 'a. Alta de abonado' in textos and 'b. Baja' in textos
+    assert 'Visualización' not in textos
+
+
+def test_menu_resume_las_opciones_que_no_caben():
+    opciones = [(f"entrada == '{i}'", f'Acción {i}') for i in range(30)]
+    texto = texto_menu(opciones)
+    assert '7. Acción 7' in texto and '8. Acción 8' not in texto
+    assert '… y 22 más' in texto and texto.endswith('s. Salir')
+
+
+def test_exportacion_fallida_conserva_el_html_anterior(tmp_path):
+    salida = tmp_path / 'salida.html'
+    salida.write_text('versión buena', encoding='utf-8')
+    generador = GeneradorDiagramaParqueadero('Prueba')
+    generador.agregar_seccion('Texto', '<p>antes de la figura</p>')
+
+    def figura_rota():
+        raise ModuleNotFoundError('dependencia ausente')
+
+    generador.agregar_figura('Rota', figura_rota)
+    with pytest.raises(ModuleNotFoundError):
+        generador.exportar_html(str(salida))
+    assert salida.read_text(encoding='utf-8') == 'versión buena'
+    assert not (tmp_path / 'salida.html.tmp').exists()
+
+
+def test_tabla_de_variantes_traduce_el_menu_dibujado():
+    import json
+    import os
+    ruta = os.path.join(os.path.dirname(DiagramaFlujoParking.__file__), 'variantes', 'variantes_parqueadero.json')
+    with open(ruta, encoding='utf-8') as f:
+        tabla = json.load(f)
+    assert texto_menu(DiagramaFlujoParking.OPCIONES_MENU) in tabla['idiomas']['en']
+
+
+def test_renderizador_js_solo_en_exportaciones_que_lo_usan(tmp_path):
+    import contextlib
+    import io
+
+    from cliente_diagrama import RENDERIZADOR_JS
+    from modelo_diagrama import Diagrama
+
+    diagrama = Diagrama('Cliente')
+    diagrama.agregar_nodo('a', 'A')
+    salida = tmp_path / 'salida.html'
+
+    def exportar(generador, **opciones):
+        with contextlib.redirect_stdout(io.StringIO()):
+            generador.exportar_html(str(salida), **opciones)
+        return RENDERIZADOR_JS in salida.read_text(encoding='utf-8')
+
+    generador = GeneradorDiagramaParqueadero('Prueba')
+    generador.agregar_diagrama_cliente('Cliente', diagrama)
+    assert generador.secciones[0].usa_cliente
+    assert exportar(generador)
+    generador.secciones = []
+    generador.agregar_seccion('Texto', '<p>sin diagramas</p>')
+    assert not exportar(generador)
+
+    generador = GeneradorDiagramaParqueadero('Prueba')
+    generador.agregar_figura('Modelo', diagrama)
+    assert exportar(generador, imagenes='cliente')
+    generador.secciones = []
+    generador.agregar_seccion('Texto', '<p>sin diagramas</p>')
+    assert not exportar(generador, imagenes='cliente')
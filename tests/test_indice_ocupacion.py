@@ -0,0 +1,106 @@
+import random
+
+import pytest
+
+from indice_ocupacion import PLANTAS_NO_RESERVADAS, IndiceOcupacion, ejecutar_opcion
+
+
+class GarajeLista:
+    """Referencia sin índice: la matriz 'b' del programa original recorrida en cada consulta"""
+
+    def __init__(self, plantas, plazas):
+        self.b = [[0] * plazas for _ in range(plantas)]
+
+    def aparcar(self, planta):
+        fila = self.b[planta]
+        if 0 not in fila:
+            return None
+        plaza = fila.index(0)
+        fila[plaza] = 1
+        return plaza
+
+    def sacar(self, planta):
+        fila = self.b[planta]
+        if 1 not in fila:
+            return None
+        plaza = fila.index(1)
+        fila[plaza] = 0
+        return plaza
+
+    def redistribuir(self):
+        total, plantas = sum(map(sum, self.b)), len(self.b)
+        for planta, fila in enumerate(self.b):
+            coches = total // plantas + (planta < total % plantas)
+            fila[:] = [1] * coches + [0] * (len(fila) - coches)
+
+
+def _comparar(indice, referencia):
+    cuentas = [sum(fila) for fila in referencia.b]
+    assert indice.estado() == referencia.b
+    assert indice.ocupadas == cuentas
+    assert indice.total == sum(cuentas)
+    assert indice.total_no_reservadas == sum(cuentas[p] for p in PLANTAS_NO_RESERVADAS if p < len(cuentas))
+    libres = [p for p, fila in enumerate(referencia.b) if 0 in fila]
+    assert indice.plantas_libres() == libres
+    assert indice.plantas_con_espacio == len(libres)
+    # El puntero a la cubeta mínima se mantiene al actualizar: la consulta no recorre cubetas
+    assert indice._minimo == min(cuentas)
+    assert indice.planta_mas_vacia() == cuentas.index(min(cuentas))
+
+
+@pytest.mark.parametrize('plantas, plazas', [(1, 1), (8, 5), (13, 3), (40, 7)])
+def test_operaciones_coinciden_con_la_referencia(plantas, plazas):
+    azar = random.Random(plantas * 100 + plazas)
+    indice, referencia = IndiceOcupacion(plantas, plazas), GarajeLista(plantas, plazas)
+    for _ in range(3000):
+        operacion = azar.random()
+        planta = azar.randrange(plantas)
+        if operacion < 0.55:
+            assert indice.aparcar(planta) == referencia.aparcar(planta)
+        elif operacion < 0.99:
+            assert indice.sacar(planta) == referencia.sacar(planta)
+        else:
+            indice.redistribuir()
+            referencia.redistribuir()
+        _comparar(indice, referencia)
+
+
+def test_sin_plazas_ninguna_planta_tiene_sitio():
+    indice = IndiceOcupacion(2, 0)
+    assert indice.plantas_libres() == []
+    assert indice.plantas_con_espacio == 0
+    assert indice.aparcar(1) is None
+    assert indice.planta_mas_vacia() == 0
+    assert indice.porcentajes() == [0.0, 0.0]
+
+
+def test_garaje_sin_plantas_se_rechaza():
+    with pytest.raises(ValueError, match='al menos una planta'):
+        IndiceOcupacion(0, 5)
+    with pytest.raises(ValueError, match='negativo'):
+        IndiceOcupacion(3, -1)
+
+
+@pytest.mark.parametrize('planta', [1.0, True, '1', None])
+def test_planta_que_no_es_un_entero_se_rechaza(planta):
+    indice = IndiceOcupacion(4, 2)
+    for operacion in (indice.aparcar, indice.sacar, indice.porcentaje):
+        with pytest.raises(TypeError, match='entero'):
+            operacion(planta)
+    assert indice.total == 0 and indice.estado() == [[0, 0]] * 4
+
+
+def test_bitset_con_plantas_que_no_llenan_el_ultimo_byte():
+    indice = IndiceOcupacion(11, 1)
+    assert indice.plantas_libres() == list(range(11))
+    indice.aparcar(10)
+    assert indice.plantas_libres() == list(range(10))
+
+
+def test_opciones_del_menu_despachan_al_indice():
+    indice = IndiceOcupacion(4, 2)
+    assert ejecutar_opcion(indice, '2', 3) == 0
+    assert ejecutar_opcion(indice, '6') == 1
+    assert ejecutar_opcion(indice, '5') == 0
+    with pytest.raises(ValueError, match='Opción desconocida'):
+        ejecutar_opcion(indice, 'x')
@@ -0,0 +1,32 @@
+import pytest
+
+from DiagramaFlujoParking import GeneradorDiagramaParqueadero
+from instrumentacion import Instrumentacion
+
+
+def test_pico_de_memoria_descuenta_lo_asignado_antes_de_la_etapa():
+    instr = Instrumentacion(memoria=True)
+    with instr.etapa('externa'):
+        retenido = bytearray(8_000_000)
+        with instr.etapa('interna'):
+            temporal = bytearray(1_000_000)
+            del temporal
+    del retenido
+    picos = {m.etapa: m.pico_memoria for m in instr.etapas}
+    assert 900_000 <= picos['interna'] < 2_000_000
+    assert picos['externa'] >= 8_900_000
+
+
+def test_savefig_fallido_no_deja_etapas_abiertas(tmp_path):
+    import matplotlib.pyplot as plt
+    generador = GeneradorDiagramaParqueadero('Prueba')
+    instr = generador.instrumentar()
+    fig, ax = plt.subplots(figsize=(1, 1))
+    ax.text(0.5, 0.5, r'$\frac{$')  # mathtext inválido: falla al dibujar dentro de savefig
+    generador.agregar_figura('Rota', fig)
+    with pytest.raises(ValueError):
+        generador.exportar_html(str(tmp_path / 'salida.html'))
+    assert instr._pila == []
+    with instr.etapa('siguiente'):
+        pass
+    assert instr.etapas[-1].etapa == 'siguiente' and instr._pila == []
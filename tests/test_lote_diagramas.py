@@ -0,0 +1,54 @@
+import contextlib
+import io
+import json
+
+import DiagramaFlujoParking
+from lote_diagramas import generar_diagrama
+
+ESPEC = {'titulo': 'Lote', 'nodos': [{'id': 'a', 'texto': 'Inicio'}, {'id': 'b', 'texto': 'Fin'}],
+         'aristas': [{'desde': 'a', 'hasta': 'b'}]}
+
+
+def _contar_figuras(monkeypatch):
+    construidas = []
+    original = DiagramaFlujoParking.GeneradorDiagramaParqueadero.crear_diagrama_desde_modelo
+
+    def contada(self, diagrama):
+        construidas.append(diagrama)
+        return original(self, diagrama)
+
+    monkeypatch.setattr(DiagramaFlujoParking.GeneradorDiagramaParqueadero, 'crear_diagrama_desde_modelo', contada)
+    return construidas
+
+
+def _generar(tmp_path, formatos, cache=None):
+    ruta = tmp_path / 'espec.json'
+    ruta.write_text(json.dumps(ESPEC), encoding='utf-8')
+    with contextlib.redirect_stdout(io.StringIO()):
+        resultado = generar_diagrama(str(ruta), str(tmp_path / 'salida'), formatos, dpi=40, cache=cache)
+    assert resultado['estado'] == 'ok', resultado.get('traza')
+    return resultado
+
+
+def test_html_y_png_construyen_la_figura_una_vez(tmp_path, monkeypatch):
+    construidas = _contar_figuras(monkeypatch)
+    resultado = _generar(tmp_path, ('html', 'png'))
+    assert len(construidas) == 1
+    html, png = resultado['salidas']
+    with open(html, encoding='utf-8') as f:
+        incrustado = DiagramaFlujoParking.png_de_html(f.read())
+    with open(png, 'rb') as f:
+        assert f.read() == incrustado
+    assert incrustado.startswith(b'\x89PNG')
+
+
+def test_png_solo_usa_la_cache_de_render(tmp_path, monkeypatch):
+    construidas = _contar_figuras(monkeypatch)
+    cache = str(tmp_path / 'cache')
+    primero = _generar(tmp_path, ('png',), cache)
+    with open(primero['salidas'][0], 'rb') as f:
+        png = f.read()
+    _generar(tmp_path, ('png',), cache)
+    assert len(construidas) == 1
+    with open(primero['salidas'][0], 'rb') as f:
+        assert f.read() == png
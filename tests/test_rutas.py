@@ -0,0 +1,80 @@
+import random
+
+import pytest
+
+from modelo_diagrama import Diagrama, MotorLayout, calcular_rutas
+
+EPS = 1e-6
+
+
+def _diagrama_aleatorio(rng):
+    diagrama = Diagrama('Aleatorio')
+    n = rng.randint(3, 30)
+    for i in range(n):
+        diagrama.agregar_nodo(f'n{i}', f'Nodo {i}', forma=rng.choice(['rectangulo', 'rombo']),
+                              ancho=rng.choice([None, 4, 6, 8, 10]), alto=rng.choice([None, 2, 3, 4]))
+    # Un árbol que conecta todo más aristas arbitrarias (retornos, laterales y bucles)
+    for i in range(1, n):
+        diagrama.agregar_arista(f'n{rng.randrange(i)}', f'n{i}', lateral=rng.random() < 0.15)
+    for _ in range(rng.randint(0, n)):
+        diagrama.agregar_arista(f'n{rng.randrange(n)}', f'n{rng.randrange(n)}', lateral=rng.random() < 0.1)
+    return diagrama
+
+
+def _cruza(p1, p2, nodo):
+    (xa, ya), (xb, yb) = p1, p2
+    return (min(xa, xb) < nodo.x + nodo.ancho - EPS and max(xa, xb) > nodo.x + EPS and
+            min(ya, yb) < nodo.y + nodo.alto - EPS and max(ya, yb) > nodo.y + EPS)
+
+
+def _en_borde(punto, nodo):
+    x, y = punto
+    dentro = nodo.x - EPS <= x <= nodo.x + nodo.ancho + EPS and nodo.y - EPS <= y <= nodo.y + nodo.alto + EPS
+    return dentro and not _cruza(punto, punto, nodo)
+
+
+@pytest.mark.parametrize('semilla', range(4))
+def test_las_rutas_no_atraviesan_nodos(semilla):
+    rng = random.Random(semilla)
+    for _ in range(40):
+        diagrama = _diagrama_aleatorio(rng)
+        motor = MotorLayout()
+        motor.calcular(diagrama)
+        for ruta in calcular_rutas(diagrama, motor.margen / 2):
+            arista = ruta.arista
+            origen, destino = diagrama.nodos[arista.origen], diagrama.nodos[arista.destino]
+            assert _en_borde(ruta.puntos[0], origen), (arista.origen, arista.destino, ruta.puntos)
+            assert _en_borde(ruta.puntos[-1], destino), (arista.origen, arista.destino, ruta.puntos)
+            for p1, p2 in ruta.segmentos():
+                assert abs(p1[0] - p2[0]) < EPS or abs(p1[1] - p2[1]) < EPS  # ortogonal
+                for id, nodo in diagrama.nodos.items():
+                    if id not in (arista.origen, arista.destino):
+                        assert not _cruza(p1, p2, nodo), (arista.origen, arista.destino, id, ruta.puntos)
+            assert ruta.puntas and max(ruta.puntas) == len(ruta.puntos) - 2
+
+
+def test_retorno_sale_del_puerto_izquierdo_del_origen():
+    diagrama = Diagrama()
+    diagrama.agregar_nodo('bucle', 'bucle', forma='rombo')
+    diagrama.agregar_nodo('opcion', 'opción', forma='rombo')
+    diagrama.agregar_nodo('accion', 'acción')
+    diagrama.agregar_arista('bucle', 'opcion')
+    diagrama.agregar_arista('opcion', 'accion', lateral=True)
+    diagrama.agregar_arista('accion', 'bucle')
+    motor = MotorLayout()
+    motor.calcular(diagrama)
+    retorno = calcular_rutas(diagrama, motor.margen / 2)[-1]
+    assert retorno.puntos[0] == diagrama.nodos['accion'].puntos()['left']
+    assert retorno.puntos[-1] == diagrama.nodos['bucle'].puntos()['left']
+
+
+@pytest.mark.parametrize('espec', [{}, {'idiomas': {'es': {}}}, {'nodos': {'a': 'A'}}, [],
+                                   {'nodos': [{'id': 'a'}], 'aristas': 'a->a'}])
+def test_especificacion_sin_lista_de_nodos_se_rechaza(espec):
+    with pytest.raises(ValueError):
+        Diagrama.desde_dict(espec)
+
+
+def test_especificacion_con_nodos_vacios_es_un_diagrama_vacio():
+    diagrama = Diagrama.desde_dict({'titulo': 'Vacío', 'nodos': []})
+    assert not diagrama.nodos and not diagrama.aristas
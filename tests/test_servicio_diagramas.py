@@ -0,0 +1,84 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from modelo_diagrama import Diagrama
+from servicio_diagramas import ErrorHTTP, ServicioDiagramas
+
+
+def _peticion(servicio, cabeceras, cuerpo=b''):
+    """Envía una petición POST /render al servicio y devuelve la línea de estado y la respuesta"""
+    async def enviar():
+        servidor = await asyncio.start_server(servicio.atender, '127.0.0.1', 0)
+        puerto = servidor.sockets[0].getsockname()[1]
+        async with servidor:
+            lector, escritor = await asyncio.open_connection('127.0.0.1', puerto)
+            escritor.write(('POST /render HTTP/1.1\r\n' + ''.join(f'{k}: {v}\r\n' for k, v in cabeceras.items())
+                            + '\r\n').encode('latin-1') + cuerpo)
+            await escritor.drain()
+            respuesta = await asyncio.wait_for(lector.read(), 5)
+            escritor.close()
+        return respuesta.split(b'\r\n', 1)[0].decode(), respuesta
+
+    return asyncio.run(enviar())
+
+
+@pytest.mark.parametrize('largo', ['abc', '-5', '1e3', '²'])
+def test_content_length_invalido_responde_400_y_cierra(largo):
+    estado, respuesta = _peticion(ServicioDiagramas(procesos=1), {'Content-Length': largo})
+    assert estado == 'HTTP/1.1 400 Bad Request'
+    assert b'Connection: close' in respuesta and b'Content-Length' in respuesta
+
+
+def test_content_length_sobre_el_maximo_responde_413():
+    servicio = ServicioDiagramas(procesos=1, max_cuerpo=100)
+    estado, respuesta = _peticion(servicio, {'Content-Length': '101'}, b'{' * 101)
+    assert estado == 'HTTP/1.1 413 Payload Too Large'
+    assert b'Connection: close' in respuesta
+
+
+def test_cuerpo_por_bloques_responde_411():
+    estado, respuesta = _peticion(ServicioDiagramas(procesos=1), {'Transfer-Encoding': 'chunked'},
+                                  b'2\r\n{}\r\n0\r\n\r\n')
+    assert estado == 'HTTP/1.1 411 Length Required'
+    assert b'Connection: close' in respuesta
+
+
+def test_etag_depende_del_codigo_del_render(monkeypatch):
+    import servicio_diagramas
+
+    diagrama = Diagrama('ETag')
+    diagrama.agregar_nodo('a', 'A')
+    antes = ServicioDiagramas(procesos=1).etag(diagrama, 'svg')
+    monkeypatch.setattr(servicio_diagramas, 'huella_fuentes', lambda *rutas: 'otro despliegue')
+    assert ServicioDiagramas(procesos=1).etag(diagrama, 'svg') != antes
+
+
+def test_la_cola_no_cuenta_los_renders_en_curso(monkeypatch):
+    import servicio_diagramas
+
+    liberar = threading.Event()
+    monkeypatch.setattr(servicio_diagramas, 'renderizar', lambda *args: liberar.wait(5) and b'ok')
+
+    async def probar():
+        servicio = ServicioDiagramas(procesos=2, max_cola=1)
+        servicio._pool = ThreadPoolExecutor(2)
+        espec = [{'nodos': [{'id': f'n{i}'}]} for i in range(4)]
+        tareas = [asyncio.ensure_future(servicio.obtener(e, 'svg')) for e in espec[:3]]
+        await asyncio.sleep(0.05)
+        metricas = (servicio.metricas.en_curso, servicio.metricas.en_cola)
+        # Dos trabajadores ocupados y un render esperando: la cola (max_cola=1) está llena
+        with pytest.raises(ErrorHTTP) as error:
+            await servicio.obtener(espec[3], 'svg')
+        liberar.set()
+        resultados = await asyncio.gather(*tareas)
+        servicio._pool.shutdown()
+        return metricas, error.value.estado, resultados, servicio.metricas
+
+    metricas, estado, resultados, final = asyncio.run(probar())
+    assert metricas == (2, 1)
+    assert estado == 503
+    assert [r[2] for r in resultados] == [b'ok'] * 3
+    assert (final.en_curso, final.en_cola, final.max_en_cola, final.renders) == (0, 0, 1, 3)
@@ -0,0 +1,26 @@
+from modelo_diagrama import Diagrama
+from svg_diagrama import diagrama_a_svg
+
+
+def test_capas_en_el_orden_de_los_zorder():
+    diagrama = Diagrama(None)
+    diagrama.agregar_nodo('a', 'Inicio')
+    diagrama.agregar_nodo('b', '¿Seguir?', forma='rombo')
+    diagrama.agregar_nodo('c', 'Fin')
+    diagrama.agregar_arista('a', 'b')
+    diagrama.agregar_arista('b', 'c', 'SÍ')
+    diagrama.agregar_arista('b', 'a', 'NO', color='purple', lateral=True)
+    svg = diagrama_a_svg(diagrama)
+    sombras, formas = svg.index('<g class="sombra">'), svg.index('<g class="forma">')
+    ultimo_texto = svg.rindex('>Fin</tspan>')
+    rutas, etiquetas = svg.index('<g class="ruta">'), svg.index('<g class="etiqueta">')
+    # Como en matplotlib, las flechas (zorder 4) pasan por encima del texto de los nodos (3)
+    assert sombras < formas < ultimo_texto < rutas < etiquetas
+
+
+def test_renderizador_js_dibuja_las_capas_en_el_mismo_orden():
+    from cliente_diagrama import RENDERIZADOR_JS
+    textos = RENDERIZADOR_JS.index('for (const n of d.nodos) texto(')
+    rutas = RENDERIZADOR_JS.index('of d.rutas)')
+    etiquetas = RENDERIZADOR_JS.index('of d.etiquetas)')
+    assert textos < rutas < etiquetas
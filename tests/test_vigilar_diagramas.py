@@ -0,0 +1,33 @@
+import contextlib
+import io
+import json
+import os
+
+from vigilar_diagramas import VigilanteDiagramas
+
+ESPEC = {'titulo': 'Vigilado', 'nodos': [{'id': 'a', 'texto': 'Inicio'}, {'id': 'b', 'texto': 'Fin'}],
+         'aristas': [{'desde': 'a', 'hasta': 'b'}]}
+
+
+def test_la_salida_dentro_del_directorio_vigilado_no_es_una_entrada(tmp_path, monkeypatch):
+    (tmp_path / 'diagrama.json').write_text(json.dumps(ESPEC), encoding='utf-8')
+    (tmp_path / 'notas.html').write_text('<p>Notas</p>', encoding='utf-8')
+    monkeypatch.chdir(tmp_path)
+    vigilante = VigilanteDiagramas(['.'], 'vista.html', dpi=30, intervalo=0.02, espera=0.05)
+    assert sorted(os.path.basename(r) for r in vigilante.archivos()) == ['diagrama.json', 'notas.html']
+
+    llamadas = []
+    procesar = vigilante.procesar
+
+    def contado(rutas):
+        llamadas.append(rutas)
+        return procesar(rutas)
+
+    monkeypatch.setattr(vigilante, 'procesar', contado)
+    with contextlib.redirect_stdout(io.StringIO()):
+        vigilante.vigilar(max_segundos=0.5)
+    # Solo la generación inicial: escribir vista.html no cuenta como cambio de una entrada
+    assert len(llamadas) == 1
+    html = (tmp_path / 'vista.html').read_text(encoding='utf-8')
+    assert html.count('<html') == 1 and 'Notas' in html
+    assert not (tmp_path / 'vista.html.tmp').exists()
@@ -0,0 +1,292 @@
+import argparse
+import base64
+import itertools
+import json
+import os
+import sys
+import time
+from io import BytesIO
+
+import numpy as np
+
+from ajuste_texto import ajustar_texto
+from DiagramaFlujoParking import GeneradorDiagramaParqueadero
+from modelo_diagrama import Diagrama
+from png_bandas import codificar_png
+
+
+def cargar_variantes(ruta):
+    """Lee la tabla de variantes: una lista 'variantes' o el producto de 'idiomas' × 'temas'.
+
+    Cada variante es {'nombre', 'textos': {original: sustituto}, 'colores': {color: sustituto}}.
+    """
+    with open(ruta, encoding='utf-8') as f:
+        tabla = json.load(f)
+    if 'variantes' in tabla:
+        return [{'nombre': v['nombre'], 'textos': v.get('textos', {}), 'colores': v.get('colores', {})}
+                for v in tabla['variantes']]
+    idiomas = tabla.get('idiomas', {'base': {}})
+    temas = tabla.get('temas', {'base': {}})
+    return [{'nombre': f'{idioma}-{tema}', 'textos': textos, 'colores': colores}
+            for (idioma, textos), (tema, colores) in itertools.product(idiomas.items(), temas.items())]
+
+
+def _sustituir_colores(rgba, tabla):
+    """Aplica la tabla [(rgba origen, rgba destino)] a un array (N, 4) comparando RGB y conservando el alpha"""
+    rgba = np.array(rgba, dtype=float).reshape(-1, 4)
+    # Se calculan todas las coincidencias antes de sustituir: a→b y b→c no se encadenan
+    coincidencias = [(np.all(np.abs(rgba[:, :3] - np.asarray(origen[:3])) < 1e-6, axis=1), destino)
+                     for origen, destino in tabla]
+    for coincide, destino in coincidencias:
+        rgba[coincide, :3] = destino[:3]
+    return rgba
+
+
+def orden_dibujo(fig):
+    """Artistas de una figura de un solo eje en el orden en que los dibuja Agg.
+
+    Igual que Axes.draw con el eje apagado: el fondo de la figura y después los hijos
+    visibles del eje ordenados (de forma estable) por zorder.
+    """
+    if len(fig.axes) != 1:
+        raise ValueError(f"Se esperaba una figura con un solo eje, tiene {len(fig.axes)}")
+    ax = fig.axes[0]
+    excluidos = {ax.patch, ax.xaxis, ax.yaxis, *ax.spines.values()}
+    hijos = [a for a in ax.get_children() if a not in excluidos and a.get_visible()]
+    return [fig.patch] + sorted(hijos, key=lambda a: a.get_zorder())
+
+
+def recorte_ajustado(fig, renderer, dpi):
+    """(x0, x1, y0, y1) en píxeles del buffer: el recorte de bbox_inches='tight' de savefig"""
+    import matplotlib
+    caja = fig.get_tightbbox(renderer).padded(matplotlib.rcParams['savefig.pad_inches'])
+    alto = renderer.height
+    return (max(0, int(round(caja.x0 * dpi))), min(renderer.width, int(round(caja.x1 * dpi))),
+            max(0, int(round(alto - caja.y1 * dpi))), min(alto, int(round(alto - caja.y0 * dpi))))
+
+
+class RenderVariantes:
+    """Renderiza variantes de idioma y tema de una figura construida una sola vez.
+
+    La figura (layout, formas y flechas) se construye al crear el objeto. Cada variante
+    solo sustituye textos y colores de los artistas existentes. Los artistas que no
+    cambian entre variantes y se dibujan antes del primer artista variable forman un
+    fondo que se rasteriza una vez y se restaura con copy_from_bbox; por variante solo
+    se dibuja el resto en el orden de zorder de matplotlib, así que el resultado es el
+    mismo que el de un render completo.
+    """
+
+    def __init__(self, origen=None, generador=None, dpi=None, nivel_png=6):
+        self.nivel_png = nivel_png
+        self.generador = generador or GeneradorDiagramaParqueadero()
+        if origen is None:
+            origen = self.generador.crear_diagrama_completo
+        if isinstance(origen, dict):
+            origen = Diagrama.desde_dict(origen)
+        # Los textos de los nodos se registran sin ajustar para volver a ajustarlos traducidos
+        self.generador._registro_textos = {}
+        try:
+            self.fig = self.generador._resolver_figura(origen)
+        finally:
+            self._ajustes = self.generador._registro_textos
+            self.generador._registro_textos = None
+        self._orden = orden_dibujo(self.fig)
+        self.dpi = dpi or self.generador.calcular_dpi(self.fig)
+        self._base = {a: self._estado(a) for a in self._orden}
+        self._variantes = []
+        self._fijas = None     # artista -> firma común a todas las variantes preparadas
+        self._fondo = None
+        self._resto = []
+        self._canvas = None
+        self.estadisticas = {'fondos': 0, 'variantes': 0, 'artistas_fondo': 0, 'artistas_por_variante': 0}
+
+    @staticmethod
+    def _estado(artista):
+        """(texto, colores RGBA) de un artista: lo único que una variante puede cambiar"""
+        from matplotlib.collections import Collection
+        from matplotlib.colors import to_rgba
+        from matplotlib.patches import Patch
+        from matplotlib.text import Text
+        if isinstance(artista, Text):
+            caja = artista.get_bbox_patch()
+            colores = (to_rgba(artista.get_color()),)
+            if caja is not None:
+                colores += (caja.get_facecolor(), caja.get_edgecolor())
+            return artista.get_text(), colores
+        if isinstance(artista, Collection):
+            return None, (artista.get_facecolor().copy(), artista.get_edgecolor().copy())
+        if isinstance(artista, Patch):
+            return None, (artista.get_facecolor(), artista.get_edgecolor())
+        return None
+
+    def _firma(self, artista):
+        estado = self._estado(artista)
+        if estado is None:
+            return None
+        texto, colores = estado
+        return texto, tuple(np.asarray(c, dtype=float).round(6).tobytes() for c in colores)
+
+    def _aplicar(self, variante):
+        """Restaura el estado base y aplica las tablas de textos y colores de la variante"""
+        from matplotlib.collections import Collection
+        from matplotlib.colors import to_rgba
+        from matplotlib.text import Text
+        textos = variante.get('textos', {})
+        tabla = [(to_rgba(a), to_rgba(b)) for a, b in variante.get('colores', {}).items()]
+        for artista, estado in self._base.items():
+            if estado is None:
+                continue
+            texto, colores = estado
+            if isinstance(artista, Text):
+                ajuste = self._ajustes.get(artista)
+                if ajuste is not None:
+                    original, ancho, fontsize, fontweight = ajuste
+                    nuevo = textos.get(original)
+                    artista.set_text(texto if nuevo is None else ajustar_texto(nuevo, ancho, fontsize, fontweight))
+                else:
+                    artista.set_text(textos.get(texto, texto))
+                artista.set_color(_sustituir_colores(colores[0], tabla)[0])
+                if len(colores) == 3:
+                    caja = artista.get_bbox_patch()
+                    caja.set_facecolor(_sustituir_colores(colores[1], tabla)[0])
+                    caja.set_edgecolor(_sustituir_colores(colores[2], tabla)[0])
+                continue
+            cara, borde = colores
+            if isinstance(artista, Collection):
+                # Las colecciones sin relleno (LineCollection) conservan 'none'
+                if len(cara):
+                    artista.set_facecolor(_sustituir_colores(cara, tabla))
+                if len(borde):
+                    artista.set_edgecolor(_sustituir_colores(borde, tabla))
+            else:
+                artista.set_facecolor(_sustituir_colores(cara, tabla)[0])
+                artista.set_edgecolor(_sustituir_colores(borde, tabla)[0])
+
+    def claves_sin_uso(self, variante):
+        """Textos de la tabla de la variante que no aparecen en la figura (erratas en la tabla)"""
+        presentes = {ajuste[0] for ajuste in self._ajustes.values()}
+        presentes |= {estado[0] for estado in self._base.values() if estado is not None}
+        return sorted(set(variante.get('textos', {})) - presentes)
+
+    def preparar(self, variantes):
+        """Clasifica los artistas en fijos y variables y rasteriza el fondo fijo"""
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        self._variantes = list(variantes)
+        firmas = {a: set() for a in self._orden}
+        for variante in self._variantes or [{}]:
+            self._aplicar(variante)
+            for a in self._orden:
+                firmas[a].add(self._firma(a))
+        variables = [i for i, a in enumerate(self._orden) if len(firmas[a]) > 1]
+        corte = variables[0] if variables else len(self._orden)
+        # El fondo se dibuja con la primera variante: sus artistas son iguales en todas
+        self._aplicar(self._variantes[0] if self._variantes else {})
+        self._fijas = {a: next(iter(firmas[a])) for a in self._orden if len(firmas[a]) == 1}
+        self._resto = self._orden[corte:]
+
+        self.fig.set_dpi(self.dpi)
+        self._canvas = FigureCanvasAgg(self.fig)
+        # Dibujo sin raster: fija posiciones y transformaciones al dpi de exportación
+        self.fig.draw_without_rendering()
+        renderer = self._canvas.get_renderer()
+        renderer.clear()
+        for artista in self._orden[:corte]:
+            artista.draw(renderer)
+        self._fondo = self._canvas.copy_from_bbox(self.fig.bbox)
+        self.estadisticas['fondos'] += 1
+        self.estadisticas['artistas_fondo'] = corte
+        self.estadisticas['artistas_por_variante'] = len(self._resto)
+
+    def _cubre(self, variante):
+        """True si la variante no cambia ningún artista que el fondo preparado da por fijo"""
+        self._aplicar(variante)
+        return all(self._firma(a) == firma for a, firma in self._fijas.items())
+
+    def renderizar(self, variante):
+        """PNG de la variante: fondo restaurado más los artistas a partir del primero variable.
+
+        No hay segundo dibujo para bbox_inches='tight' (la caja sale de la figura ya
+        dibujada) y el PNG se codifica con codificar_png.
+        """
+        if self._fondo is None or not self._cubre(variante):
+            self.preparar(self._variantes + [variante])
+            self._aplicar(variante)
+        renderer = self._canvas.get_renderer()
+        self._canvas.restore_region(self._fondo)
+        for artista in self._resto:
+            artista.draw(renderer)
+
+        x0, x1, y0, y1 = recorte_ajustado(self.fig, renderer, self.dpi)
+        rgba = np.asarray(renderer.buffer_rgba())[y0:y1, x0:x1]
+        self.estadisticas['variantes'] += 1
+        return codificar_png(rgba, self.dpi, self.nivel_png)
+
+    def renderizar_todas(self, variantes):
+        """{nombre: PNG} de todas las variantes con un único fondo compartido"""
+        self.preparar(variantes)
+        return {variante['nombre']: self.renderizar(variante) for variante in variantes}
+
+    def cerrar(self):
+        import matplotlib.pyplot as plt
+        plt.close(self.fig)
+        self._fondo = None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Render de variantes (idiomas y temas) de un diagrama de flujo')
+    parser.add_argument('--variantes', default='variantes/variantes_parqueadero.json')
+    parser.add_argument('--especificacion', default=None,
+                        help='Diagrama declarativo (JSON/YAML); por defecto el diagrama del parqueadero')
+    parser.add_argument('-o', '--salida', default='salida_variantes', help='directorio de los PNG')
+    parser.add_argument('--dpi', type=int, default=150)
+    parser.add_argument('--nivel-png', type=int, default=6, help='nivel de compresión zlib (1 = más rápido)')
+    parser.add_argument('--html', default=None, help='HTML con una sección por variante')
+    parser.add_argument('--comparar', action='store_true',
+                        help='mide también un render completo (construcción + savefig) como referencia')
+    args = parser.parse_args(argv)
+
+    variantes = cargar_variantes(args.variantes)
+    origen = Diagrama.desde_archivo(args.especificacion) if args.especificacion else None
+    inicio = time.perf_counter()
+    render = RenderVariantes(origen, dpi=args.dpi, nivel_png=args.nivel_png)
+    construccion = time.perf_counter() - inicio
+    for variante in variantes:
+        for clave in render.claves_sin_uso(variante):
+            print(f"⚠️ {variante['nombre']}: texto sin uso en la figura: {clave!r}")
+
+    os.makedirs(args.salida, exist_ok=True)
+    inicio = time.perf_counter()
+    imagenes = render.renderizar_todas(variantes)
+    segundos = time.perf_counter() - inicio
+    for nombre, png in imagenes.items():
+        with open(os.path.join(args.salida, f'{nombre}.png'), 'wb') as f:
+            f.write(png)
+    e = render.estadisticas
+    print(f"🎨 {len(imagenes)} variantes en {construccion + segundos:.2f} s (construcción {construccion:.2f} s, "
+          f"{segundos / max(1, len(imagenes)):.2f} s por variante; {e['artistas_fondo']} artistas en el fondo, "
+          f"{e['artistas_por_variante']} por variante)")
+
+    if args.comparar:
+        import matplotlib.pyplot as plt
+        inicio = time.perf_counter()
+        generador = GeneradorDiagramaParqueadero()
+        fig = generador._resolver_figura(origen or generador.crear_diagrama_completo)
+        fig.savefig(BytesIO(), format='png', bbox_inches='tight', dpi=args.dpi)
+        plt.close(fig)
+        completo = time.perf_counter() - inicio
+        print(f"⏱️ Render completo de referencia: {completo:.2f} s por variante "
+              f"({len(imagenes) * completo:.2f} s para {len(imagenes)})")
+
+    if args.html:
+        generador = GeneradorDiagramaParqueadero('Variantes del diagrama')
+        for nombre, png in imagenes.items():
+            generador.agregar_seccion(f'🎨 {nombre}', f'<img src="data:image/png;base64,'
+                                      f'{base64.b64encode(png).decode("ascii")}" class="grafico" '
+                                      f'style="border-radius: 12px;">')
+        generador.exportar_html(args.html)
+    render.cerrar()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,382 @@
+import argparse
+import base64
+import glob
+import os
+import sys
+import time
+from collections import Counter
+from html import escape
+
+import numpy as np
+
+from DiagramaFlujoParking import GeneradorDiagramaParqueadero
+from lote_diagramas import EXTENSIONES_ESPEC
+from modelo_diagrama import Diagrama, calcular_rutas
+from png_bandas import PNGIncremental
+from variantes_diagrama import orden_dibujo, recorte_ajustado
+
+EXTENSIONES_CONTENIDO = ('.html', '.htm')
+MARGEN_REGION = 3  # píxeles alrededor de cada región redibujada (antialiasing y grosor de borde)
+
+
+def _titulo_de_ruta(ruta):
+    return os.path.splitext(os.path.basename(ruta))[0].replace('_', ' ')
+
+
+def firma_estructura(diagrama):
+    """Lo que determina la geometría: nodos (id, forma y tamaño), aristas y si hay título"""
+    return (bool(diagrama.titulo),
+            tuple((n.id, n.forma, n.ancho, n.alto) for n in diagrama.nodos.values()),
+            tuple((a.origen, a.destino, a.lateral) for a in diagrama.aristas))
+
+
+def diferencias(anterior, nuevo):
+    """Nodos y aristas (índices) que cambian entre dos diagramas con la misma estructura"""
+    nodos = [id for id, nodo in nuevo.nodos.items() if nodo.a_dict() != anterior.nodos[id].a_dict()]
+    aristas = [i for i, (a, b) in enumerate(zip(anterior.aristas, nuevo.aristas)) if a.a_dict() != b.a_dict()]
+    return nodos, aristas
+
+
+def _clave_texto(texto):
+    from matplotlib.colors import to_rgba
+    return texto.get_text(), tuple(texto.get_position()), texto.get_fontsize(), to_rgba(texto.get_color())
+
+
+def _textos_sin_pareja(fig, otra):
+    """Textos de fig sin un texto idéntico (contenido, posición, tamaño y color) en otra"""
+    restantes = Counter(_clave_texto(t) for t in otra.axes[0].texts)
+    sin_pareja = []
+    for texto in fig.axes[0].texts:
+        clave = _clave_texto(texto)
+        if restantes[clave]:
+            restantes[clave] -= 1
+        else:
+            sin_pareja.append(texto)
+    return sin_pareja
+
+
+class SeccionContenido:
+    """Sección HTML leída de un archivo"""
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self.titulo = _titulo_de_ruta(ruta)
+        self.html = None
+        self._contenido = None
+
+    def actualizar(self):
+        with open(self.ruta, encoding='utf-8') as f:
+            contenido = f.read()
+        if contenido == self._contenido:
+            return None
+        self._contenido = contenido
+        self.html = f'<div class="seccion"><h2>{escape(self.titulo)}</h2>\n{contenido}</div>'
+        return 'contenido'
+
+
+class SeccionDiagrama:
+    """Sección con el diagrama de una especificación, su raster y su PNG por bandas en memoria.
+
+    Si entre dos versiones la estructura no cambia (solo textos, colores, tamaños de
+    letra o etiquetas), el layout anterior se reutiliza con MotorLayout.precargar, la
+    figura se reconstruye sin rasterizarla y solo se redibujan, recortadas sobre el
+    raster anterior, las regiones de los nodos, aristas y textos afectados. Después
+    solo se recomprimen las bandas PNG que contienen esas filas.
+    """
+
+    def __init__(self, ruta, generador, dpi=150, nivel_png=6):
+        self.ruta = ruta
+        self.generador = generador
+        self.dpi = dpi
+        self.titulo = _titulo_de_ruta(ruta)
+        self.html = None
+        self.diagrama = None
+        self.fig = None
+        self._renderer = None
+        self._recorte = None
+        self._png = PNGIncremental(nivel_png)
+
+    def _construir(self, diagrama):
+        fig = self.generador.crear_diagrama_desde_modelo(diagrama)
+        fig.set_dpi(self.dpi)
+        return fig
+
+    def actualizar(self):
+        """Vuelve a leer la especificación; devuelve un resumen de lo redibujado o None si no cambió"""
+        import matplotlib.pyplot as plt
+        diagrama = Diagrama.desde_archivo(self.ruta)
+        if self.diagrama is not None and diagrama.huella() == self.diagrama.huella():
+            return None
+        anterior = self.fig
+        if self.diagrama is not None and firma_estructura(diagrama) == firma_estructura(self.diagrama):
+            # Misma geometría: el layout anterior vale tal cual y no se recalcula
+            self.generador.motor_layout.precargar(diagrama, self.diagrama.layout)
+            self.fig = self._construir(diagrama)
+            if (int(self.fig.bbox.width), int(self.fig.bbox.height)) == (self._renderer.width,
+                                                                        self._renderer.height):
+                resumen = self._render_regiones(anterior, diagrama)
+            else:
+                resumen = self._render_completo()
+        else:
+            self.fig = self._construir(diagrama)
+            resumen = self._render_completo()
+        if anterior is not None:
+            plt.close(anterior)
+        self.diagrama = diagrama
+        self.titulo = (diagrama.titulo or _titulo_de_ruta(self.ruta)).replace('\n', ' ')
+        return resumen
+
+    def _render_completo(self):
+        from matplotlib.backends.backend_agg import RendererAgg
+        self._renderer = RendererAgg(int(self.fig.bbox.width), int(self.fig.bbox.height), self.dpi)
+        self.fig.draw(self._renderer)
+        bandas = self._codificar(None)
+        return f'render completo, {bandas} bandas PNG'
+
+    def _regiones(self, fig_anterior, anterior, nuevo):
+        """Cajas en píxeles (coordenadas de pantalla) afectadas por el cambio"""
+        from matplotlib.transforms import Bbox
+        ax = self.fig.axes[0]
+        cajas = []
+        nodos, aristas = diferencias(anterior, nuevo)
+        # Las formas y los trazados solo se repintan si cambia su color; los textos van aparte
+        for id in nodos:
+            n = nuevo.nodos[id]
+            if n.color != anterior.nodos[id].color:
+                # La sombra se desplaza 0.15 a la derecha y hacia abajo
+                cajas.append(Bbox([[n.x - 0.1, n.y - 0.3], [n.x + n.ancho + 0.3, n.y + n.alto + 0.1]]))
+        aristas = [i for i in aristas if nuevo.aristas[i].color != anterior.aristas[i].color]
+        if aristas:
+            rutas = calcular_rutas(nuevo, self.generador.motor_layout.margen / 2)
+            for i in aristas:
+                xs, ys = zip(*rutas[i].puntos)
+                cajas.append(Bbox([[min(xs) - 0.4, min(ys) - 0.4], [max(xs) + 0.4, max(ys) + 0.4]]))
+        cajas = [ax.transData.transform_bbox(c) for c in cajas]
+        # Textos que aparecen, desaparecen o cambian (nodos, etiquetas y título), con su caja de fondo
+        for fig, otra in ((fig_anterior, self.fig), (self.fig, fig_anterior)):
+            for texto in _textos_sin_pareja(fig, otra):
+                extension = texto.get_window_extent(self._renderer)
+                if texto.get_bbox_patch() is not None:
+                    texto.update_bbox_position_size(self._renderer)
+                    extension = Bbox.union([extension, texto.get_bbox_patch().get_window_extent(self._renderer)])
+                cajas.append(extension)
+        ancho, alto = self._renderer.width, self._renderer.height
+        regiones = []
+        for c in cajas:
+            x0, y0 = max(0, int(np.floor(c.x0)) - MARGEN_REGION), max(0, int(np.floor(c.y0)) - MARGEN_REGION)
+            x1, y1 = min(ancho, int(np.ceil(c.x1)) + MARGEN_REGION), min(alto, int(np.ceil(c.y1)) + MARGEN_REGION)
+            if x1 > x0 and y1 > y0:
+                regiones.append(Bbox([[x0, y0], [x1, y1]]))
+        return regiones
+
+    def _dibujar_region(self, artistas, region):
+        """Redibuja todos los artistas recortados a la región (alineada a píxeles) sobre el raster"""
+        from matplotlib.transforms import Bbox
+        for artista, extension in artistas:
+            if extension is not None and not region.overlaps(extension):
+                continue
+            clip_on, clip_box = artista.get_clip_on(), artista.get_clip_box()
+            caja = Bbox.intersection(region, clip_box) if clip_on and clip_box is not None else region
+            if caja is None:
+                continue
+            artista.set_clip_box(caja)
+            artista.set_clip_on(True)
+            try:
+                artista.draw(self._renderer)
+            finally:
+                artista.set_clip_box(clip_box)
+                artista.set_clip_on(clip_on)
+
+    def _render_regiones(self, fig_anterior, diagrama):
+        from matplotlib.text import Text
+        regiones = self._regiones(fig_anterior, self.diagrama, diagrama)
+        artistas = []
+        for artista in orden_dibujo(self.fig):
+            extension = None
+            if isinstance(artista, Text) and artista.get_bbox_patch() is None:
+                # Los textos sin caja son el grueso de los artistas: se descartan por extensión
+                extension = artista.get_window_extent(self._renderer).expanded(1.1, 1.1)
+            artistas.append((artista, extension))
+        for region in regiones:
+            self._dibujar_region(artistas, region)
+        alto = self._renderer.height
+        filas = [(alto - int(r.y1), alto - int(r.y0)) for r in regiones]
+        bandas = self._codificar(filas)
+        return f'{len(regiones)} regiones redibujadas, {bandas} bandas PNG recomprimidas'
+
+    def _codificar(self, filas):
+        """Recorta como bbox_inches='tight' y codifica; filas en coordenadas del buffer"""
+        x0, x1, y0, y1 = recorte = recorte_ajustado(self.fig, self._renderer, self.dpi)
+        if recorte != self._recorte:
+            self._recorte, filas = recorte, None
+        if filas is not None:
+            filas = [(max(0, f0 - y0), min(y1 - y0, f1 - y0)) for f0, f1 in filas]
+        rgba = np.asarray(self._renderer.buffer_rgba())[y0:y1, x0:x1]
+        png, bandas = self._png.codificar(rgba, filas, self.dpi)
+        datos = base64.b64encode(png).decode('ascii')
+        self.html = (f'<div class="seccion"><h2>{escape(self.titulo)}</h2>\n'
+                     f'<img src="data:image/png;base64,{datos}" class="grafico" style="border-radius: 12px;"></div>')
+        return bandas
+
+
+class VigilanteDiagramas:
+    """Modo vigilancia: mantiene un HTML al día con especificaciones y fragmentos HTML.
+
+    El proceso queda vivo con matplotlib cargado y cada sección en memoria. Los cambios
+    se detectan por mtime y tamaño, se agrupan hasta que los archivos dejan de cambiar
+    durante 'espera' segundos y solo se vuelven a generar las secciones afectadas.
+    """
+
+    def __init__(self, entradas, salida, titulo='Vista en vivo', dpi=150, intervalo=0.1, espera=0.2,
+                 nivel_png=6):
+        self.entradas = list(entradas)
+        self.salida = salida
+        self.dpi = dpi
+        self.intervalo = intervalo
+        self.espera = espera
+        self.nivel_png = nivel_png
+        self.generador = GeneradorDiagramaParqueadero(titulo)
+        self.secciones = {}  # ruta -> SeccionDiagrama o SeccionContenido
+        self.errores = {}    # ruta -> último error de lectura o render
+
+    def generados(self):
+        """Rutas reales que escribe escribir_html: el documento y su temporal"""
+        return {os.path.realpath(self.salida), os.path.realpath(self._temporal())}
+
+    def _temporal(self):
+        return self.salida + '.tmp'
+
+    def archivos(self):
+        """Archivos vigilados en orden: los indicados y los de los directorios (recursivo).
+
+        Se excluye la propia salida: si está en un directorio vigilado, incluirla como
+        sección haría que cada escritura se detectara como cambio y el HTML se incrustara
+        a sí mismo sin fin.
+        """
+        generados = self.generados()
+        rutas = []
+        for entrada in self.entradas:
+            if os.path.isdir(entrada):
+                encontradas = []
+                for ext in EXTENSIONES_ESPEC + EXTENSIONES_CONTENIDO:
+                    encontradas.extend(glob.glob(os.path.join(entrada, '**', '*' + ext), recursive=True))
+                rutas.extend(sorted(encontradas))
+            else:
+                rutas.append(entrada)
+        return [r for r in dict.fromkeys(rutas) if os.path.realpath(r) not in generados]
+
+    def firmas(self):
+        firmas = {}
+        for ruta in self.archivos():
+            try:
+                estado = os.stat(ruta)
+            except OSError:
+                continue
+            firmas[ruta] = (estado.st_mtime_ns, estado.st_size)
+        return firmas
+
+    def _seccion(self, ruta):
+        if ruta.lower().endswith(EXTENSIONES_ESPEC):
+            return SeccionDiagrama(ruta, self.generador, self.dpi, self.nivel_png)
+        return SeccionContenido(ruta)
+
+    def procesar(self, rutas):
+        """Actualiza las secciones de las rutas dadas y reescribe el HTML si algo cambió"""
+        import matplotlib.pyplot as plt
+        inicio = time.perf_counter()
+        presentes = set(self.firmas())
+        cambios = []
+        for ruta in rutas:
+            if ruta not in presentes:
+                seccion = self.secciones.pop(ruta, None)
+                if seccion is not None:
+                    if getattr(seccion, 'fig', None) is not None:
+                        plt.close(seccion.fig)
+                    cambios.append((ruta, 'sección eliminada'))
+                self.errores.pop(ruta, None)
+                continue
+            seccion = self.secciones.get(ruta) or self._seccion(ruta)
+            t0 = time.perf_counter()
+            try:
+                resumen = seccion.actualizar()
+            except Exception as e:
+                # Un archivo a medio editar no tumba el proceso: se conserva la última versión buena
+                error = f'{type(e).__name__}: {e}'
+                if self.errores.get(ruta) != error:
+                    self.errores[ruta] = error
+                    cambios.append((ruta, f'error: {error}'))
+                continue
+            self.secciones[ruta] = seccion
+            if self.errores.pop(ruta, None) is not None and resumen is None:
+                resumen = 'error corregido'
+            if resumen is not None:
+                cambios.append((ruta, f'{resumen} ({time.perf_counter() - t0:.2f} s)'))
+        if cambios:
+            self.escribir_html()
+            for ruta, resumen in cambios:
+                print(f"🔄 {os.path.basename(ruta)}: {resumen}")
+            print(f"✅ {self.salida} actualizado en {time.perf_counter() - inicio:.2f} s")
+        return cambios
+
+    def escribir_html(self):
+        """Reescribe el documento con las secciones en memoria (reemplazo atómico del archivo)"""
+        temporal = self._temporal()
+        with open(temporal, 'w', encoding='utf-8') as f:
+            f.write(self.generador._html_cabecera())
+            for ruta in self.archivos():
+                if ruta in self.errores:
+                    f.write(f'<div class="seccion"><p style="color: #c0392b;"><strong>⚠️ {escape(ruta)}:</strong> '
+                            f'{escape(self.errores[ruta])}</p></div>')
+                seccion = self.secciones.get(ruta)
+                if seccion is not None and seccion.html is not None:
+                    f.write(seccion.html)
+            f.write(self.generador._html_pie())
+        os.replace(temporal, self.salida)
+
+    def vigilar(self, max_segundos=None):
+        """Bucle de sondeo con espera de estabilización (debounce) hasta Ctrl+C o max_segundos"""
+        anteriores = self.firmas()
+        self.procesar(list(anteriores))
+        print(f"👀 Vigilando {len(anteriores)} archivos (Ctrl+C para salir)")
+        pendientes, ultimo_cambio = set(), 0.0
+        fin = None if max_segundos is None else time.monotonic() + max_segundos
+        while fin is None or time.monotonic() < fin:
+            time.sleep(self.intervalo)
+            actuales = self.firmas()
+            cambiadas = {r for r in actuales.keys() | anteriores.keys() if actuales.get(r) != anteriores.get(r)}
+            anteriores = actuales
+            if cambiadas:
+                pendientes |= cambiadas
+                ultimo_cambio = time.monotonic()
+            elif pendientes and time.monotonic() - ultimo_cambio >= self.espera:
+                self.procesar(sorted(pendientes))
+                pendientes = set()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Modo vigilancia: regenera el HTML al editar especificaciones '
+                                                 'y secciones')
+    parser.add_argument('entradas', nargs='+', help='especificaciones (.json/.yaml), fragmentos .html o directorios')
+    parser.add_argument('-o', '--salida', default='vista_en_vivo.html')
+    parser.add_argument('--titulo', default='Vista en vivo')
+    parser.add_argument('--dpi', type=int, default=150)
+    parser.add_argument('--intervalo', type=float, default=0.1, help='segundos entre sondeos')
+    parser.add_argument('--espera', type=float, default=0.2, help='segundos sin cambios antes de regenerar')
+    parser.add_argument('--nivel-png', type=int, default=6)
+    parser.add_argument('--una-vez', action='store_true', help='genera el HTML y termina')
+    args = parser.parse_args(argv)
+
+    vigilante = VigilanteDiagramas(args.entradas, args.salida, args.titulo, args.dpi, args.intervalo,
+                                   args.espera, args.nivel_png)
+    if args.una_vez:
+        vigilante.procesar(vigilante.archivos())
+        return 1 if vigilante.errores else 0
+    try:
+        vigilante.vigilar()
+    except KeyboardInterrupt:
+        print("👋 Vigilancia detenida")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())